@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+charts フォルダ全体の catalog.json（曲セレクト用のインデックス）を作るスクリプト。
+
+- os.scandir で各曲フォルダを 1 回だけ走査
+- 曲ごとに title / artist / bpm / levels、難易度ごとのノーツ数、カバー・音源のパス、
+  各ファイルのサイズと sha256 を記録
+- 前回の catalog.json とフォルダ内ファイルの (size, mtime) を比べ、変化のあったフォルダだけ読み直す
+- JsonUtility で読めるよう、辞書ではなく配列で持つ
+
+使い方:
+    python build_catalog.py --root Assets/StreamingAssets/charts [--out catalog.json] [--force]
+"""
+
+import os, sys, json, argparse
+from typing import Dict, List, Optional
+
+import toolutil
+from toolutil import file_sha256
+
+CATALOG_NAME = "catalog.json"
+CATALOG_VERSION = 1
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+# ChartPaths.ResolveAudioPath / ResolveCoverPath と同じ優先順
+AUDIO_NAMES = ["song.mp3", "song.ogg", "song.wav"]
+COVER_NAMES = ["cover.png", "cover.jpg"]
+
+
+
+def scan_files(song_dir: str) -> Dict[str, os.stat_result]:
+    with os.scandir(song_dir) as it:
+        return {e.name: e.stat() for e in it if e.is_file() and not e.name.startswith(".")}
+
+
+def stamps_of(files: Dict[str, os.stat_result]) -> List[Dict]:
+    return [{"file": n, "size": st.st_size, "mtimeNs": st.st_mtime_ns} for n, st in sorted(files.items())]
+
+
+def known_hashes(old: Optional[Dict]) -> Dict[str, tuple]:
+    """前回エントリから {file: (size, mtimeNs, sha256)}。変わっていないファイルはハッシュし直さない。"""
+    if not old:
+        return {}
+    stamps = {s["file"]: (s["size"], s["mtimeNs"]) for s in old.get("stamps", [])}
+    ents = list(old.get("difficulties") or []) + [old.get(k) for k in ("cover", "audio", "metadata")]
+    return {e["file"]: stamps[e["file"]] + (e["sha256"],) for e in ents if e and e.get("file") in stamps}
+
+
+def file_entry(song_dir: str, name: str, st: os.stat_result, known: Dict[str, tuple]) -> Dict:
+    k = known.get(name)
+    if k is not None and k[:2] == (st.st_size, st.st_mtime_ns):
+        digest = k[2]
+    else:
+        digest = file_sha256(os.path.join(song_dir, name))
+    return {"file": name, "size": st.st_size, "sha256": digest}
+
+
+def count_notes(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    notes = doc if isinstance(doc, list) else (doc.get("array") or doc.get("notes") or [])
+    return sum(1 for n in notes if n.get("type") != "guide")  # guide は判定なし
+
+
+def build_song(song_dir: str, files: Dict[str, os.stat_result], old: Optional[Dict] = None) -> Optional[Dict]:
+    if "metadata.json" not in files:
+        return None
+    try:
+        with open(os.path.join(song_dir, "metadata.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ERR] {song_dir}/metadata.json: {e}")
+        meta = {}
+    folder = os.path.basename(song_dir)
+    known = known_hashes(old)
+    levels = meta.get("levels") or meta.get("difficulties") or {}
+
+    diffs = []
+    for d in DIFFICULTIES:
+        name = f"{d}.json"
+        if name not in files:
+            continue
+        try:
+            notes = count_notes(os.path.join(song_dir, name))
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[ERR] {song_dir}/{name}: {e}")
+            continue
+        if notes == 0:
+            continue  # chart.py が作る空の譜面は並べない
+        ent = file_entry(song_dir, name, files[name], known)
+        lv = levels.get(d) if isinstance(levels, dict) else None
+        ent.update({"name": d, "notes": notes, "level": lv if isinstance(lv, int) else -1})
+        diffs.append(ent)
+
+    cover = next((n for n in COVER_NAMES if n in files), None)
+    audio = next((n for n in AUDIO_NAMES if n in files), None)
+    return {
+        "folder": folder,
+        "title": meta.get("title") or folder,
+        "artist": meta.get("artist") or "",
+        "bpm": meta.get("bpm") or 0,
+        "difficulties": diffs,
+        "cover": file_entry(song_dir, cover, files[cover], known) if cover else None,
+        "audio": file_entry(song_dir, audio, files[audio], known) if audio else None,
+        "metadata": file_entry(song_dir, "metadata.json", files["metadata.json"], known),
+        # 増分更新用：フォルダ内の全ファイルの (size, mtime)
+        "stamps": stamps_of(files),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="charts フォルダの catalog.json を作成 / 増分更新")
+    ap.add_argument("--root", required=True, help="chartsフォルダのパス")
+    ap.add_argument("--out", default=None, help=f"出力先（既定: <root>/{CATALOG_NAME}）")
+    ap.add_argument("--force", action="store_true", help="前回の catalog を使わずに全フォルダを読み直す")
+    args = ap.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"指定フォルダが存在しません: {root}", file=sys.stderr)
+        sys.exit(1)
+    out_path = args.out or os.path.join(root, CATALOG_NAME)
+
+    prev: Dict[str, Dict] = {}
+    if not args.force:
+        try:
+            with open(out_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                prev = {s["folder"]: s for s in data.get("songs", [])}
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            pass
+
+    songs = []
+    reused = rebuilt = 0
+    with os.scandir(root) as it:
+        dirs = sorted((e.name, e.path) for e in it if e.is_dir())
+    for name, song_dir in dirs:
+        files = scan_files(song_dir)
+        old = prev.get(name)
+        if old is not None and old.get("stamps") == stamps_of(files):
+            songs.append(old)
+            reused += 1
+            continue
+        song = build_song(song_dir, files, old)
+        if song is None:
+            continue
+        songs.append(song)
+        rebuilt += 1
+        print(f"[SCAN] {name}")
+
+    removed = len(set(prev) - {s["folder"] for s in songs})
+    text = json.dumps({"version": CATALOG_VERSION, "songs": songs}, ensure_ascii=False, separators=(",", ":"))
+    same = not toolutil.write_if_changed(out_path, text)
+    print(f"=== 完了: songs={len(songs)}, rescanned={rebuilt}, reused={reused}, removed={removed}"
+          f"{'' if same else ', written=' + out_path} ===")
+
+
+if __name__ == "__main__":
+    main()
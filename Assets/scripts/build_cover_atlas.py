@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+曲セレクト用に、全曲のカバーサムネイルを固定サイズのアトラス画像に詰めるスクリプト。
+
+- サムネイルは全曲同じ大きさ（--tile）なので shelf パッキング＝行ごとに左から詰める格子になる
+- 各タイルは --padding 分だけ端のピクセルを引き伸ばして余白を作る（バイリニアで隣の絵が滲まない）
+- UV マップは <out>/atlas.json。folder ごとに page / ピクセル矩形 / RawImage.uvRect 用の UV（左下原点）
+- フォルダに割り当てたスロットは前回の atlas.json から引き継ぎ、カバーが変わった・消えたページだけ描き直す
+- カバーの読み込みは mosaic_covers の fast_downscale（draft/reduce）を使い、プロセスプールで並列
+
+出力先は charts フォルダの外（既定: <root>/../cover_atlas）。charts 直下のフォルダはすべて曲として列挙されるため。
+
+使い方:
+    python build_cover_atlas.py --root Assets/StreamingAssets/charts [--out DIR] [--page 2048] [--tile 256] [--jobs 0]
+"""
+
+import os, sys, json, argparse
+from typing import Dict, List, Optional, Tuple
+
+from mosaic_covers import Image, fast_downscale
+import toolutil
+from toolutil import file_sha256
+
+ATLAS_NAME = "atlas.json"
+# レイアウトや描き方を変えたら上げる（全ページ作り直し）
+ATLAS_VERSION = 1
+# ChartPaths.ResolveCoverPath と同じ優先順。mosaic_covers のサムネイル (cover_<size>.png) があればそちらを先に使う
+COVER_NAMES = ["cover.png", "cover.jpg"]
+
+
+
+def find_cover(song_dir: str, tile: int) -> Optional[str]:
+    """Smallest mosaic thumbnail that is still >= tile, else cover.png / cover.jpg."""
+    best: Tuple[int, str] = (0, "")
+    with os.scandir(song_dir) as it:
+        names = {e.name for e in it if e.is_file()}
+    for n in names:
+        stem, ext = os.path.splitext(n)
+        if stem.startswith("cover_") and ext.lower() == ".png" and stem[6:].isdigit():
+            size = int(stem[6:])
+            if size >= tile and (not best[0] or size < best[0]):
+                best = (size, n)
+    if best[0]:
+        return os.path.join(song_dir, best[1])
+    for n in COVER_NAMES:
+        if n in names:
+            return os.path.join(song_dir, n)
+    return None
+
+
+def load_tile(job) -> Tuple[str, Optional[bytes], str]:
+    """Worker: (folder, path, tile, padding) -> (folder, RGBA bytes of the padded cell, error)."""
+    folder, path, tile, padding = job
+    try:
+        with Image.open(path) as im:
+            # fast_downscale は P / 1 / I;16 なども RGBA にしてから縮小し、RGBA で返す
+            im = fast_downscale(im, max(1, tile // 4))
+            im = im.resize((tile, tile), resample=Image.BOX)
+        return folder, extrude(im, padding).tobytes(), ""
+    except Exception as e:
+        return folder, None, str(e)
+
+
+def extrude(im: "Image.Image", padding: int) -> "Image.Image":
+    """Copy edge pixels outward by padding px on every side."""
+    if padding <= 0:
+        return im
+    w, h = im.size
+    cell = Image.new("RGBA", (w + 2 * padding, h + 2 * padding))
+    cell.paste(im, (padding, padding))
+    # 辺は 1px の帯を引き伸ばし、角は角のピクセルで埋める
+    for box, dst, size in (
+        ((0, 0, w, 1), (padding, 0), (w, padding)),
+        ((0, h - 1, w, h), (padding, h + padding), (w, padding)),
+        ((0, 0, 1, h), (0, padding), (padding, h)),
+        ((w - 1, 0, w, h), (w + padding, padding), (padding, h)),
+        ((0, 0, 1, 1), (0, 0), (padding, padding)),
+        ((w - 1, 0, w, 1), (w + padding, 0), (padding, padding)),
+        ((0, h - 1, 1, h), (0, h + padding), (padding, padding)),
+        ((w - 1, h - 1, w, h), (w + padding, h + padding), (padding, padding)),
+    ):
+        cell.paste(im.crop(box).resize(size, resample=Image.NEAREST), dst)
+    return cell
+
+
+class Layout:
+    """Slot assignment: slot index -> (page, x, y) on a grid of equal cells."""
+
+    def __init__(self, page: int, tile: int, padding: int):
+        self.page, self.tile, self.padding = page, tile, padding
+        self.cell = tile + 2 * padding
+        self.cols = page // self.cell
+        self.per_page = self.cols * self.cols
+        if self.per_page == 0:
+            raise ValueError(f"tile {tile} (+padding {padding}) does not fit a {page}px page")
+
+    def place(self, slot: int) -> Tuple[int, int, int]:
+        p, i = divmod(slot, self.per_page)
+        return p, (i % self.cols) * self.cell, (i // self.cols) * self.cell
+
+    def entry(self, folder: str, slot: int) -> Dict:
+        p, x, y = self.place(slot)
+        x += self.padding
+        y += self.padding
+        t, s = self.tile, float(self.page)
+        return {"folder": folder, "page": p, "x": x, "y": y, "w": t, "h": t,
+                # Unity の UV は左下原点（RawImage.uvRect にそのまま渡せる）
+                "u": x / s, "v": (s - y - t) / s, "uw": t / s, "vh": t / s}
+
+
+def page_name(p: int) -> str:
+    return f"atlas_{p}.png"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="カバーサムネイルのテクスチャアトラスを作成 / 差分更新")
+    ap.add_argument("--root", required=True, help="chartsフォルダのパス")
+    ap.add_argument("--out", default=None, help="出力フォルダ（既定: <root>/../cover_atlas）")
+    ap.add_argument("--page", type=int, default=2048, help="アトラス 1 枚の一辺（px）")
+    ap.add_argument("--tile", type=int, default=256, help="サムネイルの一辺（px）")
+    ap.add_argument("--padding", type=int, default=2, help="タイル周りの余白（px）")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    ap.add_argument("--force", action="store_true", help="前回の atlas.json を使わずに全ページ作り直す")
+    args = ap.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"指定フォルダが存在しません: {root}")
+        sys.exit(1)
+    out_dir = os.path.abspath(args.out or os.path.join(root, os.pardir, "cover_atlas"))
+    os.makedirs(out_dir, exist_ok=True)
+    atlas_path = os.path.join(out_dir, ATLAS_NAME)
+    try:
+        layout = Layout(args.page, args.tile, args.padding)
+    except ValueError as e:
+        print(f"[ERR] {e}")
+        sys.exit(1)
+    settings = {"version": ATLAS_VERSION, "pageSize": args.page, "tile": args.tile, "padding": args.padding}
+
+    prev: Dict[str, Dict] = {}
+    if not args.force:
+        try:
+            with open(atlas_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if all(data.get(k) == v for k, v in settings.items()):
+                prev = {e["folder"]: e for e in data.get("entries", [])}
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            pass
+
+    # 現在のカバー一覧と、その (size, mtime) / sha256
+    covers: Dict[str, Dict] = {}
+    with os.scandir(root) as it:
+        dirs = sorted((e.name, e.path) for e in it if e.is_dir())
+    for name, song_dir in dirs:
+        path = find_cover(song_dir, args.tile)
+        if not path:
+            continue
+        st = os.stat(path)
+        src = os.path.relpath(path, root).replace(os.sep, "/")
+        old = prev.get(name)
+        if old and old.get("source") == src and old.get("size") == st.st_size and old.get("mtimeNs") == st.st_mtime_ns:
+            digest = old["sha256"]
+        else:
+            digest = file_sha256(path)
+        covers[name] = {"path": path, "source": src, "size": st.st_size, "mtimeNs": st.st_mtime_ns, "sha256": digest}
+
+    # スロット割り当て：既存は据え置き、空いたスロットを小さい順に再利用
+    slots: Dict[str, int] = {}
+    dirty_pages = set()
+    for name, old in prev.items():
+        slot = old.get("slot")
+        if name in covers and isinstance(slot, int):
+            slots[name] = slot
+        elif isinstance(slot, int):
+            dirty_pages.add(layout.place(slot)[0])  # 消えた曲のタイルを消す
+    used = set(slots.values())
+    free = (i for i in range(len(covers) + len(used) + 1) if i not in used)
+    changed: List[str] = []
+    for name in covers:
+        if name not in slots:
+            slots[name] = next(free)
+            changed.append(name)
+        elif prev[name].get("sha256") != covers[name]["sha256"] or prev[name].get("source") != covers[name]["source"]:
+            changed.append(name)
+    n_pages = (max(slots.values()) // layout.per_page + 1) if slots else 0
+    for name in changed:
+        dirty_pages.add(layout.place(slots[name])[0])
+    dirty_pages = {p for p in dirty_pages if p < n_pages}
+    for p in range(n_pages):
+        if not os.path.isfile(os.path.join(out_dir, page_name(p))):
+            dirty_pages.add(p)
+
+    # 描き直すページ：既存 PNG があれば変わったタイルだけ差し替え、無ければ全タイルを描く
+    vacated = {e["slot"] for n, e in prev.items() if isinstance(e.get("slot"), int)} - set(slots.values())
+    pages: Dict[int, "Image.Image"] = {}
+    need: List[str] = []
+    for p in sorted(dirty_pages):
+        path = os.path.join(out_dir, page_name(p))
+        on_page = [n for n, s in slots.items() if layout.place(s)[0] == p]
+        img = None
+        if os.path.isfile(path):
+            try:
+                with Image.open(path) as im:
+                    img = im.convert("RGBA") if im.size == (args.page, args.page) else None
+            except OSError:
+                img = None
+        if img is None:
+            img = Image.new("RGBA", (args.page, args.page))
+            need.extend(on_page)
+        else:
+            need.extend(n for n in on_page if n in changed)
+            for slot in vacated:  # 消えた曲のスロットを透明に
+                q, x, y = layout.place(slot)
+                if q == p:
+                    img.paste((0, 0, 0, 0), (x, y, x + layout.cell, y + layout.cell))
+        pages[p] = img
+
+    jobs = [(n, covers[n]["path"], args.tile, args.padding) for n in sorted(set(need))]
+    results = list(toolutil.map_jobs(load_tile, jobs, args.jobs))
+
+    errors = 0
+    for name, data, err in results:
+        p, x, y = layout.place(slots[name])
+        if data is None:
+            print(f"[ERR] {covers[name]['path']}: {err}")
+            errors += 1
+            pages[p].paste((0, 0, 0, 0), (x, y, x + layout.cell, y + layout.cell))
+            covers[name]["sha256"] = ""  # 次回やり直す
+            continue
+        pages[p].paste(Image.frombytes("RGBA", (layout.cell, layout.cell), data), (x, y))
+
+    for p, img in sorted(pages.items()):
+        path = os.path.join(out_dir, page_name(p))
+        with toolutil.atomic_output(path) as tmp:
+            img.save(tmp, format="PNG")
+        print(f"[OK] {path}")
+    prev_pages = max((layout.place(e["slot"])[0] + 1 for e in prev.values() if isinstance(e.get("slot"), int)),
+                     default=0)
+    for p in range(n_pages, prev_pages):
+        stale = os.path.join(out_dir, page_name(p))
+        if os.path.isfile(stale):
+            os.remove(stale)
+            print(f"[DEL] {stale}")
+
+    entries = []
+    for name in sorted(slots, key=slots.get):
+        e = layout.entry(name, slots[name])
+        c = covers[name]
+        e.update({"slot": slots[name], "source": c["source"], "size": c["size"], "mtimeNs": c["mtimeNs"],
+                  "sha256": c["sha256"]})
+        entries.append(e)
+    atlas = dict(settings, pages=[page_name(p) for p in range(n_pages)], entries=entries)
+    text = json.dumps(atlas, ensure_ascii=False, indent=2)
+    toolutil.write_if_changed(atlas_path, text)
+    print(f"=== 完了: covers={len(covers)}, pages={n_pages}, redrawn={len(pages)}, tiles={len(jobs)}, "
+          f"errors={errors} ===")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
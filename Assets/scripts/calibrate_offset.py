@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音源の立ち上がり（オンセット）と譜面のノーツ時刻を突き合わせて、曲ごとの音ずれを推定するツール。
+
+- 音源は pack_charts.AUDIO_NAMES の順に探す。song.wav は標準の wave で、それ以外（と wave が読めない WAV）は
+  soundfile（任意）、無ければ PATH 上の ffmpeg で CHUNK_SECONDS ずつ読む（曲全体の PCM はメモリに置かない）
+- オンセット包絡: モノラルにして HOP_SECONDS ごとの窓で NumPy の rfft、対数振幅の増加分の和（spectral flux）を取り、
+  移動平均を引いて 0 未満を切る
+- 譜面側: 全難易度のノーツを ObjClone と同じ規則で秒にする（arrival 優先、無ければ |time| × 60 / bpm。
+  guide と fake は除き、ロングは始点だけ）。包絡と同じ格子に振り分けてガウスでならしたインパルス列にする
+- 両者の相互相関（FFT）を ±--max-lag の範囲で取り、最大の山を放物線補間して lagMs を出す
+  lagMs = 音源 − 譜面（+ なら音が遅れて聞こえる）
+  confidence = (最大 − 2 番目の山) / (最大 − 中央値)。0..1 で、拍の周期で同じ高さの山が並ぶ曲は低くなる
+- 結果は --report（既定 offset_suggestions.json）に書くだけで、metadata / 譜面は変えない
+- --apply: confidence が --min-confidence 以上、|lagMs| が --min-shift 以上の曲だけ、ノーツの time（と arrival）、
+  speedScaleMarkers / tempoMap / .bin のマーカーを lagMs ぶん後ろへずらす（chart_pipeline 経由で 1 ファイル 1 回書く）
+  rootoffsetMs は ObjClone の譜面開始と MusicPlayer の再生開始を同じだけ遅らせるだけなので、音ずれの補正には使えない
+- 曲単位でプロセスプール並列
+
+使い方:
+    python calibrate_offset.py --root Assets/StreamingAssets/charts [--report offset_suggestions.json] [--jobs 0]
+    python calibrate_offset.py path/to/曲フォルダ --report -
+    python calibrate_offset.py --root Assets/StreamingAssets/charts --apply [--min-confidence 0.5] [--dry-run]
+"""
+
+import os, sys, json, math, time, wave, shutil, argparse, subprocess
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    print("NumPy が見つかりません。先に `python3 -m pip install numpy` を実行してください。")
+    sys.exit(1)
+
+try:
+    import soundfile as sf
+except ImportError:  # 任意（ogg / flac などを直接読む）
+    sf = None
+
+import chart_pipeline
+import pack_charts
+import toolstats
+import toolutil
+
+# 読み込み / 包絡
+CHUNK_SECONDS = 4.0
+HOP_SECONDS = 0.005
+LOG_GAIN = 100.0          # log1p(LOG_GAIN × 振幅)
+FLOOR_SECONDS = 0.1       # 包絡から引く移動平均の幅
+# 窓のどこに立ち上がりが来たフレームで flux が最大になるか（窓の先頭からの割合）。対数振幅なので窓に入ってすぐの
+# 中心より後ろで最大になる。合成した打撃音（22.05k〜48k, n_fft = 4 × hop）で 0.68〜0.70
+ONSET_POS = 0.7
+FFMPEG_RATE = 22050       # ffmpeg で読むときのサンプルレート
+# 譜面側
+ONSET_TYPES = ("normal", "critical", "flick", "long")
+SMOOTH_SECONDS = 0.008    # インパルス列をならすガウスの σ
+# 推定
+DEFAULT_MAX_LAG_MS = 300.0
+EXCLUDE_SECONDS = 0.04    # 2 番目の山を探すとき最大の山の前後で除く幅
+DEFAULT_MIN_CONFIDENCE = 0.5
+DEFAULT_MIN_SHIFT_MS = 5.0
+ARRIVAL_EPS = 1e-6        # ObjClone: |arrival| > 1e-6 なら arrival を使う
+
+
+# ---- 音源の読み込み（モノラル float32 のブロック列） ----
+def _pcm_to_float(raw: bytes, width: int, channels: int) -> "np.ndarray":
+    if width == 1:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8  # 24bit の符号拡張
+        x = v.astype(np.float32) / 8388608.0
+    elif width == 4:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width: {width}")
+    if channels > 1:
+        x = x[:len(x) - len(x) % channels].reshape(-1, channels).mean(axis=1)
+    return x
+
+
+def _wave_blocks(path: str) -> Tuple[int, Iterator["np.ndarray"]]:
+    w = wave.open(path, "rb")
+    sr, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+    if width not in (1, 2, 3, 4):
+        w.close()
+        raise wave.Error(f"unsupported sample width: {width}")
+    n = max(1, int(sr * CHUNK_SECONDS))
+
+    def blocks():
+        with w:
+            while True:
+                raw = w.readframes(n)
+                if not raw:
+                    return
+                yield _pcm_to_float(raw, width, channels)
+    return sr, blocks()
+
+
+def _soundfile_blocks(path: str) -> Tuple[int, Iterator["np.ndarray"]]:
+    sr = sf.info(path).samplerate
+
+    def blocks():
+        for b in sf.blocks(path, blocksize=max(1, int(sr * CHUNK_SECONDS)), dtype="float32", always_2d=True):
+            yield b.mean(axis=1)
+    return sr, blocks()
+
+
+def _ffmpeg_blocks(path: str, ffmpeg: str) -> Tuple[int, Iterator["np.ndarray"]]:
+    cmd = [ffmpeg, "-v", "error", "-nostdin", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(FFMPEG_RATE), "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    n = int(FFMPEG_RATE * CHUNK_SECONDS) * 2
+
+    def blocks():
+        try:
+            while True:
+                raw = proc.stdout.read(n)
+                if not raw:
+                    break
+                yield _pcm_to_float(raw[:len(raw) - len(raw) % 2], 2, 1)
+        finally:
+            proc.stdout.close()
+            err = proc.stderr.read().decode("utf-8", "replace").strip()
+            proc.stderr.close()
+            if proc.wait() != 0:
+                raise ValueError(f"ffmpeg: {err or proc.returncode}")
+    return FFMPEG_RATE, blocks()
+
+
+def open_audio(path: str) -> Tuple[int, Iterator["np.ndarray"], str]:
+    """(sample rate, mono float32 blocks, decoder name). wave → soundfile → ffmpeg の順に試す。"""
+    errors = []
+    if path.lower().endswith(".wav"):
+        try:
+            return (*_wave_blocks(path), "wave")
+        except (wave.Error, EOFError) as e:  # 浮動小数点 WAV などは他のデコーダーへ
+            errors.append(f"wave: {e}")
+    if sf is not None:
+        try:
+            return (*_soundfile_blocks(path), "soundfile")
+        except RuntimeError as e:
+            errors.append(f"soundfile: {e}")
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return (*_ffmpeg_blocks(path, ffmpeg), "ffmpeg")
+    errors.append("soundfile / ffmpeg が無いので読めません")
+    raise ValueError("; ".join(errors))
+
+
+def find_audio(song_dir: str) -> Optional[str]:
+    for name in pack_charts.AUDIO_NAMES:
+        p = os.path.join(song_dir, name)
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+# ---- オンセット包絡 ----
+class OnsetEnvelope:
+    """
+    Streaming spectral flux. feed() でブロックを足し、finish() で包絡（フレームごと）を返す。
+    フレーム i の時刻 time(i) は窓の先頭から ONSET_POS × n_fft の位置（先頭は n_fft - hop サンプルの無音で埋める）。
+    """
+
+    def __init__(self, sr: int, hop_seconds: float = HOP_SECONDS):
+        self.sr = sr
+        self.hop = max(1, int(round(sr * hop_seconds)))
+        self.n_fft = 1 << max(6, math.ceil(math.log2(4 * self.hop)))
+        self.window = np.hanning(self.n_fft).astype(np.float32)
+        self._buf = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        self._prev = None
+        self._out: List["np.ndarray"] = []
+        self.samples = 0
+
+    @property
+    def rate(self) -> float:
+        return self.sr / self.hop
+
+    def time(self, i):
+        return (i * self.hop + self.hop - self.n_fft * (1.0 - ONSET_POS)) / self.sr
+
+    def index(self, t):
+        """Fractional frame index of time t (time() の逆)。"""
+        return (t * self.sr - self.hop + self.n_fft * (1.0 - ONSET_POS)) / self.hop
+
+    def feed(self, x: "np.ndarray"):
+        self.samples += len(x)
+        buf = np.concatenate([self._buf, x.astype(np.float32, copy=False)])
+        n_frames = (len(buf) - self.n_fft) // self.hop + 1
+        if n_frames <= 0:
+            self._buf = buf
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(buf, self.n_fft)[::self.hop][:n_frames]
+        mag = np.log1p(LOG_GAIN * np.abs(np.fft.rfft(frames * self.window, axis=1)))
+        prev = self._prev if self._prev is not None else mag[:1]
+        self._out.append(np.maximum(np.diff(np.concatenate([prev, mag]), axis=0), 0.0).sum(axis=1))
+        self._prev = mag[-1:]
+        self._buf = buf[n_frames * self.hop:]
+
+    def finish(self) -> "np.ndarray":
+        if self._buf.size:  # 末尾の端数は無音で埋めて 1 フレームにする
+            self.feed(np.zeros(self.n_fft - len(self._buf) % self.hop, dtype=np.float32))
+        env = np.concatenate(self._out) if self._out else np.zeros(0)
+        w = max(1, int(round(FLOOR_SECONDS * self.rate)))
+        if len(env) >= w:
+            env = np.maximum(env - np.convolve(env, np.ones(w) / w, mode="same"), 0.0)
+        return env
+
+
+def audio_envelope(path: str) -> Tuple[OnsetEnvelope, "np.ndarray", str]:
+    sr, blocks, decoder = open_audio(path)
+    oe = OnsetEnvelope(sr)
+    for b in blocks:
+        oe.feed(b)
+    return oe, oe.finish(), decoder
+
+
+# ---- 譜面側 ----
+def note_seconds(chart: "chart_pipeline.Chart", bpm: float) -> "np.ndarray":
+    """Arrival seconds of the chart's judged note starts, by ObjClone's rules (guide / fake は除く)。"""
+    n = len(chart)
+    t = np.asarray(chart.time, dtype=np.float64)
+    arrival, speed = np.zeros(n), np.zeros(n)
+    fake = np.zeros(n, dtype=bool)
+    if chart.extra is not None:
+        for i, ex in enumerate(chart.extra):
+            if ex:
+                arrival[i] = float(ex.get("arrival") or 0.0)
+                speed[i] = float(ex.get("speed") or 0.0)
+                fake[i] = bool(ex.get("fake", False))
+    if bpm > 1e-3:
+        sec = np.abs(t) * (60.0 / bpm)
+    else:
+        sec = np.where(speed != 0, np.abs(t * 60.0 / np.where(speed != 0, speed, 1.0)), np.abs(t))
+    sec = np.where(np.abs(arrival) > ARRIVAL_EPS, np.abs(arrival), sec)
+    onset = np.array([chart.type_names[ty] in ONSET_TYPES for ty in chart.type], dtype=bool)
+    return sec[onset & ~fake]
+
+
+def impulse_train(oe: OnsetEnvelope, times: "np.ndarray", n_frames: int) -> "np.ndarray":
+    """Note times -> frame-grid impulses (隣の 2 フレームに線形で振り分け、ガウスでならす)。"""
+    imp = np.zeros(n_frames)
+    pos = oe.index(times)
+    pos = pos[(pos >= 0) & (pos < n_frames - 1)]
+    i0 = np.floor(pos).astype(np.int64)
+    frac = pos - i0
+    np.add.at(imp, i0, 1.0 - frac)
+    np.add.at(imp, i0 + 1, frac)
+    sigma = SMOOTH_SECONDS * oe.rate
+    r = max(1, int(math.ceil(3 * sigma)))
+    k = np.exp(-0.5 * (np.arange(-r, r + 1) / sigma) ** 2)
+    return np.convolve(imp, k / k.sum(), mode="same")
+
+
+def estimate_lag(env: "np.ndarray", imp: "np.ndarray", rate: float, max_lag: float) -> Tuple[float, float, float]:
+    """
+    Cross-correlation of envelope and impulses over ±max_lag seconds.
+    Returns (lag seconds (+ = audio later), confidence 0..1, peak z-score).
+    """
+    K = max(1, int(round(max_lag * rate)))
+    n = 1 << math.ceil(math.log2(len(env) + len(imp) + 1))
+    r = np.fft.irfft(np.fft.rfft(env, n) * np.conj(np.fft.rfft(imp, n)), n)
+    c = np.concatenate([r[n - K:], r[:K + 1]])  # lag -K..K
+    k = int(np.argmax(c))
+    peak, med = c[k], float(np.median(c))
+    delta = 0.0
+    if 0 < k < len(c) - 1:
+        a, b = c[k - 1], c[k + 1]
+        den = a - 2 * peak + b
+        if den < 0:
+            delta = 0.5 * (a - b) / den
+    ex = max(1, int(round(EXCLUDE_SECONDS * rate)))
+    local = np.zeros(len(c), dtype=bool)
+    local[1:-1] = (c[1:-1] >= c[:-2]) & (c[1:-1] >= c[2:])
+    local[max(0, k - ex):k + ex + 1] = False
+    second = float(c[local].max()) if local.any() else med
+    conf = 0.0 if peak <= med else min(1.0, max(0.0, (peak - second) / (peak - med)))
+    sd = float(c.std())
+    z = (peak - float(c.mean())) / sd if sd > 0 else 0.0
+    return (k - K + delta) / rate, conf, z
+
+
+# ---- 補正（--apply） ----
+def shift_stage(seconds: float, bpm: float) -> "chart_pipeline.Stage":
+    """
+    ノーツ / マーカーを seconds だけ後ろへずらす chart_pipeline のステージ（拍は metadata の bpm で換算、
+    ObjClone と同じ一定 BPM）。arrival を持つノーツは arrival も同じだけずらす。
+    """
+    beats = seconds * bpm / 60.0
+
+    def shift_chart(chart, diff, song):
+        chart.time = array("d", (t + beats for t in chart.time))
+        if chart.extra is not None:
+            for ex in chart.extra:
+                if ex and abs(float(ex.get("arrival") or 0.0)) > ARRIVAL_EPS:
+                    ex["arrival"] = float(ex["arrival"]) + seconds
+        if "bin" in song.formats.get(diff, ()):
+            b, markers = song.chart_tempo(diff)
+            song.tempo[diff] = (b, [dict(m, beat=float(m.get("beat", 0.0)) + beats) for m in markers])
+
+    def shift_meta(meta, song):
+        if isinstance(meta.get("speedScaleMarkers"), list):
+            meta["speedScaleMarkers"] = [dict(m, beat=float(m.get("beat", 0.0)) + beats) if isinstance(m, dict)
+                                         else m for m in meta["speedScaleMarkers"]]
+        tm = meta.get("tempoMap")
+        if isinstance(tm, dict):
+            for key, d in (("beat", beats), ("seconds", seconds)):
+                if isinstance(tm.get(key), list):
+                    tm[key] = [float(x) + d for x in tm[key]]
+    return chart_pipeline.pipeline(chart_pipeline.chart_stage(shift_chart), chart_pipeline.meta_stage(shift_meta))
+
+
+# ---- 曲ごと ----
+def analyze_song(job) -> Dict:
+    """
+    Worker: (song_dir, max_lag, apply, min_confidence, min_shift, dry_run) -> report entry.
+    status: ok（提案のみ / ずれが --min-shift 未満） / applied（--dry-run では dry_run） / low_confidence /
+            no_audio / no_notes / silent / negative / error
+    """
+    song_dir, max_lag, apply, min_conf, min_shift, dry_run = job
+    t0 = time.perf_counter()
+    res = {"status": "ok"}
+    try:
+        song = chart_pipeline.load_song(song_dir)
+        bpm = float(song.meta.get("bpm") or 0.0)
+        times = [note_seconds(c, bpm) for c in song.charts.values()]
+        times = np.concatenate(times) if times else np.zeros(0)
+        res["notes"] = int(len(times))
+        audio = find_audio(song_dir)
+        if audio is None:
+            res["status"] = "no_audio"
+        elif not len(times):
+            res["status"] = "no_notes"
+        else:
+            oe, env, decoder = audio_envelope(audio)
+            res.update(audio=os.path.basename(audio), decoder=decoder, audioSeconds=round(oe.samples / oe.sr, 3))
+            imp = impulse_train(oe, times, len(env))
+            if not imp.any() or not env.any():
+                res["status"] = "no_notes" if not imp.any() else "silent"
+            else:
+                lag, conf, z = estimate_lag(env, imp, oe.rate, max_lag)
+                res.update(lagMs=round(lag * 1000.0, 2), confidence=round(conf, 3), peakZ=round(z, 2))
+                if conf < min_conf:
+                    res["status"] = "low_confidence"
+                elif apply and abs(lag) * 1000.0 >= min_shift:
+                    if bpm <= 1e-3:
+                        raise ValueError("metadata.json に bpm が無いので拍をずらせません")
+                    if float(times.min()) + lag < 0:
+                        res["status"] = "negative"  # 先頭のノーツが 0 秒より前になる（ObjClone は |time| を使う）
+                    else:
+                        song = shift_stage(lag, bpm)(song)
+                        res["written"] = [os.path.basename(p) for p, _ in chart_pipeline.save_song(song, dry_run=dry_run)]
+                        res["status"] = "dry_run" if dry_run else "applied"
+    except Exception as e:
+        res = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    res["seconds"] = round(time.perf_counter() - t0, 6)
+    return dict(res, dir=song_dir)
+
+
+def collect_songs(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isfile(os.path.join(p, "metadata.json")):
+            out.append(p)
+        elif os.path.isdir(p):
+            out.extend(chart_pipeline.collect_songs(p))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="音源のオンセットとノーツ時刻の相互相関から曲ごとの音ずれを推定する")
+    ap.add_argument("paths", nargs="*", help="曲フォルダ / charts フォルダ（省略時は --root）")
+    ap.add_argument("--root", default="Assets/StreamingAssets/charts", help="charts フォルダ")
+    ap.add_argument("--max-lag", type=float, default=DEFAULT_MAX_LAG_MS, help="探すずれの範囲（±ms）")
+    ap.add_argument("--report", metavar="FILE", default="offset_suggestions.json",
+                    help="曲ごとの推定結果を JSON で書き出す（- で標準出力）")
+    ap.add_argument("--apply", action="store_true", help="確信度の高い曲の譜面を推定したずれのぶんずらす")
+    ap.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                    help="--apply する最小の confidence（0..1）")
+    ap.add_argument("--min-shift", type=float, default=DEFAULT_MIN_SHIFT_MS, help="--apply する最小の |ずれ|（ms）")
+    ap.add_argument("--dry-run", action="store_true", help="--apply で書き換えずに変わるファイルだけ表示")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    songs = collect_songs(args.paths or [args.root])
+    if not songs:
+        print(f"[ERR] 曲フォルダが見つかりません: {' '.join(args.paths or [args.root])}", file=sys.stderr)
+        sys.exit(1)
+    params = (args.max_lag / 1000.0, args.apply, args.min_confidence, args.min_shift, args.dry_run)
+    jobs = [(d,) + params for d in songs]
+    stats = toolstats.from_args("calibrate_offset", args, total=len(jobs))
+
+    report = {}
+    counts: Dict[str, int] = {}
+    with stats.stage("analyze"):
+        for res in toolutil.map_jobs(analyze_song, jobs, args.jobs):
+            d, st, seconds = res.pop("dir"), res["status"], res.pop("seconds", 0.0)
+            report[d] = res
+            counts[st] = counts.get(st, 0) + 1
+            if st == "error":
+                stats.log(f"[ERR] {d}: {res['error']}")
+                stats.file(d, st, seconds, error=res["error"])
+                continue
+            line = None
+            if "lagMs" in res:
+                line = (f"[OFS] {d}: lag={res['lagMs']:+.1f}ms conf={res['confidence']:.2f} "
+                        f"(notes {res['notes']}, {res['decoder']})")
+            if st in ("applied", "dry_run"):
+                tag = "DRY" if args.dry_run else "OK"
+                stats.log(f"[{tag}] {d}: {res['lagMs']:+.1f}ms ずらす -> {', '.join(res['written'])}")
+            elif st == "negative":
+                stats.log(f"[WARN] {d}: {res['lagMs']:+.1f}ms ずらすと先頭のノーツが 0 秒より前になるので適用しません")
+            elif st in ("no_audio", "no_notes", "silent"):
+                line = f"[SKIP] {d}: {st}"
+            stats.file(d, st, seconds, line=line, notes=res.get("notes", 0))
+
+    if args.report:
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.report == "-":
+            print(text)
+        else:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    stats.finish(songs=len(songs), **counts)
+    print("== 完了: 曲 {} / {} ==".format(len(songs), " / ".join(f"{k} {v}" for k, v in sorted(counts.items()))))
+    sys.exit(1 if counts.get("error") else 0)
+
+
+if __name__ == "__main__":
+    main()
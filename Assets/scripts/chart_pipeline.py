@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+譜面をメモリ上のオブジェクトで受け渡すパイプライン API。
+変換 → レーン正規化 → metadata 修正 → パッケージ を、ファイルごとに 1 回の読み込みと 1 回の書き込みで行う。
+
+- Chart: 譜面 1 つ分のノーツを列（array）で持つ。time/hold は beat（float64）、lane/width/type は int8、
+  flags は chartbin と同じ FLAG_HOLD（None なら long/guide だけ hold を持つ = 変換結果）と FLAG_NO_LANE
+  （JSON に "lane" が無かったノーツ。lane 列は 1 のまま持ち、JSON に書き戻すときも "lane" を付けない）
+  type は type_names（既定 chartbin.NOTE_TYPES、JSON に知らない種別があれば後ろに足す）のインデックス
+  既知以外のキー（fake, arrival など）は extra、--slide-paths の経路は paths にノーツごとに残す（読み書きで落とさない）
+- Song: 曲フォルダ 1 つ分（metadata dict + 難易度名 → Chart）。譜面は最初に触ったときに読むので、
+  metadata だけのステージしか無ければ譜面ファイルは開かない
+- ステージは Song を受け取って Song を返す（その場で書き換えて None を返してもよい）呼び出し可能オブジェクト
+  chart_stage / meta_stage で「譜面ごと」「metadata だけ」の関数をステージにし、pipeline(*stages) で合成する
+  名前で指定するときは STAGES（normalize_lanes / fix_metadata / sort / reduce_lanes）
+- 書き出しは save_song() の 1 回だけ。読んだときと同じ内容になるファイルは書かない（mtime を保つ）
+  譜面 JSON は json.dump(indent=2) と同じテキストを列から直接作り、同じテキストを --pack の ZIP にも使う
+- run(): charts フォルダの曲ごとにプロセスプールでパイプラインを回す（--dry-run / toolstats）
+
+使い方（ライブラリ）:
+    import chart_pipeline as cp, normalize_lanes, fix_metadata
+    song = cp.load_song("Assets/StreamingAssets/charts/曲名")
+    song = cp.pipeline(normalize_lanes.stage(), fix_metadata.stage())(song)
+    cp.save_song(song, pack_to="packs/曲名.zip")
+使い方（CLI）:
+    python chart_pipeline.py --root Assets/StreamingAssets/charts --stages normalize_lanes,fix_metadata
+                             [--pack DIR] [--dry-run] [--jobs 0]
+"""
+
+import os, io, sys, json, math, copy, time, argparse, importlib
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy は任意（無ければ純 Python の同等処理を使う）
+    np = None
+
+import chartbin
+import migrate_metadata
+import pack_charts
+import toolstats
+import toolutil
+from chartbin import BIN_EXT, FLAG_HOLD, HOLD_TYPE_MIN, NOTE_TYPES
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+META_NAME = "metadata.json"
+# 列で持つキー（JSON に書く順）。これ以外は extra、"path" は paths
+NOTE_KEYS = ("time", "lane", "width", "type", "hold")
+PATH_KEY = "path"
+FLAG_NO_LANE = 0x80  # chart_pipeline だけのビット（.bin には書かない）
+CHUNK_NOTES = 4096
+# 名前 → (モジュール, ステージを作る関数)。ステージ本体は各ツールのモジュールに置く
+STAGES = {
+    "normalize_lanes": ("normalize_lanes", "stage"),
+    "fix_metadata": ("fix_metadata", "stage"),
+    "sort": ("chart_pipeline", "sort_notes"),
+    "reduce_lanes": ("reduce_lanes", "stage"),
+}
+
+Stage = Callable[["Song"], Optional["Song"]]
+
+
+def note_order(times, lanes):
+    """Stable (time, lane) sort order of the note columns (np.lexsort when available)."""
+    if np is not None and len(times):
+        t = np.asarray(times, dtype=np.float64)
+        if not np.isnan(t).any():  # NaN の並びは list.sort と一致しないので純 Python に任せる
+            return np.lexsort((np.asarray(lanes), t))
+    return sorted(range(len(times)), key=lambda i: (times[i], lanes[i]))
+
+
+class Chart:
+    """One chart as note columns (see module docstring). len() = note count."""
+    __slots__ = ("time", "lane", "width", "type", "hold", "flags", "paths", "extra", "type_names")
+
+    def __init__(self):
+        self.time = array("d")
+        self.lane = array("b")
+        self.width = array("b")
+        self.type = array("b")
+        self.hold = array("d")
+        self.flags = None
+        self.paths = None
+        self.extra = None
+        self.type_names = NOTE_TYPES
+
+    def __len__(self):
+        return len(self.time)
+
+    def has_hold(self) -> Iterator[bool]:
+        if self.flags is None:
+            return (ty >= HOLD_TYPE_MIN for ty in self.type)
+        return (bool(f & FLAG_HOLD) for f in self.flags)
+
+    def sort(self):
+        # (time, lane) の安定ソート（従来の list.sort と同じ順序）
+        self._set_rows(note_order(self.time, self.lane))
+
+    def take(self, rows) -> "Chart":
+        """New Chart with only the given rows (indices, in that order)."""
+        c = Chart()
+        c.flags, c.paths, c.extra, c.type_names = self.flags, self.paths, self.extra, self.type_names
+        c.time, c.lane, c.width, c.type, c.hold = self.time, self.lane, self.width, self.type, self.hold
+        c._set_rows(rows)
+        return c
+
+    def _set_rows(self, rows):
+        for name in ("time", "lane", "width", "type", "hold", "flags"):
+            col = getattr(self, name)
+            if col is None:
+                continue
+            if np is not None and isinstance(rows, np.ndarray):
+                setattr(self, name, array(col.typecode, np.asarray(col)[rows].tobytes()))
+            else:
+                setattr(self, name, array(col.typecode, [col[i] for i in rows]))
+        for name in ("paths", "extra"):
+            col = getattr(self, name)
+            if col is not None:
+                setattr(self, name, [col[i] for i in rows])
+
+    @classmethod
+    def from_notes(cls, notes: List[Dict]) -> "Chart":
+        """Chart JSON (list of note dicts) -> Chart. 無いキーは time 0 / lane 1 / width 1 / normal（chartbin と同じ）。"""
+        c = cls()
+        names = list(NOTE_TYPES)
+        codes = {n: i for i, n in enumerate(names)}
+        c.flags = array("B")
+        paths, extra = [], []
+        for i, n in enumerate(notes):
+            if not isinstance(n, dict):
+                raise ValueError(f"note {i} is not an object")
+            ty = str(n.get("type", "normal"))
+            code = codes.get(ty)
+            if code is None:
+                code = codes[ty] = len(names)
+                names.append(ty)
+            try:
+                c.time.append(float(n.get("time", 0.0)))
+                c.lane.append(int(n.get("lane", 1)))
+                c.width.append(int(n.get("width", 1)))
+            except (OverflowError, TypeError, ValueError) as e:
+                raise ValueError(f"note {i}: {e}") from None
+            c.type.append(code)
+            fl = 0 if "lane" in n else FLAG_NO_LANE
+            if "hold" in n:
+                c.flags.append(fl | FLAG_HOLD)
+                c.hold.append(float(n["hold"]))
+            else:
+                c.flags.append(fl)
+                c.hold.append(0.0)
+            paths.append(n.get(PATH_KEY))
+            rest = {k: v for k, v in n.items() if k not in NOTE_KEYS and k != PATH_KEY}
+            extra.append(rest or None)
+        if any(p is not None for p in paths):
+            c.paths = paths
+        if any(e is not None for e in extra):
+            c.extra = extra
+        if len(names) > len(NOTE_TYPES):
+            c.type_names = tuple(names)
+        return c
+
+    @classmethod
+    def from_bin(cls, cb: "chartbin.ChartBin") -> "Chart":
+        c = cls()
+        c.time = array("d", cb.time)
+        c.lane = array("b", cb.lane)
+        c.width = array("b", cb.width)
+        c.type = array("b", cb.type)
+        c.hold = array("d", cb.hold)
+        c.flags = array("B", cb.flags)
+        return c
+
+    def notes(self) -> List[Dict]:
+        """Notes as dicts in the chart JSON layout."""
+        return json.loads(chart_json_text(self)) if len(self) else []
+
+
+# ---- 書き出し（json.dump(notes, ensure_ascii=False, indent=2) と同じテキスト） ----
+def _json_float(x: float) -> str:
+    # json モジュールと同じ表記（有限値は repr、非有限は NaN/Infinity）
+    if x != x:
+        return "NaN"
+    if x in (math.inf, -math.inf):
+        return "Infinity" if x > 0 else "-Infinity"
+    return float.__repr__(x)
+
+
+def _nested(v) -> str:
+    # json.dump(indent=2) でノーツの中に入れ子にしたときと同じ字下げ
+    return json.dumps(v, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+
+
+def iter_chart_json(chart: Chart) -> Iterator[str]:
+    """Chart JSON text in pieces of up to CHUNK_NOTES notes, without building dicts."""
+    if len(chart) == 0:
+        yield "[]"
+        return
+    names = [json.dumps(n, ensure_ascii=False) for n in chart.type_names]
+    head = '  {\n    "time": %s,\n    "lane": %d,\n    "width": %d,\n    "type": %s'
+    head_nolane = '  {\n    "time": %s,\n    "width": %d,\n    "type": %s'
+    none = [None] * len(chart)
+    flags = chart.flags if chart.flags is not None else bytes(len(chart))
+    paths = chart.paths if chart.paths is not None else none
+    extra = chart.extra if chart.extra is not None else none
+    yield "[\n"
+    sep = ""
+    buf = []
+    for t, l, w, ty, h, hh, fl, ex, pth in zip(chart.time, chart.lane, chart.width, chart.type, chart.hold,
+                                              chart.has_hold(), flags, extra, paths):
+        if fl & FLAG_NO_LANE:
+            rec = head_nolane % (_json_float(t), w, names[ty])
+        else:
+            rec = head % (_json_float(t), l, w, names[ty])
+        if hh:
+            rec += ',\n    "hold": ' + _json_float(h)
+        if ex:
+            for k, v in ex.items():
+                rec += ",\n    " + json.dumps(k, ensure_ascii=False) + ": " + _nested(v)
+        if pth:
+            rec += ',\n    "path": ' + _nested(pth)
+        buf.append(rec + "\n  }")
+        if len(buf) >= CHUNK_NOTES:
+            yield sep + ",\n".join(buf)
+            buf.clear()
+            sep = ",\n"
+    if buf:
+        yield sep + ",\n".join(buf)
+    yield "\n]"
+
+
+def chart_json_text(chart: Chart) -> str:
+    return "".join(iter_chart_json(chart))
+
+
+def write_chart_json(chart: Chart, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for piece in iter_chart_json(chart):
+            f.write(piece)
+
+
+def chart_bin_bytes(chart: Chart, bpm: float, markers: List[Dict]) -> bytes:
+    if len(chart.type_names) > len(NOTE_TYPES):
+        raise ValueError(f"unknown note types for .bin: {chart.type_names[len(NOTE_TYPES):]}")
+    return chartbin.encode_chart(chart.time, chart.lane, chart.width, chart.type, chart.hold, bpm, markers,
+                                 list(chart.has_hold()))
+
+
+# ---- 読み込み ----
+def parse_chart(data: bytes, name: str = "<bytes>") -> Chart:
+    """Chart file contents (.json text or .bin bytes, by name) -> Chart."""
+    if name.endswith(BIN_EXT):
+        return Chart.from_bin(chartbin.decode_chart(data, name))
+    doc = json.loads(data.decode("utf-8"))
+    if not isinstance(doc, (list, dict)):
+        raise ValueError(f"{name}: chart is not a list")
+    # ObjClone と同じく 配列 / {"array": [...]} / {"notes": [...]} を受け付ける（書き出しは配列）
+    notes = doc if isinstance(doc, list) else (doc.get("array") or doc.get("notes") or [])
+    return Chart.from_notes(notes)
+
+
+def read_chart(path: str) -> Chart:
+    with open(path, "rb") as f:
+        return parse_chart(f.read(), path)
+
+
+class Song:
+    """
+    One song folder in memory: meta (metadata.json の dict) + charts (difficulty name -> Chart).
+    charts は最初に触ったときに dir から読む。formats は読んだときにあった形式（{"json", "bin"}）。
+    tempo は .bin に埋め込む譜面ごとの (bpm, speedScaleMarkers)。変換結果の .bin は譜面ごとに自分のテンポを
+    持つ（フォルダ変換の metadata.json は最初の 1 譜面分）ので、今の .bin があればそれを引き継ぐ。
+    bytes_in / reads はこの Song のために読んだ量（統計用）。
+    """
+
+    def __init__(self, song_dir: Optional[str] = None, meta: Optional[Dict] = None,
+                 charts: Optional[Dict[str, Chart]] = None):
+        self.dir = song_dir
+        self.meta = meta if meta is not None else {}
+        self.formats: Dict[str, set] = {}
+        self.tempo: Dict[str, Tuple[float, List[Dict]]] = {}
+        self.bytes_in = 0
+        self.reads = 0
+        self._meta_orig = None  # 読んだときの metadata（None = ファイルが無かった）
+        self._meta_newline = True
+        self._charts = charts
+        self._raw: Dict[Tuple[str, str], bytes] = {}
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(os.path.normpath(self.dir)) if self.dir else ""
+
+    @property
+    def charts(self) -> Dict[str, Chart]:
+        if self._charts is None:
+            self._charts = {}
+            for diff in sorted(self.formats, key=_diff_key):
+                self._charts[diff] = self._read_chart(diff)
+        return self._charts
+
+    def _read(self, diff: str, fmt: str) -> Tuple[str, bytes]:
+        path = os.path.join(self.dir, diff + (".json" if fmt == "json" else BIN_EXT))
+        with open(path, "rb") as f:
+            data = f.read()
+        self.reads += 1
+        self.bytes_in += len(data)
+        self._raw[(diff, fmt)] = data
+        return path, data
+
+    def _read_chart(self, diff: str) -> Chart:
+        # 両方あるときは JSON が正（extra / path は .bin に入らない）
+        if "json" in self.formats[diff]:
+            return parse_chart(*reversed(self._read(diff, "json")))
+        cb = chartbin.decode_chart(*reversed(self._read(diff, "bin")))
+        self.tempo[diff] = (cb.bpm, cb.markers)
+        return Chart.from_bin(cb)
+
+    def chart_tempo(self, diff: str) -> Tuple[float, List[Dict]]:
+        """(bpm, markers) for diff's .bin: 今の .bin から（JSON から読んだ譜面ならここで .bin を 1 回読む）、無ければ metadata。"""
+        if diff not in self.tempo:
+            if "bin" in self.formats.get(diff, ()):
+                cb = chartbin.decode_chart(*reversed(self._read(diff, "bin")))
+                self.tempo[diff] = (cb.bpm, cb.markers)
+            else:
+                self.tempo[diff] = (float(self.meta.get("bpm") or 0.0), self.meta.get("speedScaleMarkers") or [])
+        return self.tempo[diff]
+
+    def loaded(self) -> bool:
+        return self._charts is not None
+
+
+def _diff_key(name: str):
+    return (DIFFICULTIES.index(name) if name in DIFFICULTIES else len(DIFFICULTIES), name)
+
+
+def load_song(song_dir: str) -> Song:
+    """metadata.json を読み、譜面（<difficulty>.json / .bin）は一覧だけ取る（中身は Song.charts で読む）。"""
+    song = Song(song_dir)
+    names = set(os.listdir(song_dir))
+    if META_NAME in names:
+        with open(os.path.join(song_dir, META_NAME), "rb") as f:
+            data = f.read()
+        song.reads += 1
+        song.bytes_in += len(data)
+        text = data.decode("utf-8")
+        meta = json.loads(text)
+        if not isinstance(meta, dict):
+            raise ValueError(f"{song_dir}: metadata.json is not an object")
+        song.meta = meta
+        song._meta_orig = copy.deepcopy(meta)
+        song._meta_newline = text.endswith("\n")
+    for diff in DIFFICULTIES:
+        fmts = {fmt for fmt, ext in (("json", ".json"), ("bin", BIN_EXT)) if diff + ext in names}
+        if fmts:
+            song.formats[diff] = fmts
+    return song
+
+
+# ---- ステージ ----
+def pipeline(*stages: Stage) -> Stage:
+    """Compose stages left to right into one stage."""
+    def run(song: Song) -> Song:
+        for st in stages:
+            r = st(song)
+            if r is not None:
+                song = r
+        return song
+    run.stages = stages
+    return run
+
+
+def chart_stage(fn: Callable[[Chart, str, Song], Optional[Chart]]) -> Stage:
+    """fn(chart, difficulty, song) を全譜面に当てるステージ（Chart を返せば差し替え）。"""
+    def stage(song: Song) -> Song:
+        charts = song.charts
+        for diff in list(charts):
+            r = fn(charts[diff], diff, song)
+            if r is not None:
+                charts[diff] = r
+        return song
+    stage.__name__ = getattr(fn, "__name__", "chart_stage")
+    return stage
+
+
+def meta_stage(fn: Callable[[Dict, Song], Optional[Dict]]) -> Stage:
+    """fn(meta, song) を metadata に当てるステージ（dict を返せば差し替え）。譜面は読まない。"""
+    def stage(song: Song) -> Song:
+        r = fn(song.meta, song)
+        if r is not None:
+            song.meta = r
+        return song
+    stage.__name__ = getattr(fn, "__name__", "meta_stage")
+    return stage
+
+
+def metadata_ops(ops: List[Dict]) -> Stage:
+    """migrate_metadata の操作リスト（set / remove / rename / default / computed）を metadata に当てる。"""
+    migrate_metadata.validate([{"version": 1, "ops": ops}])
+
+    def apply(meta: Dict, song: Song):
+        ctx = {"folder": song.name, "path": os.path.join(song.dir or "", META_NAME)}
+        return migrate_metadata.apply_ops(meta, ops, ctx)
+    apply.__name__ = "metadata_ops"
+    return meta_stage(apply)
+
+
+def sort_notes() -> Stage:
+    """(time, lane) の安定ソート（ゲーム側と同じ並びにそろえる）。"""
+    def sort(chart: Chart, diff: str, song: Song):
+        chart.sort()
+    return chart_stage(sort)
+
+
+def named_stages(names) -> Stage:
+    """"normalize_lanes,fix_metadata" や ["sort", ...] -> 合成したステージ（STAGES から作る）。"""
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    stages = []
+    for name in names:
+        if name not in STAGES:
+            raise ValueError(f"unknown stage {name!r} (known: {', '.join(STAGES)})")
+        module, factory = STAGES[name]
+        stages.append(getattr(importlib.import_module(module), factory)())
+    return pipeline(*stages)
+
+
+# ---- 書き出し（Song 単位で 1 回） ----
+def meta_text(song: Song) -> str:
+    # 末尾改行の有無は元のファイルに合わせる（新規は make_metadata.py と同じく改行あり）
+    return migrate_metadata.dumps(song.meta) + ("\n" if song._meta_newline else "")
+
+
+def meta_changed(song: Song) -> bool:
+    if song._meta_orig is None:
+        return bool(song.meta)
+    return migrate_metadata.dumps(song._meta_orig) != migrate_metadata.dumps(song.meta)
+
+
+def song_payloads(song: Song, fmt: Optional[str] = None) -> Dict[str, bytes]:
+    """
+    File name -> bytes for everything save_song() would write, each serialized once.
+    fmt=None は読んだときの形式（新しい譜面は json）、"json" / "bin" / "both" で指定。
+    読み込んでいない譜面は含めない（変わっていないので書く必要が無い）。
+    """
+    out = {}
+    if song._meta_orig is not None or song.meta:
+        out[META_NAME] = meta_text(song).encode("utf-8")
+    if not song.loaded():
+        return out
+    for diff, chart in song.charts.items():
+        fmts = {"json", "bin"} if fmt == "both" else {fmt} if fmt else song.formats.get(diff) or {"json"}
+        if "json" in fmts:
+            out[diff + ".json"] = chart_json_text(chart).encode("utf-8")
+        if "bin" in fmts:
+            out[diff + BIN_EXT] = chart_bin_bytes(chart, *song.chart_tempo(diff))
+    return out
+
+
+def _unchanged(song: Song, name: str, data: bytes) -> bool:
+    if name == META_NAME:
+        return song._meta_orig is not None and not meta_changed(song)
+    diff, ext = os.path.splitext(name)
+    return song._raw.get((diff, "bin" if ext == BIN_EXT else "json")) == data
+
+
+def save_song(song: Song, out_dir: Optional[str] = None, fmt: Optional[str] = None, dry_run: bool = False,
+              pack_to: Optional[str] = None) -> List[Tuple[str, int]]:
+    """
+    Write the song once: changed metadata / charts only (一時ファイル + rename)。Returns [(path, bytes)] written
+    (dry_run では書くはずだったもの)。out_dir を指定したときは全部書く。
+    pack_to を指定すると同じバイト列で pack_charts 形式の ZIP も書く（譜面はすべて読み込む）。
+    """
+    if pack_to is not None:
+        song.charts  # ZIP には全譜面が要る
+    out_dir = out_dir or song.dir
+    same_dir = song.dir is not None and os.path.abspath(out_dir) == os.path.abspath(song.dir)
+    payloads = song_payloads(song, fmt)
+    written = []
+    for name, data in payloads.items():
+        if same_dir and _unchanged(song, name, data):
+            continue
+        path = os.path.join(out_dir, name)
+        written.append((path, len(data)))
+        if not dry_run:
+            os.makedirs(out_dir, exist_ok=True)
+            toolutil.write_atomic(path, data)
+    if pack_to is not None:
+        size = pack_files(pack_to, payloads, song.dir or out_dir, dry_run)
+        written.append((pack_to, size))
+    return written
+
+
+def pack_files(zip_path: str, payloads: Dict[str, bytes], song_dir: str, dry_run: bool = False) -> int:
+    """
+    pack_charts.pack_song と同じ並び・同じヘッダの ZIP を、譜面 / metadata はメモリのバイト列から、
+    音源 / カバーは song_dir から（pack_charts と同じ優先順で 1 つずつ）書く。Returns the ZIP size.
+    """
+    names = [d + ext for d in DIFFICULTIES for ext in pack_charts.CHART_EXTS if d + ext in payloads]
+    if META_NAME in payloads:
+        names.append(META_NAME)
+    on_disk = set(os.listdir(song_dir)) if song_dir and os.path.isdir(song_dir) else set()
+    media = [n for n in pack_charts.AUDIO_NAMES if n in on_disk][:1] + \
+            [n for n in pack_charts.COVER_NAMES if n in on_disk][:1]
+    if dry_run:
+        return sum(len(payloads[n]) for n in names) + sum(os.path.getsize(os.path.join(song_dir, n)) for n in media)
+    os.makedirs(os.path.dirname(os.path.abspath(zip_path)), exist_ok=True)
+    with toolutil.atomic_output(zip_path) as tmp, pack_charts.create_zip(tmp) as zf:
+        for n in names:
+            pack_charts.write_entry(zf, n, io.BytesIO(payloads[n]), len(payloads[n]))
+        for n in media:
+            src = os.path.join(song_dir, n)
+            with open(src, "rb") as fin:
+                pack_charts.write_entry(zf, n, fin, os.path.getsize(src))
+    return os.path.getsize(zip_path)
+
+
+# ---- charts フォルダ全体 ----
+def collect_songs(root: str) -> List[str]:
+    """Song folders under root (metadata.json のあるフォルダ、migrate_metadata と同じ探し方)。"""
+    return [os.path.dirname(p) for p, _ in migrate_metadata.collect_metadata(root, False)]
+
+
+def process_song(job) -> Dict:
+    """
+    Worker: (song_dir, stage names, fmt, dry_run, pack_dir) -> {dir, written, diff, reads, bytesIn, bytesOut,
+    seconds, error}。ステージは名前で受け取ってワーカー側で作る（pickle できない関数を渡さない）。
+    """
+    song_dir, names, fmt, dry_run, pack_dir = job
+    t0 = time.perf_counter()
+    res = {"dir": song_dir, "written": [], "diff": [], "reads": 0, "bytesIn": 0, "bytesOut": 0, "error": None}
+    try:
+        song = load_song(song_dir)
+        song = named_stages(names)(song)
+        if meta_changed(song):
+            res["diff"] = migrate_metadata.diff_lines(song._meta_orig or {}, song.meta)
+        pack_to = os.path.join(pack_dir, song.name + ".zip") if pack_dir else None
+        res["written"] = save_song(song, fmt=fmt, dry_run=dry_run, pack_to=pack_to)
+        res["reads"], res["bytesIn"] = song.reads, song.bytes_in
+        res["bytesOut"] = sum(n for _, n in res["written"])
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: {e}"
+    res["seconds"] = time.perf_counter() - t0
+    return res
+
+
+def run(root: str, names, jobs: int = 0, fmt: Optional[str] = None, dry_run: bool = False,
+        pack_dir: Optional[str] = None, stats: Optional["toolstats.RunStats"] = None) -> Dict[str, int]:
+    """Run the named stages over every song under root. Returns counts (total / changed / unchanged / errors)."""
+    if stats is None:
+        stats = toolstats.RunStats("chart_pipeline")
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    named_stages(names)  # 名前の間違いはワーカーに配る前に
+    with stats.stage("scan"):
+        songs = collect_songs(root)
+    stats.set_total(len(songs))
+    work = [(d, list(names), fmt, dry_run, pack_dir) for d in songs]
+    counts = {"total": len(work), "changed": 0, "unchanged": 0, "errors": 0, "filesWritten": 0}
+    tag = "DRY" if dry_run else "OK"
+    with stats.stage("songs"):
+        for res in toolutil.map_jobs(process_song, work, jobs):
+            fields = {"bytesIn": res["bytesIn"], "bytesOut": res["bytesOut"], "reads": res["reads"]}
+            if res["error"]:
+                counts["errors"] += 1
+                stats.log(f"[ERR] {res['dir']}: {res['error']}")
+                stats.file(res["dir"], "error", res["seconds"], error=res["error"], **fields)
+                continue
+            files = [p for p, _ in res["written"]]
+            st = "changed" if files else "unchanged"
+            counts[st] += 1
+            counts["filesWritten"] += len(files)
+            line = None
+            if files:
+                line = "\n".join([f"[{tag}] {res['dir']}: {', '.join(os.path.basename(p) for p in files)}"]
+                                 + [f"     {d}" for d in res["diff"]])
+                if dry_run:
+                    stats.log(line)  # dry-run の差分は --verbose に関係なく表示
+                    line = None
+            stats.file(res["dir"], st, res["seconds"], line=line, writes=len(files), **fields)
+    stats.finish(**counts)
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="charts フォルダの曲ごとに、メモリ上で譜面 / metadata のステージを回す")
+    ap.add_argument("--root", required=True, help="charts フォルダのパス")
+    ap.add_argument("--stages", required=True, help=f"カンマ区切りのステージ名（{', '.join(STAGES)}）")
+    ap.add_argument("--format", choices=("json", "bin", "both"), default=None,
+                    help="譜面の書き出し形式（既定は読んだときと同じ）")
+    ap.add_argument("--pack", metavar="DIR", default=None,
+                    help="同じ内容で ZipChartImporter 用の <曲名>.zip も DIR に書く（pack_charts.py と同じ形式）")
+    ap.add_argument("--dry-run", action="store_true", help="書き換えずに変わるファイルだけ表示")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"指定フォルダが存在しません: {args.root}")
+        sys.exit(1)
+    try:
+        named_stages(args.stages)
+    except ValueError as e:
+        print(f"[ERR] --stages: {e}")
+        sys.exit(1)
+    c = run(args.root, args.stages, args.jobs, args.format, args.dry_run, args.pack,
+            toolstats.from_args("chart_pipeline", args))
+    print(f"== 完了: 曲 {c['total']} / 変更 {c['changed']}（{c['filesWritten']} ファイル） / "
+          f"変更なし {c['unchanged']} / エラー {c['errors']} ==")
+    sys.exit(1 if c["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NullWorld 譜面バイナリ形式 (.bin) の読み書きと検証。
+<difficulty>.json の隣に <difficulty>.bin として置く。すべてリトルエンディアン。
+
+Header (32 bytes)
+  0  4s  magic        b"NWCB"
+  4  u16 version      FORMAT_VERSION (=2。1 は lane / width が u8 だった版で、読み込みだけ対応)
+  6  u16 header_size  32
+  8  u32 note_count
+ 12  u32 marker_count
+ 16  u32 crc32        zlib.crc32(note records + marker records)
+ 20  u32 reserved     0
+ 24  f64 bpm          変換元譜面の基準 BPM（metadata.json の bpm と同じ意味）
+
+Note record (24 bytes, time, lane の順にソート済み)
+  0  f64 time         beat
+  8  i8  lane         通常 1..12（範囲外は ObjClone がクランプするので、JSON の値をそのまま -128..127 で持つ）
+  9  i8  width        通常 1..12
+ 10  u8  type         NOTE_TYPES のインデックス
+ 11  u8  flags        bit0: hold あり
+ 12  4x  padding
+ 16  f64 hold         beat（flags bit0 が 0 なら 0.0）
+
+Marker record (24 bytes) = speedScaleMarkers
+  0  f64 beat / 8 f64 forward / 16 f64 reverse
+
+使い方:
+    python chartbin.py pack   <chart.json or dir ...>   # 既存の JSON から .bin を作る
+    python chartbin.py verify <chart.bin  or dir ...>   # .bin と隣の JSON / metadata.json を突き合わせ
+    python chartbin.py dump   <chart.bin>
+"""
+
+import os, sys, json, struct, zlib, argparse
+from array import array
+from typing import Dict, List, Optional
+
+import toolutil
+
+MAGIC = b"NWCB"
+FORMAT_VERSION = 2
+BIN_EXT = ".bin"
+
+# type コード（フォーマットの一部なので並びを変えないこと）
+NOTE_TYPES = ("normal", "critical", "flick", "long", "guide")
+TYPE_CODES = {name: i for i, name in enumerate(NOTE_TYPES)}
+HOLD_TYPE_MIN = 3  # long/guide
+FLAG_HOLD = 0x01
+
+HEADER = struct.Struct("<4sHHIIIId")
+NOTE = struct.Struct("<dbbBB4xd")
+NOTE_V1 = struct.Struct("<dBBBB4xd")  # version 1: lane / width が u8
+MARKER = struct.Struct("<ddd")
+
+
+class ChartBin:
+    """Decoded .bin: note columns (array module) + bpm + speedScaleMarkers."""
+    __slots__ = ("time", "lane", "width", "type", "flags", "hold", "bpm", "markers")
+
+    def __init__(self):
+        self.time = array("d")
+        self.lane = array("b")
+        self.width = array("b")
+        self.type = array("B")
+        self.flags = array("B")
+        self.hold = array("d")
+        self.bpm = 0.0
+        self.markers: List[Dict] = []
+
+    def __len__(self):
+        return len(self.time)
+
+    def notes(self) -> List[Dict]:
+        """Notes in the chart JSON layout (hold only where flags say so)."""
+        out = []
+        for t, l, w, ty, fl, h in zip(self.time, self.lane, self.width, self.type, self.flags, self.hold):
+            n = {"time": t, "lane": l, "width": w, "type": NOTE_TYPES[ty]}
+            if fl & FLAG_HOLD:
+                n["hold"] = h
+            out.append(n)
+        return out
+
+
+def bin_path_for(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + BIN_EXT
+
+
+def encode_chart(time, lane, width, type_, hold, bpm: float, markers: List[Dict], has_hold=None) -> bytes:
+    """
+    Note columns -> .bin bytes. has_hold is an optional per-note sequence of bools;
+    by default long/guide (type >= HOLD_TYPE_MIN) carry hold, as the converter writes them.
+    """
+    n = len(time)
+    payload = bytearray(n * NOTE.size + len(markers) * MARKER.size)
+    pack = NOTE.pack_into
+    i = 0
+    try:
+        for i in range(n):
+            ty = type_[i]
+            hh = has_hold[i] if has_hold is not None else ty >= HOLD_TYPE_MIN
+            pack(payload, i * NOTE.size, time[i], lane[i], width[i], ty,
+                 FLAG_HOLD if hh else 0, hold[i] if hh else 0.0)
+    except struct.error as e:
+        raise ValueError(f"note {i}: .bin に書けない値 (lane={lane[i]}, width={width[i]}, type={type_[i]}): {e}") from None
+    base = n * NOTE.size
+    for j, m in enumerate(markers):
+        MARKER.pack_into(payload, base + j * MARKER.size,
+                         float(m.get("beat", 0.0)), float(m.get("forward", 0.0)), float(m.get("reverse", 0.0)))
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, HEADER.size, n, len(markers),
+                         zlib.crc32(payload), 0, float(bpm))
+    return header + bytes(payload)
+
+
+def encode_notes(notes: List[Dict], bpm: float, markers: List[Dict]) -> bytes:
+    """Chart JSON (list of note dicts) -> .bin bytes. Notes are written in the given order."""
+    time, lane, width, type_, hold, has_hold = array("d"), [], [], array("B"), array("d"), []
+    for n in notes:
+        ty = n.get("type", "normal")
+        if ty not in TYPE_CODES:
+            raise ValueError(f"unknown note type: {ty!r}")
+        time.append(float(n.get("time", 0.0)))
+        lane.append(int(n.get("lane", 1)))
+        width.append(int(n.get("width", 1)))
+        type_.append(TYPE_CODES[ty])
+        has_hold.append("hold" in n)
+        hold.append(float(n.get("hold", 0.0)))
+    return encode_chart(time, lane, width, type_, hold, bpm, markers, has_hold)
+
+
+def decode_chart(data: bytes, name: str = "<bytes>") -> ChartBin:
+    if len(data) < HEADER.size:
+        raise ValueError(f"{name}: too short for a chart header")
+    magic, version, header_size, n, n_markers, crc, _, bpm = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{name}: bad magic {magic!r}")
+    if version not in (1, FORMAT_VERSION):
+        raise ValueError(f"{name}: unsupported version {version}")
+    note = NOTE if version == FORMAT_VERSION else NOTE_V1
+    end = header_size + n * NOTE.size + n_markers * MARKER.size
+    if len(data) != end:
+        raise ValueError(f"{name}: size {len(data)} != expected {end}")
+    payload = memoryview(data)[header_size:end]
+    if zlib.crc32(payload) != crc:
+        raise ValueError(f"{name}: checksum mismatch")
+
+    out = ChartBin()
+    out.bpm = bpm
+    for t, l, w, ty, fl, h in note.iter_unpack(payload[:n * NOTE.size]):
+        if ty >= len(NOTE_TYPES):
+            raise ValueError(f"{name}: unknown type code {ty}")
+        if l > 127 or w > 127:
+            raise ValueError(f"{name}: lane / width out of range ({l}, {w})")
+        out.time.append(t); out.lane.append(l); out.width.append(w)
+        out.type.append(ty); out.flags.append(fl); out.hold.append(h)
+    for b, fw, rv in MARKER.iter_unpack(payload[n * NOTE.size:]):
+        out.markers.append({"beat": b, "forward": fw, "reverse": rv})
+    return out
+
+
+def read_chart_bin(path: str) -> ChartBin:
+    with open(path, "rb") as f:
+        return decode_chart(f.read(), path)
+
+
+def _load_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _notes_of(doc) -> List[Dict]:
+    # ObjClone と同じく 配列 / {"array": [...]} / {"notes": [...]} を受け付ける
+    if isinstance(doc, list):
+        return doc
+    if isinstance(doc, dict):
+        return doc.get("array") or doc.get("notes") or []
+    return []
+
+
+def _meta_for(chart_path: str) -> Dict:
+    meta_path = os.path.join(os.path.dirname(chart_path), "metadata.json")
+    try:
+        meta = _load_json(meta_path)
+        return meta if isinstance(meta, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def verify(bin_path: str, json_path: Optional[str] = None):
+    """
+    Round-trip check of a .bin against its JSON chart. Returns (problems, warnings).
+    Tempo differences from metadata.json are only warnings: a folder shares one metadata.json,
+    while each .bin carries the tempo of its own source chart.
+    """
+    json_path = json_path or os.path.splitext(bin_path)[0] + ".json"
+    try:
+        cb = read_chart_bin(bin_path)
+    except (OSError, ValueError) as e:
+        return [str(e)], []
+    problems, warnings = [], []
+    try:
+        notes = _notes_of(_load_json(json_path))
+    except (OSError, ValueError) as e:
+        return [f"{json_path}: {e}"], []
+
+    decoded = cb.notes()
+    if len(decoded) != len(notes):
+        problems.append(f"note count {len(decoded)} != {len(notes)} in {json_path}")
+    for i, (a, b) in enumerate(zip(decoded, notes)):
+        want = {k: b[k] for k in ("time", "lane", "width", "type", "hold") if k in b}
+        if a != want:
+            problems.append(f"note #{i}: bin={a} json={want}")
+            if len(problems) >= 10:
+                break
+
+    meta = _meta_for(json_path)
+    if "bpm" in meta and meta["bpm"] is not None and float(meta["bpm"]) != cb.bpm:
+        warnings.append(f"bpm {cb.bpm} != metadata {meta['bpm']}")
+    want_markers = [{"beat": float(m.get("beat", 0.0)), "forward": float(m.get("forward", 0.0)),
+                     "reverse": float(m.get("reverse", 0.0))} for m in meta.get("speedScaleMarkers") or []]
+    if "speedScaleMarkers" in meta and cb.markers != want_markers:
+        warnings.append("speedScaleMarkers differ from metadata.json")
+    return problems, warnings
+
+
+def _collect(paths: List[str], ext: str) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                out.extend(os.path.join(root, fn) for fn in files
+                           if fn.lower().endswith(ext) and fn != "metadata.json" and not fn.startswith("."))
+        else:
+            out.append(p)
+    return sorted(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="NullWorld chart binary (.bin) tool")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("pack", help="JSON 譜面から .bin を作成")
+    sp.add_argument("paths", nargs="+")
+    sv = sub.add_parser("verify", help=".bin を隣の JSON / metadata.json と照合")
+    sv.add_argument("paths", nargs="+")
+    sd = sub.add_parser("dump", help=".bin の中身を表示")
+    sd.add_argument("path")
+    args = ap.parse_args()
+
+    if args.cmd == "dump":
+        cb = read_chart_bin(args.path)
+        print(f"notes={len(cb)} bpm={cb.bpm} markers={len(cb.markers)}")
+        for m in cb.markers:
+            print(f"  marker {m}")
+        for n in cb.notes():
+            print(f"  {n}")
+        return
+
+    if args.cmd == "pack":
+        ok = ng = 0
+        for p in _collect(args.paths, ".json"):
+            try:
+                meta = _meta_for(p)
+                data = encode_notes(_notes_of(_load_json(p)), float(meta.get("bpm") or 0.0),
+                                    meta.get("speedScaleMarkers") or [])
+                toolutil.write_atomic(bin_path_for(p), data)
+                print(f"[OK] {p} -> {bin_path_for(p)} ({len(data)} bytes)")
+                ok += 1
+            except Exception as e:
+                print(f"[NG] {p}: {e}")
+                ng += 1
+        print(f"== 完了 ok={ok}, ng={ng} ==")
+        sys.exit(1 if ng else 0)
+
+    bad = 0
+    files = _collect(args.paths, BIN_EXT)
+    for p in files:
+        problems, warnings = verify(p)
+        if problems:
+            bad += 1
+            print(f"[NG] {p}")
+            for msg in problems:
+                print(f"     {msg}")
+        else:
+            print(f"[OK] {p}")
+        for msg in warnings:
+            print(f"     [WARN] {msg}")
+    print(f"== 完了 total={len(files)}, ng={bad} ==")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
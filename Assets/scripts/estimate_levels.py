@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+譜面密度の解析から metadata.json の levels を自動で埋めるスクリプト。
+
+- 各曲フォルダの <difficulty>.json を読み、metadata.json の bpm で beat → 秒に変換（ゲーム側と同じ一定 BPM）
+- 1 譜面につき 1 パスで: ピーク NPS（スライディングウィンドウ）/ 平均 NPS / ロングの被覆率 /
+  フリック比率 / 連続ノーツ間のレーン移動量 を計算（クリティカルは判定が通常ノーツと同じなので見ない）
+- その統計から推定レベルを出し、levels に書き戻す（既に 0 以上の値は --overwrite 指定時のみ上書き）
+- 曲フォルダ単位でプロセスプール並列、結果は譜面ハッシュでキャッシュし再実行を省略。
+  キャッシュは StreamingAssets に入れない（ビルドに含まれる）: Unity プロジェクト内なら Library/levels_cache.json、
+  そうでなければ root の親フォルダの .levels_cache.json（--cache で指定も可）
+
+使い方:
+    python estimate_levels.py --root Assets/StreamingAssets/charts [--jobs 0] [--overwrite] [--dry-run]
+    python estimate_levels.py --root charts --cache /tmp/levels_cache.json
+"""
+
+import os, sys, json, argparse, hashlib
+from typing import Dict, List
+
+import toolutil
+from toolutil import file_sha256
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+CACHE_NAME = ".levels_cache.json"
+LIBRARY_CACHE_NAME = "levels_cache.json"
+# 統計や推定式を変えたら上げる（キャッシュが無効になる）
+ANALYZER_VERSION = "2"
+
+# 推定式: level = BASE + Σ 係数 × 統計量 を 1..LEVEL_MAX に丸める
+LEVEL_BASE = 3.0
+LEVEL_AVG_NPS = 2.2
+LEVEL_PEAK_NPS = 0.6
+LEVEL_FLICK = 4.0
+LEVEL_LANE_JUMP = 0.8
+LEVEL_LONG = 2.0
+LEVEL_MAX = 40
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def chart_stats(notes: List[Dict], bpm: float, window: float = 1.0) -> Dict:
+    """
+    One pass over time-sorted notes (guide は判定が無いので除外).
+    Returns counts and per-second stats; times are seconds at a constant bpm.
+    """
+    spb = 60.0 / bpm if bpm and bpm > 0 else 1.0
+    notes = [n for n in notes if n.get("type") != "guide"]
+    notes.sort(key=lambda n: float(n.get("time", 0.0)))
+    n = len(notes)
+    stats = {"notes": n, "duration": 0.0, "avgNps": 0.0, "peakNps": 0.0, "longCoverage": 0.0,
+             "flickRatio": 0.0, "laneJump": 0.0}
+    if n == 0:
+        return stats
+
+    times = []
+    flick = 0
+    jump_sum = 0.0
+    prev_center = None
+    peak = 0
+    lo = 0
+    cover = 0.0
+    cur_s = cur_e = None  # ロング区間の和集合（開始時刻順に来るのでマージしながら積算）
+    last_end = 0.0
+    for i, note in enumerate(notes):
+        t = float(note.get("time", 0.0)) * spb
+        times.append(t)
+        # スライディングウィンドウ [t - window, t]
+        while times[lo] < t - window:
+            lo += 1
+        peak = max(peak, i - lo + 1)
+
+        ty = note.get("type")
+        if ty == "flick":
+            flick += 1
+        center = int(note.get("lane", 1)) + 0.5 * int(note.get("width", 1))
+        if prev_center is not None:
+            jump_sum += abs(center - prev_center)
+        prev_center = center
+
+        hold = float(note.get("hold", 0.0) or 0.0) * spb
+        end = t + max(0.0, hold)
+        last_end = max(last_end, end)
+        if hold > 0:
+            if cur_e is None or t > cur_e:
+                if cur_e is not None:
+                    cover += cur_e - cur_s
+                cur_s, cur_e = t, end
+            else:
+                cur_e = max(cur_e, end)
+    if cur_e is not None:
+        cover += cur_e - cur_s
+
+    duration = max(last_end - times[0], window)
+    stats.update({
+        "duration": duration,
+        "avgNps": n / duration,
+        "peakNps": peak / window,
+        "longCoverage": min(1.0, cover / duration),
+        "flickRatio": flick / n,
+        "laneJump": jump_sum / (n - 1) if n > 1 else 0.0,
+    })
+    return stats
+
+
+def estimate_level(stats: Dict) -> int:
+    if not stats.get("notes"):
+        return -1
+    v = (LEVEL_BASE
+         + LEVEL_AVG_NPS * stats["avgNps"]
+         + LEVEL_PEAK_NPS * stats["peakNps"]
+         + LEVEL_FLICK * stats["flickRatio"]
+         + LEVEL_LANE_JUMP * stats["laneJump"]
+         + LEVEL_LONG * stats["longCoverage"])
+    return max(1, min(LEVEL_MAX, int(round(v))))
+
+
+def _load_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def analyze_song(job) -> Dict:
+    """Worker: job = (song_dir, bpm, window, [diff, ...]) -> {diff: {sha256, stats, level} or {error}}."""
+    song_dir, bpm, window, wanted = job
+    out = {}
+    for diff in wanted:
+        path = os.path.join(song_dir, f"{diff}.json")
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            doc = json.loads(raw.decode("utf-8"))
+            notes = doc if isinstance(doc, list) else (doc.get("array") or doc.get("notes") or [])
+            stats = chart_stats(notes, bpm, window)
+            out[diff] = {"sha256": sha256_bytes(raw), "stats": stats, "level": estimate_level(stats)}
+        except Exception as e:
+            out[diff] = {"error": str(e)}
+    return out
+
+
+def _cache_key(song_dir: str, root: str, diff: str) -> str:
+    return os.path.relpath(os.path.join(song_dir, f"{diff}.json"), root).replace(os.sep, "/")
+
+
+def default_cache_path(root: str) -> str:
+    """Unity プロジェクト（祖先の Assets の隣に ProjectSettings がある）なら <project>/Library、なければ root の親に置く。"""
+    d = root
+    while True:
+        parent = os.path.dirname(d)
+        if os.path.basename(d) == "Assets" and os.path.isdir(os.path.join(parent, "ProjectSettings")):
+            return os.path.join(parent, "Library", LIBRARY_CACHE_NAME)
+        if parent == d:
+            return os.path.join(os.path.dirname(root), CACHE_NAME)
+        d = parent
+
+
+def main():
+    ap = argparse.ArgumentParser(description="譜面密度から metadata.json の levels を推定して書き込む")
+    ap.add_argument("--root", required=True, help="chartsフォルダのパス")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    ap.add_argument("--window", type=float, default=1.0, help="ピーク NPS のウィンドウ幅（秒）")
+    ap.add_argument("--overwrite", action="store_true", help="既に設定されているレベルも上書きする")
+    ap.add_argument("--dry-run", action="store_true", help="metadata.json を書き換えずに結果だけ表示")
+    ap.add_argument("--force", action="store_true", help="キャッシュを使わずに全譜面を解析する")
+    ap.add_argument("--cache", metavar="FILE", default=None,
+                    help="解析キャッシュのパス（既定: Unity プロジェクトの Library/ か root の親フォルダ）")
+    args = ap.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"指定フォルダが存在しません: {root}")
+        sys.exit(1)
+
+    cache_path = os.path.abspath(args.cache) if args.cache else default_cache_path(root)
+    # 以前の版は root 直下（StreamingAssets 内）に置いていた
+    old_cache = os.path.join(root, CACHE_NAME)
+    cache: Dict[str, Dict] = {}
+    if not args.force:
+        try:
+            data = _load_json(cache_path)
+            if data.get("version") == ANALYZER_VERSION and data.get("window") == args.window:
+                cache = data.get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    # 曲フォルダを列挙し、キャッシュに無い（or 変わった）譜面だけをジョブにする
+    songs = []   # (song_dir, meta_path, meta, {diff: result})
+    jobs = []
+    with os.scandir(root) as it:
+        dirs = sorted(e.path for e in it if e.is_dir())
+    for song_dir in dirs:
+        meta_path = os.path.join(song_dir, "metadata.json")
+        try:
+            meta = _load_json(meta_path)
+        except (OSError, ValueError):
+            continue
+        bpm = float(meta.get("bpm") or 0.0)
+        results, wanted = {}, []
+        for diff in DIFFICULTIES:
+            path = os.path.join(song_dir, f"{diff}.json")
+            if not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            e = cache.get(_cache_key(song_dir, root, diff))
+            if e and "level" in e and e.get("bpm") == bpm:
+                if e.get("size") == st.st_size and e.get("mtime_ns") == st.st_mtime_ns:
+                    results[diff] = e
+                    continue
+                if e.get("sha256") == file_sha256(path):
+                    # touch されただけ：解析せずに stat だけ更新
+                    results[diff] = dict(e, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                    continue
+            wanted.append(diff)
+        songs.append((song_dir, meta_path, meta, results))
+        if wanted:
+            jobs.append((song_dir, bpm, args.window, wanted))
+
+    analyzed = {}
+    for job, res in zip(jobs, toolutil.map_jobs(analyze_song, jobs, args.jobs)):
+        analyzed[job[0]] = res
+
+    new_cache = {}
+    written = unchanged = errors = 0
+    for song_dir, meta_path, meta, results in songs:
+        bpm = float(meta.get("bpm") or 0.0)
+        for diff, res in analyzed.get(song_dir, {}).items():
+            if "error" in res:
+                print(f"[ERR] {song_dir}/{diff}.json: {res['error']}")
+                errors += 1
+                continue
+            st = os.stat(os.path.join(song_dir, f"{diff}.json"))
+            res.update({"bpm": bpm, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+            results[diff] = res
+        for diff, res in results.items():
+            new_cache[_cache_key(song_dir, root, diff)] = res
+
+        levels = dict(meta.get("levels") or {})
+        changed = False
+        for diff in DIFFICULTIES:
+            if diff not in results:
+                continue
+            lv = results[diff]["level"]
+            cur = levels.get(diff)
+            if cur is not None and isinstance(cur, (int, float)) and cur >= 0 and not args.overwrite:
+                continue
+            if cur != lv:
+                levels[diff] = lv
+                changed = True
+        summary = " ".join(f"{d}={results[d]['level']}({results[d]['stats']['peakNps']:.1f}nps)"
+                           for d in DIFFICULTIES if d in results)
+        if not changed:
+            unchanged += 1
+            continue
+        print(f"[LV] {os.path.basename(song_dir)}: {summary}")
+        if not args.dry_run:
+            # 既存のキー（標準外の難易度も）と順序はそのまま、無い標準難易度だけ -1 で足す
+            for d in DIFFICULTIES:
+                levels.setdefault(d, -1)
+            meta["levels"] = levels
+            toolutil.write_atomic(meta_path, json.dumps(meta, ensure_ascii=False, indent=2))
+        written += 1
+
+    if not args.dry_run:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        toolutil.write_atomic(cache_path, json.dumps(
+            {"version": ANALYZER_VERSION, "window": args.window, "entries": new_cache}, ensure_ascii=False))
+        if old_cache != cache_path and os.path.isfile(old_cache):
+            os.remove(old_cache)
+    print(f"=== 完了: songs={len(songs)}, analyzed={sum(len(j[3]) for j in jobs)}, "
+          f"updated={written}, unchanged={unchanged}, errors={errors} ===")
+
+
+if __name__ == "__main__":
+    main()
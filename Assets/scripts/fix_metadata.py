@@ -2,40 +2,40 @@
 # -*- coding: utf-8 -*-
 """
 全ての metadata.json から offset, rootoffsetMs を削除し、
-"rootoffset": 1200 を追加するスクリプト。
+"rootoffsetMs": 1200 を設定するスクリプト。
+migrate_metadata の操作を chart_pipeline の metadata ステージとして実行するので、内容が変わるファイルだけを書き換える
+（譜面ファイルは開かない。mmw4cc_to_mygame.py --stages fix_metadata なら変換と同時に当てられる）。
 
 使い方:
-    python fix_metadata.py --root Assets/StreamingAssets/charts
+    python fix_metadata.py --root Assets/StreamingAssets/charts [--dry-run]
 """
 
-import json
 import argparse
 from pathlib import Path
 
-def process_metadata(meta_path: Path):
-    try:
-        data = json.loads(meta_path.read_text(encoding="utf-8"))
-    except Exception as e:
-        print(f"[ERR] {meta_path}: JSON読み込み失敗: {e}")
-        return
+import chart_pipeline
+import toolstats
 
+OPS = [
     # 不要キー削除
-    data.pop("offset", None)
-    data.pop("rootoffsetMs", None)
-
+    {"op": "remove", "key": "offset"},
+    {"op": "remove", "key": "rootoffsetMs"},
     # rootoffsetを1200に設定
-    data["rootoffsetMs"] = 1200
+    {"op": "set", "key": "rootoffsetMs", "value": 1200},
+]
 
-    try:
-        meta_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-        print(f"[OK] {meta_path}")
-    except Exception as e:
-        print(f"[ERR] {meta_path}: 書き込み失敗: {e}")
+
+def stage():
+    """chart_pipeline のステージ（STAGES["fix_metadata"]）。"""
+    return chart_pipeline.metadata_ops(OPS)
 
 
 def main():
     parser = argparse.ArgumentParser(description="metadata.jsonを一括修正")
     parser.add_argument("--root", required=True, help="chartsフォルダのパス")
+    parser.add_argument("--dry-run", action="store_true", help="書き換えずに変更内容だけ表示")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(parser)
     args = parser.parse_args()
 
     root = Path(args.root)
@@ -43,13 +43,12 @@ def main():
         print(f"指定フォルダが存在しません: {root}")
         return
 
-    count = 0
-    for meta in root.rglob("metadata.json"):
-        process_metadata(meta)
-        count += 1
-
-    print(f"=== 完了: {count}ファイル修正 ===")
+    # 毎回すべてに当てる一回きりの修正なので migrate_metadata の ledger は使わない
+    c = chart_pipeline.run(str(root), ["fix_metadata"], jobs=args.jobs, dry_run=args.dry_run,
+                           stats=toolstats.from_args("fix_metadata", args))
+    print(f"=== 完了: {c['changed']}ファイル修正 (対象 {c['total']}, 変更なし {c['unchanged']}, "
+          f"エラー {c['errors']}) ===")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
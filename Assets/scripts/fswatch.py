@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+フォルダの変更監視（--watch 用）。外部パッケージは使わない。
+
+- Linux では inotify を ctypes で直接呼ぶ（IN_CLOSE_WRITE / IN_MOVED_TO などの「書き終わった」イベントだけ見る）
+  サブフォルダにも watch を張り、後から作られたフォルダにも追加する
+- inotify が使えない環境（macOS / Windows など）は os.scandir で (size, mtime_ns) のスナップショットを比べるポーリング
+- どちらも wait(timeout) で「変わったパスの集合」を返す。debounce() でエディタの連続保存をまとめる
+
+使い方:
+    with open_watcher(root, exts={".usc", ".json"}) as w:
+        while True:
+            changed = debounce(w, 0.3)
+"""
+
+import os, sys, time, errno, select, struct
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+POLL_INTERVAL = 0.5
+# inotify のイベントが溢れたときなど、個別のパスがわからない変更を表す
+RESCAN = "*"
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# IN_MODIFY は書き込み途中で何度も来るので見ない（閉じた / rename されたときだけ）
+_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+         | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+
+def _wanted(name: str, exts: Optional[Set[str]]) -> bool:
+    if name.startswith(".") or name.endswith(".tmp"):
+        return False
+    return exts is None or os.path.splitext(name)[1].lower() in exts
+
+
+class _Watcher:
+    kind = "?"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(_Watcher):
+    """inotify via ctypes (Linux)."""
+    kind = "inotify"
+
+    def __init__(self, root: str, exts: Optional[Set[str]] = None, recursive: bool = True):
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self._ctypes = ctypes
+        self.root = os.path.abspath(root)
+        self.exts = exts
+        self.recursive = recursive
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self.dirs: Dict[int, str] = {}
+        self._add_tree(self.root)
+
+    def _add(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _MASK)
+        if wd < 0:
+            e = self._ctypes.get_errno()
+            if e in (errno.ENOENT, errno.ENOTDIR):  # 監視前に消えた
+                return
+            raise OSError(e, f"inotify_add_watch {path}: {os.strerror(e)}")
+        self.dirs[wd] = path
+
+    def _add_tree(self, top: str):
+        self._add(top)
+        if not self.recursive:
+            return
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for d in dirnames:
+                self._add(os.path.join(dirpath, d))
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            off = 0
+            while off < len(buf):
+                wd, mask, _, n = _EVENT.unpack_from(buf, off)
+                name = os.fsdecode(buf[off + _EVENT.size:off + _EVENT.size + n].rstrip(b"\0"))
+                off += _EVENT.size + n
+                if mask & _IN_Q_OVERFLOW:
+                    changed.add(RESCAN)
+                    continue
+                if mask & _IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                base = self.dirs.get(wd)
+                if base is None:
+                    continue
+                path = os.path.join(base, name) if name else base
+                if mask & _IN_ISDIR:
+                    if name.startswith("."):
+                        continue
+                    if mask & (_IN_CREATE | _IN_MOVED_TO) and self.recursive:
+                        self._add_tree(path)  # 中身ごと移動されてきたフォルダもあるので全体を見直す
+                    changed.add(RESCAN)
+                elif mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                    changed.add(RESCAN)
+                elif _wanted(name, self.exts):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollWatcher(_Watcher):
+    """os.scandir snapshot polling (size, mtime_ns) for platforms without inotify."""
+    kind = "polling"
+
+    def __init__(self, root: str, exts: Optional[Set[str]] = None, recursive: bool = True,
+                 interval: float = POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.exts = exts
+        self.recursive = recursive
+        self.interval = interval
+        self.snap = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        out = {}
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for e in it:
+                        try:
+                            if e.is_dir(follow_symlinks=False):
+                                if self.recursive and not e.name.startswith("."):
+                                    stack.append(e.path)
+                            elif _wanted(e.name, self.exts):
+                                st = e.stat()
+                                out[e.path] = (st.st_size, st.st_mtime_ns)
+                        except FileNotFoundError:
+                            pass
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+        return out
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            step = self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic()))
+            time.sleep(step)
+            snap = self._scan()
+            old, self.snap = self.snap, snap
+            changed = {p for p in old.keys() | snap.keys() if old.get(p) != snap.get(p)}
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+
+def open_watcher(root: str, exts: Optional[Iterable[str]] = None, recursive: bool = True,
+                 poll_interval: float = POLL_INTERVAL, force_poll: bool = False) -> _Watcher:
+    """InotifyWatcher when possible, else PollWatcher."""
+    exts = {e.lower() for e in exts} if exts is not None else None
+    if not force_poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, exts, recursive)
+        except (OSError, AttributeError):
+            pass
+    return PollWatcher(root, exts, recursive, poll_interval)
+
+
+def debounce(watcher: _Watcher, quiet: float, timeout: Optional[float] = None) -> Set[str]:
+    """
+    Block until something changes, then keep collecting until nothing new arrives for `quiet` seconds
+    (エディタの「一時ファイルに書いて rename」や連続保存を 1 回にまとめる). Empty set on timeout.
+    """
+    changed = watcher.wait(timeout)
+    if not changed:
+        return changed
+    while True:
+        more = watcher.wait(quiet)
+        if not more:
+            return changed
+        changed |= more
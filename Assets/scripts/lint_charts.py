@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+charts フォルダ全体の譜面 / metadata.json を検査するリンター（CI 用に JSON レポートと終了コードを返す）。
+
+譜面 (<difficulty>.json) のチェック:
+- lane_range      lane が 1..12 の整数でない
+- width_range     width が 1 以上の整数でない
+- width_overflow  lane + width - 1 が 12 を超える
+- unknown_type    type が normal/critical/flick/long/guide 以外
+- bad_time        time / hold が数値でない・有限でない
+- negative_hold   hold < 0
+- overlap         同じ時刻の判定ノーツ同士がレーンで重なっている
+- hold_overlap    ロングの最中（開始と終了の間）に同じレーンへ別のノーツが来る
+- unsorted        time が昇順でない（ゲーム側で並べ直すので warning）
+重なりの検出は時刻順のスイープライン（同時刻グループ内はレーン区間のソート、ロングはレーンごとの
+アクティブ集合 + 終了時刻のヒープ）で O(n log n)。guide は判定が無いので重なりの対象外。
+
+metadata.json のチェック: 読めるか / bpm > 0 / speedScaleMarkers が beat 昇順で forward・reverse が数値 /
+levels・difficulties の値が整数 / tempoMap の列が揃っているか
+
+使い方:
+    python lint_charts.py --root Assets/StreamingAssets/charts [--report lint.json] [--jobs 0] [--strict]
+"""
+
+import os, sys, json, math, heapq, argparse
+from typing import Dict, List
+
+import toolutil
+from tempo_map import TempoMap
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+NOTE_TYPES = ("normal", "critical", "flick", "long", "guide")
+LANES = 12
+# 同時刻とみなす拍の差
+TIME_EPS = 1e-6
+# 1 譜面・1 コードあたりレポートに載せる件数（件数自体は counts に全部入る）
+MAX_ISSUES_PER_CODE = 20
+REPORT_VERSION = 1
+
+ERROR, WARNING = "error", "warning"
+SEVERITY = {
+    "lane_range": ERROR, "width_range": ERROR, "width_overflow": ERROR, "unknown_type": ERROR,
+    "bad_time": ERROR, "negative_hold": ERROR, "overlap": ERROR, "hold_overlap": ERROR,
+    "unsorted": WARNING, "parse": ERROR,
+    "meta_missing": ERROR, "meta_parse": ERROR, "bpm": ERROR, "markers": ERROR, "markers_unsorted": ERROR,
+    "levels": WARNING, "tempo_map": ERROR, "no_charts": WARNING,
+}
+
+
+class Issues:
+    """Collects issues with a per-code cap; counts keep the full totals."""
+
+    def __init__(self):
+        self.items: List[Dict] = []
+        self.counts: Dict[str, int] = {}
+
+    def add(self, code: str, message: str, **where):
+        n = self.counts.get(code, 0)
+        self.counts[code] = n + 1
+        if n < MAX_ISSUES_PER_CODE:
+            self.items.append(dict({"code": code, "severity": SEVERITY[code], "message": message}, **where))
+
+    def total(self, severity: str) -> int:
+        return sum(n for code, n in self.counts.items() if SEVERITY[code] == severity)
+
+
+def _is_int(v) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _is_num(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+
+def lint_notes(notes: List, issues: Issues):
+    """All chart checks over one note list."""
+    valid = []  # (time, lane_lo, lane_hi, hold, index) 判定ノーツのうち位置の正しいもの
+    prev_t = None
+    for i, n in enumerate(notes):
+        if not isinstance(n, dict):
+            issues.add("parse", "note is not an object", index=i)
+            continue
+        t, lane, width, ty = n.get("time"), n.get("lane"), n.get("width", 1), n.get("type", "normal")
+        hold = n.get("hold", 0.0)
+        ok = True
+        if not _is_num(t) or not _is_num(hold):
+            issues.add("bad_time", f"time={t!r} hold={hold!r}", index=i)
+            continue
+        if prev_t is not None and t < prev_t - TIME_EPS:
+            issues.add("unsorted", f"time {t} < previous {prev_t}", index=i, time=t)
+        prev_t = t
+        if ty not in NOTE_TYPES:
+            issues.add("unknown_type", f"type={ty!r}", index=i, time=t)
+            ok = False
+        if not _is_int(lane) or not 1 <= lane <= LANES:
+            issues.add("lane_range", f"lane={lane!r}", index=i, time=t)
+            ok = False
+        if not _is_int(width) or width < 1:
+            issues.add("width_range", f"width={width!r}", index=i, time=t)
+            ok = False
+        elif ok and lane + width - 1 > LANES:
+            issues.add("width_overflow", f"lane {lane} + width {width} - 1 > {LANES}", index=i, time=t)
+            ok = False
+        if hold < 0:
+            issues.add("negative_hold", f"hold={hold}", index=i, time=t)
+            ok = False
+        if ok and ty != "guide":
+            valid.append((t, lane, lane + width - 1, hold if ty == "long" else 0.0, i))
+
+    valid.sort()
+    _sweep_overlaps(valid, issues)
+
+
+def _sweep_overlaps(events: List, issues: Issues):
+    """events: time-sorted (time, lo, hi, hold, index)."""
+    active = [dict() for _ in range(LANES + 1)]  # lane -> {index: (start, end)}
+    ends = []  # (end, index, lo, hi)
+    k, n = 0, len(events)
+    while k < n:
+        t = events[k][0]
+        # ---- 同時刻グループ: レーン区間を左端でソートして隣接だけ比べる
+        j = k
+        while j < n and events[j][0] - t <= TIME_EPS:
+            j += 1
+        group = sorted(events[k:j], key=lambda e: (e[1], e[2]))
+        reach, owner = 0, None
+        for e in group:
+            if e[1] <= reach:
+                issues.add("overlap", f"notes #{owner} and #{e[4]} share lanes at time {t}",
+                           index=e[4], time=e[0], other=owner)
+            if e[2] > reach:
+                reach, owner = e[2], e[4]
+        # ---- ロング: 終わったものを外してから、このグループがアクティブなロングに入っていないか
+        while ends and ends[0][0] <= t + TIME_EPS:
+            _, idx, lo, hi = heapq.heappop(ends)
+            for lane in range(lo, hi + 1):
+                active[lane].pop(idx, None)
+        for e in group:
+            hit = None
+            for lane in range(e[1], e[2] + 1):
+                for idx, (start, _) in active[lane].items():
+                    if start < e[0] - TIME_EPS:
+                        hit = idx
+                        break
+                if hit is not None:
+                    break
+            if hit is not None:
+                issues.add("hold_overlap", f"note #{e[4]} at time {e[0]} is inside hold #{hit}",
+                           index=e[4], time=e[0], other=hit)
+        for e in group:
+            if e[3] > TIME_EPS:
+                end = e[0] + e[3]
+                heapq.heappush(ends, (end, e[4], e[1], e[2]))
+                for lane in range(e[1], e[2] + 1):
+                    active[lane][e[4]] = (e[0], end)
+        k = j
+
+
+def lint_chart(path: str) -> Dict:
+    issues = Issues()
+    notes = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        if isinstance(doc, list):
+            notes = doc
+        elif isinstance(doc, dict) and isinstance(doc.get("array") or doc.get("notes") or [], list):
+            notes = doc.get("array") or doc.get("notes") or []
+        else:
+            issues.add("parse", "chart is not a note list")
+    except (OSError, ValueError) as e:
+        issues.add("parse", str(e))
+    if not issues.counts.get("parse"):
+        lint_notes(notes, issues)
+    return {"file": os.path.basename(path), "notes": len(notes), "issues": issues.items, "counts": issues.counts,
+            "errors": issues.total(ERROR), "warnings": issues.total(WARNING)}
+
+
+def lint_metadata(path: str, issues: Issues):
+    if not os.path.isfile(path):
+        issues.add("meta_missing", "metadata.json がありません")
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not isinstance(meta, dict):
+            raise ValueError("not an object")
+    except (OSError, ValueError) as e:
+        issues.add("meta_parse", str(e))
+        return
+    bpm = meta.get("bpm")
+    if not _is_num(bpm) or bpm <= 0:
+        issues.add("bpm", f"bpm={bpm!r}")
+    markers = meta.get("speedScaleMarkers")
+    if markers is not None:
+        if not isinstance(markers, list):
+            issues.add("markers", "speedScaleMarkers is not a list")
+        else:
+            prev = None
+            for i, m in enumerate(markers):
+                if not isinstance(m, dict) or not all(_is_num(m.get(k, 0.0)) for k in ("beat", "forward", "reverse")):
+                    issues.add("markers", f"marker #{i}: {m!r}", index=i)
+                    continue
+                b = float(m.get("beat", 0.0))
+                if prev is not None and b < prev:
+                    issues.add("markers_unsorted", f"marker #{i}: beat {b} < previous {prev}", index=i)
+                prev = b
+    for key in ("levels", "difficulties"):
+        lv = meta.get(key)
+        if lv is None:
+            continue
+        if not isinstance(lv, dict):
+            issues.add("levels", f"{key} is not an object")
+            continue
+        for d, v in lv.items():
+            if v is not None and not _is_int(v):
+                issues.add("levels", f"{key}.{d}={v!r}")
+    if "tempoMap" in meta:
+        try:
+            tm = TempoMap.from_json(meta["tempoMap"])
+            if any(b < a for a, b in zip(tm.beat, tm.beat[1:])):
+                raise ValueError("tempoMap beats are not sorted")
+        except (ValueError, TypeError, AttributeError) as e:
+            issues.add("tempo_map", str(e))
+
+
+def lint_song(song_dir: str) -> Dict:
+    """Worker: one song folder -> report entry."""
+    meta_issues = Issues()
+    lint_metadata(os.path.join(song_dir, "metadata.json"), meta_issues)
+    charts = [lint_chart(os.path.join(song_dir, f"{d}.json")) for d in DIFFICULTIES
+              if os.path.isfile(os.path.join(song_dir, f"{d}.json"))]
+    if not charts and not any(os.path.isfile(os.path.join(song_dir, f"{d}.sus")) for d in DIFFICULTIES):
+        meta_issues.add("no_charts", "難易度の譜面がありません")
+    return {"folder": os.path.basename(song_dir), "metadata": meta_issues.items, "metadataCounts": meta_issues.counts,
+            "charts": charts,
+            "errors": meta_issues.total(ERROR) + sum(c["errors"] for c in charts),
+            "warnings": meta_issues.total(WARNING) + sum(c["warnings"] for c in charts)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="charts フォルダの譜面と metadata.json を検査")
+    ap.add_argument("--root", required=True, help="chartsフォルダのパス")
+    ap.add_argument("--report", default=None, help="JSON レポートの出力先（- で標準出力）")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    ap.add_argument("--strict", action="store_true", help="warning でも終了コードを 1 にする")
+    ap.add_argument("--quiet", "-q", action="store_true", help="問題のあった曲の一覧を表示しない")
+    args = ap.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"指定フォルダが存在しません: {root}", file=sys.stderr)
+        sys.exit(2)
+    with os.scandir(root) as it:
+        dirs = sorted(e.path for e in it if e.is_dir() and not e.name.startswith("."))
+
+    songs = list(toolutil.map_jobs(lint_song, dirs, args.jobs))
+
+    errors = sum(s["errors"] for s in songs)
+    warnings = sum(s["warnings"] for s in songs)
+    n_charts = sum(len(s["charts"]) for s in songs)
+    report = {"version": REPORT_VERSION, "root": root,
+              "summary": {"songs": len(songs), "charts": n_charts, "errors": errors, "warnings": warnings},
+              "songs": songs}
+
+    # 人間向けの表示は stderr（--report - のとき stdout を JSON だけにする）
+    log = sys.stderr if args.report == "-" else sys.stdout
+    if not args.quiet:
+        for s in songs:
+            if not s["errors"] and not s["warnings"]:
+                continue
+            tag = "NG" if s["errors"] else "WARN"
+            print(f"[{tag}] {s['folder']}: errors={s['errors']}, warnings={s['warnings']}", file=log)
+            for it in s["metadata"]:
+                print(f"     metadata.json {it['code']}: {it['message']}", file=log)
+            for c in s["charts"]:
+                for code, n in sorted(c["counts"].items()):
+                    print(f"     {c['file']} {code} x{n}", file=log)
+    if args.report == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    elif args.report:
+        toolutil.write_atomic(args.report, json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"== 完了 songs={len(songs)}, charts={n_charts}, errors={errors}, warnings={warnings} ==", file=log)
+    sys.exit(1 if errors or (args.strict and warnings) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # make_metadata.py
-import os, json, argparse, sys
+import os, json, time, argparse, sys
+
+import toolstats
+from toolutil import write_atomic
 
 TEMPLATE = {
     "title": None,             # ← フォルダー名で埋める
@@ -20,6 +23,7 @@ def main():
     ap = argparse.ArgumentParser(description="Create metadata.json in each subfolder.")
     ap.add_argument("--base", required=True, help="Base folder path (e.g., /Users/tk/Downloads/pjsk)")
     ap.add_argument("--overwrite", action="store_true", help="Overwrite existing metadata.json")
+    toolstats.add_arguments(ap)
     args = ap.parse_args()
 
     base = args.base
@@ -27,33 +31,44 @@ def main():
         print(f"Base not found or not a directory: {base}", file=sys.stderr)
         sys.exit(1)
 
-    made = updated = skipped = 0
+    made = updated = unchanged = skipped = 0
 
     # サブフォルダーだけを対象にする
-    for entry in sorted(os.listdir(base)):
+    entries = [e for e in sorted(os.listdir(base)) if os.path.isdir(os.path.join(base, e))]
+    stats = toolstats.from_args("make_metadata", args, total=len(entries))
+    for entry in entries:
         subdir = os.path.join(base, entry)
-        if not os.path.isdir(subdir):
-            continue
+        t0 = time.perf_counter()
 
         target = os.path.join(subdir, "metadata.json")
         if os.path.exists(target) and not args.overwrite:
             skipped += 1
+            stats.file(target, "skipped")
             continue
 
         data = TEMPLATE.copy()
         data["title"] = entry  # フォルダー名をそのまま使う
 
-        # JSONをUTF-8（日本語などもそのまま）で書き出す
-        with open(target, "w", encoding="utf-8", newline="\n") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            f.write("\n")
+        # JSONをUTF-8（日本語などもそのまま）で書き出す。同じ内容なら書き換えない（mtime を保つ）
+        text = json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+        existed = os.path.exists(target)
+        if existed:
+            with open(target, "r", encoding="utf-8") as f:
+                if f.read() == text:
+                    unchanged += 1
+                    stats.file(target, "unchanged", time.perf_counter() - t0)
+                    continue
+        write_atomic(target, text)
 
-        if os.path.exists(target) and args.overwrite:
+        if existed:
             updated += 1
         else:
             made += 1
+        stats.file(target, "updated" if existed else "created", time.perf_counter() - t0,
+                   line=f"[OK] {target}", bytesOut=len(text.encode("utf-8")))
 
-    print(f"Done. created={made}, updated={updated}, skipped={skipped}")
+    stats.finish(created=made, updated=updated, unchanged=unchanged, skipped=skipped)
+    print(f"Done. created={made}, updated={updated}, unchanged={unchanged}, skipped={skipped}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
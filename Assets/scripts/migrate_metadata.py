@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+metadata.json を宣言的なマイグレーション（順番つきの操作リスト）で一括更新するスクリプト。
+
+- 操作: set / remove / rename / default（無いときだけ入れる）/ computed（COMPUTED の関数で値を作る）
+  key は "levels.easy" のようなドット区切りでネストしたキーも指定できる。
+  "if" / "unless" にキーを書くと、そのキーの値が空でない（0 / null / "" 以外）とき / でないときだけ当てる
+- マイグレーションは version と name で識別する。適用済みのもの（"<version>:<name>"）は <root>/.metadata_migrations.json に
+  ファイルごとに (size, mtime, sha256) と一緒に記録し、再実行ではまだ当てていないものだけを当てる
+  （--spec を替えて同じ version の別マイグレーションを当てても取りこぼさない）
+  （全部済みで stat も同じなら読みもしない。別ツールで作り直されたファイルは最初から当て直す）
+- 中身（シリアライズ結果）が変わったファイルだけを一時ファイル + rename で書き換える（mtime を無駄に変えない）
+- ファイル単位でプロセスプール並列、--dry-run で変更内容の一覧だけ表示
+- 書き換えたファイルの行は --verbose のときだけ（既定は進捗 1 行）。--stats FILE / --profile は toolstats.py
+
+マイグレーション定義（--spec）:
+    {"migrations": [
+      {"version": 3, "name": "levels", "ops": [
+        {"op": "rename",   "key": "difficulties", "to": "levels"},
+        {"op": "default",  "key": "rootoffsetMs", "value": 1200},
+        {"op": "computed", "key": "title", "fn": "folderName", "overwrite": false},
+        {"op": "remove",   "key": "offset", "if": "rootoffsetMs"}
+      ]}
+    ]}
+省略時は MIGRATIONS（make_metadata.py のテンプレート補完 + offset の整理）を使う。
+
+使い方:
+    python migrate_metadata.py --root Assets/StreamingAssets/charts [--spec FILE] [--create] [--dry-run] [--jobs 0]
+"""
+
+import os, sys, json, time, argparse, hashlib, copy
+from typing import Dict, List, Optional, Set, Tuple
+
+import toolstats
+import toolutil
+
+LEDGER_NAME = ".metadata_migrations.json"
+OPS = ("set", "remove", "rename", "default", "computed")
+
+# 既定のマイグレーション（version は増やす一方で、既存の番号の中身は変えないこと）
+MIGRATIONS = [
+    {"version": 1, "name": "template", "ops": [
+        # make_metadata.py の TEMPLATE と同じキーを、無いものだけ補う
+        {"op": "computed", "key": "title", "fn": "folderName", "overwrite": False},
+        {"op": "default", "key": "artist", "value": None},
+        {"op": "default", "key": "bpm", "value": None},
+        {"op": "default", "key": "difficulties",
+         "value": {"easy": None, "normal": None, "hard": None, "expert": None, "master": None}},
+        {"op": "default", "key": "speedScaleMarkers", "value": []},
+    ]},
+    {"version": 2, "name": "rootoffset", "ops": [
+        # MusicPlayer は rootoffsetMs が 0 のときだけ offset（秒）で音源を遅らせる（ObjClone は rootoffsetMs だけを見る）。
+        # rootoffsetMs に移すと譜面も一緒にずれてしまうので、offset は効いていないときだけ消す
+        {"op": "remove", "key": "offset", "if": "rootoffsetMs"},
+        {"op": "remove", "key": "offset", "unless": "offset"},
+        # offset が効いている曲に rootoffsetMs を足すと offset が無視されるようになるので入れない
+        {"op": "default", "key": "rootoffsetMs", "value": 1200, "unless": "offset"},
+    ]},
+]
+
+
+# ---- computed の関数: (data, ctx, op) -> value ----
+def _folder_name(data: Dict, ctx: Dict, op: Dict):
+    return ctx["folder"]
+
+
+def _copy(data: Dict, ctx: Dict, op: Dict):
+    found, v = get_path(data, op["from"])
+    return copy.deepcopy(v) if found else op.get("value")
+
+
+def _scale(data: Dict, ctx: Dict, op: Dict):
+    found, v = get_path(data, op["from"])
+    if not found or not isinstance(v, (int, float)) or isinstance(v, bool):
+        return op.get("value")
+    r = v * float(op.get("factor", 1.0))
+    return int(round(r)) if op.get("round") else r
+
+
+COMPUTED = {
+    "folderName": _folder_name,  # 曲フォルダ名
+    "copy": _copy,               # "from" のキーの値（無ければ "value"）
+    "scale": _scale,             # "from" の数値 × "factor"（"round": true で整数に）
+}
+
+
+# ---- ドット区切りキー ----
+def _split(key: str) -> List[str]:
+    return key.split(".")
+
+
+def get_path(data: Dict, key: str) -> Tuple[bool, object]:
+    cur = data
+    for part in _split(key):
+        if not isinstance(cur, dict) or part not in cur:
+            return False, None
+        cur = cur[part]
+    return True, cur
+
+
+def is_set(data: Dict, key: str) -> bool:
+    """key があって値が空でない（0 / null / "" / [] / {} 以外）。"""
+    found, v = get_path(data, key)
+    return found and bool(v)
+
+
+def set_path(data: Dict, key: str, value):
+    parts = _split(key)
+    cur = data
+    for part in parts[:-1]:
+        nxt = cur.get(part)
+        if not isinstance(nxt, dict):
+            nxt = cur[part] = {}
+        cur = nxt
+    cur[parts[-1]] = value
+
+
+def remove_path(data: Dict, key: str) -> bool:
+    parts = _split(key)
+    cur = data
+    for part in parts[:-1]:
+        cur = cur.get(part) if isinstance(cur, dict) else None
+        if not isinstance(cur, dict):
+            return False
+    if parts[-1] not in cur:
+        return False
+    del cur[parts[-1]]
+    return True
+
+
+def rename_path(data: Dict, key: str, to: str):
+    found, v = get_path(data, key)
+    if not found:
+        return
+    src, dst = _split(key), _split(to)
+    if src[:-1] == dst[:-1]:
+        # 同じ階層ならキーの位置を保ったまま名前だけ変える
+        parent = data
+        for part in src[:-1]:
+            parent = parent[part]
+        items = [(dst[-1] if k == src[-1] else k, val) for k, val in parent.items() if k != dst[-1]]
+        parent.clear()
+        parent.update(items)
+    else:
+        remove_path(data, key)
+        set_path(data, to, v)
+
+
+def validate(migrations: List[Dict]):
+    seen = set()
+    for m in migrations:
+        v = m.get("version")
+        if not isinstance(v, int) or v in seen:
+            raise ValueError(f"migration version must be a unique int: {v!r}")
+        seen.add(v)
+        for op in m.get("ops", []):
+            kind = op.get("op")
+            if kind not in OPS or not isinstance(op.get("key"), str):
+                raise ValueError(f"migration {v}: bad op {op!r}")
+            if kind in ("set", "default") and "value" not in op:
+                raise ValueError(f"migration {v}: {kind} needs value: {op!r}")
+            if kind == "rename" and not isinstance(op.get("to"), str):
+                raise ValueError(f"migration {v}: rename needs to: {op!r}")
+            if any(c in op and not isinstance(op[c], str) for c in ("if", "unless")):
+                raise ValueError(f"migration {v}: if / unless takes a key: {op!r}")
+            if kind == "computed" and op.get("fn") not in COMPUTED:
+                raise ValueError(f"migration {v}: unknown fn {op.get('fn')!r} (known: {', '.join(COMPUTED)})")
+
+
+def apply_ops(data: Dict, ops: List[Dict], ctx: Dict) -> Dict:
+    """Apply ops in order to data (modified in place and returned)."""
+    for op in ops:
+        kind, key = op["op"], op["key"]
+        if "if" in op and not is_set(data, op["if"]):
+            continue
+        if "unless" in op and is_set(data, op["unless"]):
+            continue
+        if kind == "set":
+            set_path(data, key, copy.deepcopy(op["value"]))
+        elif kind == "remove":
+            remove_path(data, key)
+        elif kind == "rename":
+            rename_path(data, key, op["to"])
+        elif kind == "default":
+            if not get_path(data, key)[0]:
+                set_path(data, key, copy.deepcopy(op["value"]))
+        elif kind == "computed":
+            found, cur = get_path(data, key)
+            if not found or op.get("overwrite", True) or cur is None:
+                set_path(data, key, COMPUTED[op["fn"]](data, ctx, op))
+    return data
+
+
+def dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def diff_lines(old, new, prefix: str = "") -> List[str]:
+    """Key-level summary: '+ key: v', '- key', '~ key: a -> b'."""
+    out = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in old:
+            if k not in new:
+                out.append(f"- {prefix}{k}")
+        for k, v in new.items():
+            if k not in old:
+                out.append(f"+ {prefix}{k}: {json.dumps(v, ensure_ascii=False)}")
+            else:
+                out.extend(diff_lines(old[k], v, f"{prefix}{k}."))
+        if not out and list(old) != list(new):
+            out.append(f"~ {prefix.rstrip('.') or '(root)'}: key order")
+        return out
+    if old != new or type(old) is not type(new):
+        out.append(f"~ {prefix.rstrip('.')}: {json.dumps(old, ensure_ascii=False)} -> {json.dumps(new, ensure_ascii=False)}")
+    return out
+
+
+def migrate_file(job) -> Dict:
+    """
+    Worker: (path, folder, ops, dry_run, create) -> {path, status, diff, sha256, error, seconds, bytesIn, bytesOut}.
+    status: changed / unchanged / created / error
+    """
+    path, folder, ops, dry_run, create = job
+    res = {"path": path, "status": "unchanged", "diff": [], "sha256": None, "error": None,
+           "seconds": 0.0, "bytesIn": 0, "bytesOut": 0}
+    t0 = time.perf_counter()
+    try:
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            res["bytesIn"] = len(text.encode("utf-8"))
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValueError("metadata.json is not an object")
+        elif create:
+            text, data = None, {}
+        else:
+            raise FileNotFoundError(path)
+        before = dumps(data)
+        new = apply_ops(copy.deepcopy(data), ops, {"folder": folder, "path": path})
+        after = dumps(new)
+        if text is not None and after == before:
+            res["sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        else:
+            # 末尾改行の有無は元のファイルに合わせる（新規は make_metadata.py と同じく改行あり）
+            out_text = after + ("\n" if text is None or text.endswith("\n") else "")
+            data_out = out_text.encode("utf-8")
+            res["status"] = "created" if text is None else "changed"
+            res["diff"] = diff_lines(data, new)
+            res["sha256"] = hashlib.sha256(data_out).hexdigest()
+            if not dry_run:
+                toolutil.write_atomic(path, out_text)
+                res["bytesOut"] = len(data_out)
+    except Exception as e:
+        res["status"], res["error"] = "error", str(e)
+    res["seconds"] = time.perf_counter() - t0
+    return res
+
+
+def migration_id(m: Dict) -> str:
+    return f"{m['version']}:{m.get('name', '')}"
+
+
+def applied_ids(path: str, entry: Optional[Dict]) -> Set[str]:
+    """Migrations recorded in the ledger, if the file is still the one that was recorded (stat, then sha256)."""
+    if not entry or not os.path.isfile(path):
+        return set()
+    st = os.stat(path)
+    if entry.get("size") == st.st_size and entry.get("mtimeNs") == st.st_mtime_ns:
+        return set(entry.get("applied", []))
+    with open(path, "rb") as f:
+        if hashlib.sha256(f.read()).hexdigest() == entry.get("sha256"):
+            entry["size"], entry["mtimeNs"] = st.st_size, st.st_mtime_ns
+            return set(entry.get("applied", []))
+    return set()
+
+
+def collect_metadata(root: str, create: bool) -> List[Tuple[str, str]]:
+    """(metadata path, song folder name) for every metadata.json under root (+ missing ones if create)."""
+    found = []
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        if "metadata.json" in files:
+            found.append(os.path.join(dirpath, "metadata.json"))
+    if create:
+        with os.scandir(root) as it:
+            found.extend(os.path.join(e.path, "metadata.json") for e in it
+                         if e.is_dir() and not e.name.startswith(".")
+                         and not os.path.exists(os.path.join(e.path, "metadata.json")))
+    return [(p, os.path.basename(os.path.dirname(p))) for p in sorted(set(found))]
+
+
+def run(root: str, migrations: List[Dict], jobs: int = 0, dry_run: bool = False, create: bool = False,
+        ledger: bool = True, verbose: bool = True, stats: Optional["toolstats.RunStats"] = None) -> Dict[str, int]:
+    """
+    Run the migrations over root. ledger=False ignores/keeps no record (always applies all ops).
+    stats: toolstats.RunStats for per-file records (default: one that prints changed files when verbose).
+    dry-run の差分は stats の verbose に関係なく表示する。
+    """
+    if stats is None:
+        stats = toolstats.RunStats("migrate_metadata", verbose=verbose)
+    validate(migrations)
+    migrations = sorted(migrations, key=lambda m: m["version"])
+    ids = {migration_id(m) for m in migrations}
+    ledger_path = os.path.join(root, LEDGER_NAME)
+    entries: Dict[str, Dict] = {}
+    if ledger:
+        try:
+            with open(ledger_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            entries = {}
+
+    work = []
+    skipped = 0
+    with stats.stage("scan"):
+        found = collect_metadata(root, create)
+    stats.set_total(len(found))
+    for path, folder in found:
+        rel = os.path.relpath(path, root).replace(os.sep, "/")
+        done = applied_ids(path, entries.get(rel)) if ledger else set()
+        pending = [op for m in migrations if migration_id(m) not in done for op in m.get("ops", [])]
+        if not pending:
+            skipped += 1
+            stats.file(path, "skipped")
+            continue
+        work.append((rel, (path, folder, pending, dry_run, create), done))
+
+    jobs_only = [j for _, j, _ in work]
+    results = list(toolutil.map_jobs(migrate_file, jobs_only, jobs))
+
+    counts = {"total": len(work) + skipped, "changed": 0, "created": 0, "unchanged": 0, "errors": 0,
+              "skipped": skipped}
+    for (rel, _, done), res in zip(work, results):
+        st = res["status"]
+        counts["errors" if st == "error" else st] += 1
+        fields = {"seconds": res["seconds"], "bytesIn": res["bytesIn"], "bytesOut": res["bytesOut"]}
+        if st == "error":
+            stats.log(f"[ERR] {res['path']}: {res['error']}")
+            stats.file(res["path"], st, error=res["error"], **fields)
+            continue
+        line = None
+        if st != "unchanged":
+            line = "\n".join([f"[{'DRY' if dry_run else 'OK'}] {res['path']} ({st})"]
+                             + [f"     {d}" for d in res["diff"]])
+            if dry_run:
+                stats.log(line)
+                line = None
+        stats.file(res["path"], st, line=line, **fields)
+        if ledger and not dry_run:
+            st = os.stat(res["path"])
+            entries[rel] = {"applied": sorted(done | ids), "size": st.st_size, "mtimeNs": st.st_mtime_ns,
+                            "sha256": res["sha256"]}
+
+    if ledger and not dry_run:
+        text = json.dumps({"entries": dict(sorted(entries.items()))}, ensure_ascii=False, indent=2)
+        try:
+            with open(ledger_path, "r", encoding="utf-8") as f:
+                same = f.read() == text
+        except OSError:
+            same = False
+        if not same:
+            toolutil.write_atomic(ledger_path, text)
+    stats.finish(**counts)
+    return counts
+
+
+def load_spec(path: Optional[str]) -> List[Dict]:
+    if not path:
+        return MIGRATIONS
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["migrations"] if isinstance(data, dict) else data
+
+
+def main():
+    ap = argparse.ArgumentParser(description="metadata.json を宣言的なマイグレーションで一括更新")
+    ap.add_argument("--root", required=True, help="chartsフォルダのパス")
+    ap.add_argument("--spec", default=None, help="マイグレーション定義の JSON（省略時は組み込みの MIGRATIONS）")
+    ap.add_argument("--create", action="store_true", help="metadata.json が無い曲フォルダにも作成する")
+    ap.add_argument("--dry-run", action="store_true", help="書き換えずに変更内容だけ表示")
+    ap.add_argument("--no-ledger", action="store_true", help="適用済みマイグレーションの記録を使わず全部を当てる")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"指定フォルダが存在しません: {root}")
+        sys.exit(1)
+    try:
+        migrations = load_spec(args.spec)
+        c = run(root, migrations, args.jobs, args.dry_run, args.create, ledger=not args.no_ledger,
+                stats=toolstats.from_args("migrate_metadata", args))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[ERR] {e}")
+        sys.exit(1)
+    print(f"=== 完了{'(dry-run)' if args.dry_run else ''}: total={c['total']}, changed={c['changed']}, "
+          f"created={c['created']}, unchanged={c['unchanged']}, skipped={c['skipped']}, errors={c['errors']} ===")
+    sys.exit(1 if c["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,39 @@
 #!/usr/bin/env python3
-import os, sys
+"""
+original.* からモザイク風の cover.png を作る。
+
+引数なしで起動すると従来どおり対話モード。引数を付けると CLI モード:
+    python mosaic_covers.py --root Assets/StreamingAssets/charts --cells 8 --sizes 1024,256 [--jobs 0]
+
+- 曲フォルダ単位でプロセスプール並列
+- JPEG は draft()、それ以外は reduce() で先に整数倍縮小してから BOX で cells×cells に落とす
+- 1 回のデコードから複数サイズを出力（先頭が cover.png、以降は cover_<size>.png）
+- 元画像の sha256 と設定を .cover_source.json に記録し、変わっていなければスキップ。
+  .cover_source.json の無い既存の cover（手で置いたもの）は上書き指定が無ければ触らない
+- CLI モードのフォルダごとの行は --verbose のときだけ（既定は進捗 1 行、[ERR] は常に表示）。
+  --stats FILE / --profile で計測を残す（toolstats.py）
+"""
+import os, sys, json, time, argparse
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 try:
     from PIL import Image
 except ImportError:
     print("Pillow が見つかりません。先に `python3 -m pip install pillow` を実行してください。")
     sys.exit(1)
 
+import toolstats
+import toolutil
+from toolutil import file_sha256
+
+SIDECAR_NAME = ".cover_source.json"
+# 出力の作り方を変えたら上げる（サイドカーが無効になる）
+MOSAIC_VERSION = 1
+# draft()/reduce() 後も cells の REDUCE_GAP 倍以上の解像度を残す（BOX の平均が崩れない程度）
+REDUCE_GAP = 4
+# reduce() をそのまま掛けてよいモード（P / 1 / I;16 などは先に RGBA にする）
+REDUCE_MODES = ("L", "LA", "RGB", "RGBA")
+
 def ask(prompt: str, default: Optional[str] = None) -> str:
     s = input(f"{prompt}" + (f" [{default}]" if default else "") + ": ").strip()
     return s if s else (default or "")
@@ -19,50 +45,152 @@ def yesno(prompt: str, default_no=True) -> bool:
 
 def find_original(dir_path: Path, base="original") -> Optional[Path]:
     base_lower = base.lower() + "."
-    for p in dir_path.iterdir():
-        if not p.is_file(): 
+    for p in sorted(dir_path.iterdir()):
+        if not p.is_file():
             continue
         name = p.name.lower()
         if name.startswith(base_lower) and (name.endswith(".png") or name.endswith(".jpg") or name.endswith(".jpeg")):
             return p
     return None
 
+def output_names(sizes: List[int], output_name="cover.png") -> List[str]:
+    stem, ext = os.path.splitext(output_name)
+    return [output_name] + [f"{stem}_{s}{ext}" for s in sizes[1:]]
+
+def to_rgba(img: Image.Image) -> Image.Image:
+    # 16bit グレースケール（I;16 / I）はそのまま変換すると白に張り付くので 8bit に落としてから
+    if img.mode.startswith("I"):
+        img = img.convert("I").point(lambda v: v / 256).convert("L")
+    return img if img.mode == "RGBA" else img.convert("RGBA")
+
+def fast_downscale(img: Image.Image, cells: int) -> Image.Image:
+    """cells の REDUCE_GAP 倍程度まで整数倍で縮小した RGBA 画像を返す。"""
+    # デコード前に JPEG の DCT スケーリングで 1/2..1/8 に落とす
+    target = cells * REDUCE_GAP
+    if img.format == "JPEG":
+        img.draft("RGB", (target, target))
+    if img.mode not in REDUCE_MODES:
+        img = to_rgba(img)
+    factor = min(img.width, img.height) // target
+    if factor >= 2:
+        img = img.reduce(factor)
+    return to_rgba(img)
+
 def make_mosaic(img: Image.Image, cells: int, out_size: int) -> Image.Image:
-    # RGBA に統一
-    if img.mode != "RGBA":
-        img = img.convert("RGBA")
-    # 1) cells x cells に縮小（BOX=面積平均でブロック平均を取るのと等価）
-    small = img.resize((cells, cells), resample=Image.BOX)
-    # 2) 仕上げに最近傍で拡大（ピクセル感を残す）
-    mosaic = small.resize((out_size, out_size), resample=Image.NEAREST)
-    return mosaic
-
-def process_dir(dir_path: Path, cells: int, out_size: int, overwrite: bool, output_name="cover.png") -> str:
+    return upscale(make_cells(img, cells), out_size)
+
+def make_cells(img: Image.Image, cells: int) -> Image.Image:
+    img = fast_downscale(img, cells)
+    # cells x cells に縮小（BOX=面積平均でブロック平均を取るのと等価）
+    return img.resize((cells, cells), resample=Image.BOX)
+
+def upscale(small: Image.Image, out_size: int) -> Image.Image:
+    # 仕上げに最近傍で拡大（ピクセル感を残す）
+    return small.resize((out_size, out_size), resample=Image.NEAREST)
+
+def read_sidecar(dir_path: Path) -> dict:
+    try:
+        with open(dir_path / SIDECAR_NAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def process_dir(dir_path: Path, cells: int, out_size, overwrite: bool, output_name="cover.png",
+                info: Optional[dict] = None) -> str:
+    """info (optional dict) receives toolstats fields: stages (hash/decode/encode), bytesIn, bytesOut."""
+    sizes = [out_size] if isinstance(out_size, int) else list(out_size)
     src = find_original(dir_path)
     if not src:
         return f"SKIP(no original.*): {dir_path}"
-    out_path = dir_path / output_name
-    if out_path.exists() and not overwrite:
-        return f"SKIP(exists): {out_path}"
+    names = output_names(sizes, output_name)
+    out_paths = [dir_path / n for n in names]
+    stages = {}
+    if info is not None:
+        info["stages"] = stages
     try:
+        t = time.perf_counter()
+        digest = file_sha256(src)
+        stamp = {"version": MOSAIC_VERSION, "source": src.name, "sha256": digest,
+                 "cells": cells, "sizes": sizes, "outputs": names}
+        stages["hash"] = time.perf_counter() - t
+        if info is not None:
+            info["bytesIn"] = src.stat().st_size
+        if not overwrite:
+            sidecar = read_sidecar(dir_path)
+            existing = [p for p in out_paths if p.exists()]
+            if existing and not sidecar:
+                return f"SKIP(exists): {existing[0]}"
+            if len(existing) == len(out_paths) and sidecar == stamp:
+                return f"SKIP(unchanged): {out_paths[0]}"
+        t = time.perf_counter()
         with Image.open(src) as im:
-            mosaic = make_mosaic(im, cells, out_size)
-            mosaic.save(out_path)  # PNG
-        return f"OK: {out_path}"
+            small = make_cells(im, cells)
+        stages["decode"] = time.perf_counter() - t
+        t = time.perf_counter()
+        for size, out_path in zip(sizes, out_paths):
+            with toolutil.atomic_output(out_path) as tmp:
+                upscale(small, size).save(tmp, format="PNG")
+        toolutil.write_atomic(dir_path / SIDECAR_NAME, json.dumps(stamp, ensure_ascii=False, indent=2))
+        stages["encode"] = time.perf_counter() - t
+        if info is not None:
+            info["bytesOut"] = sum(p.stat().st_size for p in out_paths)
+        return f"OK: {', '.join(str(p) for p in out_paths)}"
     except Exception as e:
         return f"ERR({dir_path}): {e}"
 
+def _process_job(job):
+    # (メッセージ, toolstats 用の計測) を返す
+    info = {}
+    t = time.perf_counter()
+    msg = process_dir(*job, info=info)
+    info["seconds"] = time.perf_counter() - t
+    return msg, info
+
 def walk_dirs(root: Path, include_subdirs: bool):
     if not include_subdirs:
-        for p in root.iterdir():
+        for p in sorted(root.iterdir()):
             if p.is_dir():
                 yield p
     else:
-        for p in root.rglob("*"):
+        for p in sorted(root.rglob("*")):
             if p.is_dir():
                 yield p
 
-def main():
+def run(charts_root: Path, cells: int, sizes: List[int], overwrite: bool, include_subdirs: bool, jobs: int = 1,
+        stats: Optional["toolstats.RunStats"] = None):
+    # stats を渡さない（対話モード）ときは従来どおり 1 フォルダ 1 行表示
+    if stats is None:
+        stats = toolstats.RunStats("mosaic_covers")
+    dirs = list(walk_dirs(charts_root, include_subdirs))
+    work = [(d, cells, sizes, overwrite) for d in dirs]
+    stats.set_total(len(work))
+
+    ok = skip = err = 0
+    for (d, *_), (msg, info) in zip(work, toolutil.map_jobs(_process_job, work, jobs)):
+        seconds = info.pop("seconds", 0.0)
+        if msg.startswith("OK"):
+            ok += 1
+            stats.file(d, "ok", seconds, line=msg, **info)
+        elif msg.startswith("ERR"):
+            err += 1
+            stats.log(msg)
+            stats.file(d, "error", seconds, error=msg, **info)
+        else:
+            skip += 1
+            stats.file(d, "skip", seconds, line=msg, **info)
+
+    stats.finish(generated=ok, skipped=skip, errors=err)
+    print(f"\n=== DONE ===\nGenerated: {ok}\nSkipped: {skip}\nErrors: {err}")
+    return err
+
+def parse_sizes(s: str) -> List[int]:
+    sizes = [int(x) for x in s.replace(" ", "").split(",") if x]
+    if not sizes or any(x <= 0 for x in sizes):
+        raise ValueError(s)
+    return sizes
+
+def interactive():
     default_root = Path.cwd() / "Assets" / "StreamingAssets" / "charts"
     charts_root = Path(ask("charts ルートのパス", str(default_root))).expanduser().resolve()
     if not charts_root.exists():
@@ -71,26 +199,47 @@ def main():
 
     try:
         cells = int(ask("グリッド数（nで n×n）", "8"))
-        out_size = int(ask("出力サイズ（px）", "1024"))
+        sizes = parse_sizes(ask("出力サイズ（px、カンマ区切りで複数）", "1024"))
     except ValueError:
         print("数値の入力が不正です。")
         sys.exit(1)
 
     overwrite = yesno("既存 cover を上書きしますか？", default_no=True)
     include_subdirs = yesno("サブフォルダも含めますか？", default_no=True)
+    run(charts_root, cells, sizes, overwrite, include_subdirs)
 
-    ok = skip = err = 0
-    for d in walk_dirs(charts_root, include_subdirs):
-        msg = process_dir(d, cells, out_size, overwrite)
-        if msg.startswith("OK"):
-            ok += 1
-        elif msg.startswith("ERR"):
-            err += 1
-        else:
-            skip += 1
-        print(msg)
+def main():
+    if len(sys.argv) == 1:
+        interactive()
+        return
 
-    print(f"\n=== DONE ===\nGenerated: {ok}\nSkipped: {skip}\nErrors: {err}")
+    ap = argparse.ArgumentParser(description="original.* からモザイク cover.png を生成")
+    ap.add_argument("--root", default=str(Path.cwd() / "Assets" / "StreamingAssets" / "charts"),
+                    help="charts ルートのパス")
+    ap.add_argument("--cells", type=int, default=8, help="グリッド数（n で n×n）")
+    ap.add_argument("--sizes", default="1024",
+                    help="出力サイズ（px、カンマ区切り）。先頭が cover.png、以降は cover_<size>.png")
+    ap.add_argument("--overwrite", action="store_true", help="元画像が変わっていなくても作り直す")
+    ap.add_argument("--recursive", action="store_true", help="サブフォルダも含める")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    charts_root = Path(args.root).expanduser().resolve()
+    if not charts_root.exists():
+        print(f"指定パスが見つかりません: {charts_root}")
+        sys.exit(1)
+    try:
+        sizes = parse_sizes(args.sizes)
+    except ValueError:
+        print(f"--sizes が不正です: {args.sizes}")
+        sys.exit(1)
+    if args.cells <= 0:
+        print(f"--cells が不正です: {args.cells}")
+        sys.exit(1)
+    err = run(charts_root, args.cells, sizes, args.overwrite, args.recursive, args.jobs,
+              toolstats.from_args("mosaic_covers", args))
+    sys.exit(1 if err else 0)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,26 +1,36 @@
-import json
 import sys
 import os
+from array import array
+
+import chart_pipeline
 
 LANE_TARGETS = [1, 4, 7, 10]  # 近い数に丸める候補
 FIXED_WIDTH = 3
 
-def nearest_lane(lane: int) -> int:
-    return min(LANE_TARGETS, key=lambda x: abs(x - lane))
+def nearest_lane(lane: int, targets=LANE_TARGETS) -> int:
+    return min(targets, key=lambda x: abs(x - lane))
 
-def process_chart(in_path: str, out_path: str):
-    with open(in_path, "r", encoding="utf-8") as f:
-        notes = json.load(f)
+def lane_table(targets=LANE_TARGETS) -> bytes:
+    # int8 の 256 値すべての丸め先。lane 列（array("b")）のバイト列に bytes.translate で当てる
+    return bytes(nearest_lane(v - 256 if v >= 128 else v, targets) & 0xFF for v in range(256))
 
-    for note in notes:
-        if "lane" in note:
-            note["lane"] = nearest_lane(int(note["lane"]))
-        note["width"] = FIXED_WIDTH
+def stage(targets=LANE_TARGETS, width=FIXED_WIDTH):
+    """chart_pipeline のステージ: lane を targets の最寄りに丸め、width を固定する。"""
+    table = lane_table(targets)
+    fill = bytes([width & 0xFF])
 
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    def normalize_lanes(chart, diff, song):
+        chart.lane = array("b", chart.lane.tobytes().translate(table))
+        chart.width = array("b", fill * len(chart))
+    return chart_pipeline.chart_stage(normalize_lanes)
+
+def process_chart(in_path: str, out_path: str):
+    chart = chart_pipeline.read_chart(in_path)
+    song = chart_pipeline.Song(charts={"chart": chart})
+    stage()(song)
+    chart_pipeline.write_chart_json(song.charts["chart"], out_path)
 
-    print(f"[OK] {in_path} → {out_path}, {len(notes)} notes")
+    print(f"[OK] {in_path} → {out_path}, {len(chart)} notes")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
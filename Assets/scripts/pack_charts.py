@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+charts/<song> フォルダを ZipChartImporter でそのまま取り込める ZIP にまとめる / 既存 ZIP を検査する。
+
+ZIP の中身は README の構成（ルート直下に置く。ZIP 名 = 取り込み先のフォルダ名）:
+    <song>.zip
+    ├── easy.json ... master.json   # 存在するものだけ（.sus も可）
+    ├── metadata.json
+    ├── song.mp3                    # ChartPaths と同じく mp3 > ogg > wav の最初の 1 つ
+    └── cover.png                   # cover.png > cover.jpg
+
+- ファイルはチャンク単位でストリーム書き込み（全体をメモリに載せない）
+- mp3/ogg/png/jpg は STORE、JSON などは DEFLATE
+- エントリ順・日時・属性を固定しているので、同じ入力からは同じバイト列の ZIP になる
+- 曲フォルダ単位でプロセスプール並列
+
+使い方:
+    python pack_charts.py pack   <song dir or charts dir ...> --out DIR [--jobs 0]
+    python pack_charts.py verify <zip or dir ...> [--crc]
+"""
+
+import os, sys, json, argparse, shutil, zipfile, filecmp
+from typing import List, Tuple
+
+import toolutil
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+CHART_EXTS = [".json", ".sus"]
+AUDIO_NAMES = ["song.mp3", "song.ogg", "song.wav"]
+COVER_NAMES = ["cover.png", "cover.jpg"]
+# 既に圧縮済みの形式は DEFLATE しても縮まないので STORE
+STORED_EXTS = {".mp3", ".ogg", ".png", ".jpg", ".jpeg"}
+# 決定的な ZIP にするための固定値（ZIP の日時は 1980 年以降のみ）
+FIXED_DATE = (1980, 1, 1, 0, 0, 0)
+FILE_MODE = 0o644
+DEFLATE_LEVEL = 9
+CHUNK = 1 << 20
+
+
+def song_files(song_dir: str) -> List[str]:
+    """Files that go into the ZIP, in archive order."""
+    names = set(os.listdir(song_dir))
+    out = [d + ext for d in DIFFICULTIES for ext in CHART_EXTS if d + ext in names]
+    if "metadata.json" in names:
+        out.append("metadata.json")
+    out += [n for n in AUDIO_NAMES if n in names][:1]
+    out += [n for n in COVER_NAMES if n in names][:1]
+    return out
+
+
+def set_attrs(zi: zipfile.ZipInfo):
+    zi.create_system = 3  # Unix（実行環境によらず同じヘッダにする）
+    zi.external_attr = (0o100000 | FILE_MODE) << 16
+
+
+def create_zip(path: str) -> zipfile.ZipFile:
+    """DEFLATE の既定レベルを DEFLATE_LEVEL にした書き込み用 ZipFile（write_entry と組で使う）。"""
+    return zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=DEFLATE_LEVEL)
+
+
+def write_entry(zf: zipfile.ZipFile, name: str, fin, size: int):
+    """
+    Stream the binary file object fin (size bytes) into zf as name.
+    STORE は ZipInfo を渡し、DEFLATE は名前で開いて ZipFile の compresslevel を使う（日時は ZipInfo の既定 = FIXED_DATE）。
+    """
+    if os.path.splitext(name)[1].lower() in STORED_EXTS:
+        target = zipfile.ZipInfo(name, date_time=FIXED_DATE)
+        target.compress_type = zipfile.ZIP_STORED
+        set_attrs(target)
+    else:
+        target = name
+    with zf.open(target, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as fout:
+        shutil.copyfileobj(fin, fout, CHUNK)
+    # 外部属性はセントラルディレクトリにだけ入るので、書き終えてから設定してよい
+    set_attrs(zf.getinfo(name))
+
+
+def pack_song(job) -> Tuple[str, str, int, str]:
+    """Worker: (song_dir, zip_path) -> (status OK/SAME/NG, zip_path, bytes, message)."""
+    song_dir, zip_path = job
+    try:
+        names = song_files(song_dir)
+        if "metadata.json" not in names:
+            return "NG", zip_path, 0, "metadata.json がありません"
+        tmp = toolutil.temp_path(zip_path)
+        try:
+            with create_zip(tmp) as zf:
+                for n in names:
+                    src = os.path.join(song_dir, n)
+                    with open(src, "rb") as fin:
+                        write_entry(zf, n, fin, os.path.getsize(src))
+            size = os.path.getsize(tmp)
+            if os.path.isfile(zip_path) and filecmp.cmp(tmp, zip_path, shallow=False):
+                return "SAME", zip_path, size, ""  # 中身が同じなら置き換えない（mtime も変えない）
+            os.replace(tmp, zip_path)
+            return "OK", zip_path, size, f"{len(names)} files"
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    except Exception as e:
+        return "NG", zip_path, 0, str(e)
+
+
+def song_root(names: List[str], zip_name: str) -> str:
+    """Prefix ZipChartImporter ends up copying from (single top folder / same-named inner folder)."""
+    prefix = ""
+    top = {n.split("/", 1)[0] for n in names}
+    if len(top) == 1 and all("/" in n for n in names):
+        prefix = top.pop() + "/"
+    inner = prefix + zip_name + "/"
+    if any(n.startswith(inner) for n in names):
+        prefix = inner
+    return prefix
+
+
+def verify_zip(zip_path: str, crc: bool = False) -> Tuple[List[str], List[str]]:
+    """Check an import ZIP without extracting it. Returns (problems, warnings)."""
+    problems, warnings = [], []
+    try:
+        zf = zipfile.ZipFile(zip_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        return [str(e)], []
+    with zf:
+        infos = [zi for zi in zf.infolist() if not zi.is_dir()]
+        for zi in infos:
+            parts = zi.filename.replace("\\", "/").split("/")
+            if zi.filename.startswith(("/", "\\")) or ".." in parts or ":" in parts[0]:
+                problems.append(f"unsafe path: {zi.filename}")
+        prefix = song_root([zi.filename for zi in infos], os.path.splitext(os.path.basename(zip_path))[0])
+        files = {zi.filename[len(prefix):]: zi for zi in infos if zi.filename.startswith(prefix)}
+        top = {n for n in files if "/" not in n}
+
+        if "metadata.json" not in top:
+            problems.append("metadata.json がありません")
+        else:
+            try:
+                meta = json.loads(zf.read(files["metadata.json"]).decode("utf-8"))
+                if not isinstance(meta, dict):
+                    problems.append("metadata.json is not an object")
+                else:
+                    if not meta.get("title"):
+                        warnings.append("metadata.json has no title")
+                    if not meta.get("bpm"):
+                        warnings.append("metadata.json has no bpm")
+            except (ValueError, UnicodeDecodeError) as e:
+                problems.append(f"metadata.json: {e}")
+
+        charts = [d + ext for d in DIFFICULTIES for ext in CHART_EXTS if d + ext in top]
+        if not charts:
+            problems.append("難易度の譜面 (easy.json ... master.json) がありません")
+        for n in charts:
+            if not n.endswith(".json"):
+                continue
+            try:
+                with zf.open(files[n]) as f:
+                    doc = json.load(f)
+                if not isinstance(doc, list) and not (isinstance(doc, dict) and ("array" in doc or "notes" in doc)):
+                    problems.append(f"{n}: not a note list")
+            except (ValueError, UnicodeDecodeError) as e:
+                problems.append(f"{n}: {e}")
+
+        if not any(n in top for n in AUDIO_NAMES):
+            problems.append("音源 (song.mp3 / song.ogg / song.wav) がありません")
+        if not any(n in top for n in COVER_NAMES):
+            warnings.append("cover.png / cover.jpg がありません")
+        extra = sorted(n for n in files if n not in set(charts) | {"metadata.json"} | set(AUDIO_NAMES) | set(COVER_NAMES))
+        if extra:
+            warnings.append(f"unused entries: {', '.join(extra[:5])}{' ...' if len(extra) > 5 else ''}")
+        if prefix:
+            warnings.append(f"files are under {prefix!r} (importer handles it, README layout is flat)")
+        if crc:
+            bad = zf.testzip()
+            if bad:
+                problems.append(f"CRC mismatch: {bad}")
+    return problems, warnings
+
+
+def collect_songs(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        p = os.path.abspath(p)
+        if os.path.isfile(os.path.join(p, "metadata.json")):
+            out.append(p)
+        elif os.path.isdir(p):
+            with os.scandir(p) as it:
+                out.extend(e.path for e in it if e.is_dir() and os.path.isfile(os.path.join(e.path, "metadata.json")))
+        else:
+            print(f"[WARN] not a folder: {p}")
+    return sorted(set(out))
+
+
+def collect_zips(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            with os.scandir(p) as it:
+                out.extend(e.path for e in it if e.is_file() and e.name.lower().endswith(".zip"))
+        else:
+            out.append(p)
+    return sorted(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="charts の曲フォルダを取り込み用 ZIP にまとめる / 検査する")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("pack", help="曲フォルダ（または charts フォルダ）から ZIP を作成")
+    sp.add_argument("paths", nargs="+")
+    sp.add_argument("--out", required=True, help="ZIP の出力フォルダ")
+    sp.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    sv = sub.add_parser("verify", help="ZIP を展開せずに構成をチェック")
+    sv.add_argument("paths", nargs="+")
+    sv.add_argument("--crc", action="store_true", help="全エントリの CRC も確認する（中身を読む）")
+    args = ap.parse_args()
+
+    if args.cmd == "verify":
+        bad = 0
+        zips = collect_zips(args.paths)
+        for p in zips:
+            problems, warnings = verify_zip(p, args.crc)
+            if problems:
+                bad += 1
+                print(f"[NG] {p}")
+                for msg in problems:
+                    print(f"     {msg}")
+            else:
+                print(f"[OK] {p}")
+            for msg in warnings:
+                print(f"     [WARN] {msg}")
+        print(f"== 完了 total={len(zips)}, ng={bad} ==")
+        sys.exit(1 if bad else 0)
+
+    out_dir = os.path.abspath(args.out)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(d, os.path.join(out_dir, os.path.basename(d) + ".zip")) for d in collect_songs(args.paths)]
+    results = list(toolutil.map_jobs(pack_song, jobs, args.jobs))
+
+    ok = same = ng = 0
+    total = 0
+    for status, zip_path, size, msg in results:
+        if status == "NG":
+            ng += 1
+            print(f"[NG] {zip_path}: {msg}")
+            continue
+        total += size
+        if status == "SAME":
+            same += 1
+        else:
+            ok += 1
+            print(f"[OK] {zip_path} ({msg}, {size} bytes)")
+    print(f"== 完了 total={len(results)}, ok={ok}, unchanged={same}, ng={ng}, bytes={total} ==")
+    sys.exit(1 if ng else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+12 レーンの譜面から 4 レーン / 6 レーンなどの配置違いを作るレーン削減ツール（normalize_lanes.py の一般化）。
+
+- プロファイル（PROFILES）= 置いてよい左端レーンの候補と幅（None は元の幅のまま）
+    4:  1, 4, 7, 10 / 幅 3（normalize_lanes.py と同じ。判定グループ 1 つ = キー 1 つ）
+    6:  1, 3, 5, 7, 9, 11 / 幅 2
+    12: 1..12 / 元の幅（配置はそのままで、重なりだけ解消する）
+- 各ノーツは中心が一番近い候補へ寄せる。寄せた先が他のノーツ / ロングの押している間と重なるときは、
+  (time, lane) 順に 1 パスでレーン（1..12 の各マス）ごとの「空く時刻」を持つ区間スケジューリングで
+  空いている候補のうち近い順に移す（moved）。どこも空いていないとき、同じ時刻に同じマスへ置いたノーツがある
+  タップはそれにまとめて消し（merged）、それ以外（ロング / ロングの途中に重なるタップ）は消さずに寄せた先へ
+  残して overlap として数える（元の譜面にある重なりを勝手に消さない）
+  占有区間はタップが [time, time]、ロングが [time, time + hold]。guide は判定しないので寄せるだけ
+- 経路（--slide-paths の path）は幅を変えない 12 ではレーンのずれぶん動かし、幅を固定するプロファイルでは外す
+- 譜面は 1 回だけ読み、全プロファイルの配置をそこから作る（chart_pipeline の Chart / Song）
+- charts フォルダを渡すと曲ごとにプロセスプール並列で --out/<プロファイル>/<曲フォルダ>/ に書く
+  （metadata.json も同じ中身で置くので、そのまま charts フォルダとして使える）。中身が同じファイルは書き直さない
+- 譜面ファイルを渡すと隣（または --out）に <名前>_<プロファイル>.json を書く
+- 譜面ごと・プロファイルごとに moved / merged / overlap（と寄せただけの snapped）を表示、--report FILE で JSON に出す
+- chart_pipeline の STAGES["reduce_lanes"]（4 レーン）としても使える
+
+使い方:
+    python reduce_lanes.py Assets/StreamingAssets/charts --out reduced [--profiles 4,6,12] [--jobs 0]
+    python reduce_lanes.py path/to/master.json --profiles 4 [--report -]
+"""
+
+import os, sys, json, time, argparse
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import chart_pipeline
+import normalize_lanes
+import toolstats
+import toolutil
+from chart_pipeline import FLAG_NO_LANE, Chart, note_order
+
+LANES = 12
+GUIDE = "guide"
+# 同時刻とみなす差（beat）
+TIME_EPS = 1e-6
+
+
+class Profile:
+    """Lane layout: allowed left lanes and a fixed width (None = keep each note's width)."""
+    __slots__ = ("name", "targets", "width", "_cands")
+
+    def __init__(self, name: str, targets, width: Optional[int]):
+        self.name = name
+        self.targets = tuple(targets)
+        self.width = width
+        self._cands: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+
+    def candidates(self, width: int, center2: int) -> Tuple[int, ...]:
+        """
+        Left lanes for a note of this width, nearest first to the original center
+        (center2 = 2 × 中心。同じ距離なら左から、normalize_lanes.nearest_lane と同じ)。
+        """
+        key = (width, center2)
+        c = self._cands.get(key)
+        if c is None:
+            fits = [l for l in self.targets if l + width - 1 <= LANES] or [max(1, LANES - width + 1)]
+            c = self._cands[key] = tuple(sorted(fits, key=lambda l: abs(2 * l + width - 1 - center2)))
+        return c
+
+
+PROFILES = {
+    "4": Profile("4", normalize_lanes.LANE_TARGETS, normalize_lanes.FIXED_WIDTH),
+    "6": Profile("6", (1, 3, 5, 7, 9, 11), 2),
+    "12": Profile("12", range(1, LANES + 1), None),
+}
+
+
+def reduce_chart(chart: Chart, profile: Profile) -> Tuple[Chart, Dict[str, int]]:
+    """
+    One layout variant of chart.
+    Returns (new Chart in the original note order, {notes, snapped, moved, merged, overlap}).
+    元の chart は変えない。
+    """
+    n = len(chart)
+    lanes, widths = array("b", chart.lane), array("b", chart.width)
+    keep = []
+    free = [float("-inf")] * (LANES + 2)   # マス 1..12 が空く時刻（beat）
+    start = [float("-inf")] * (LANES + 2)  # マス 1..12 に最後に置いたノーツの時刻
+    guide = chart.type_names.index(GUIDE) if GUIDE in chart.type_names else -1
+    has_hold = list(chart.has_hold())
+    counts = {"notes": n, "snapped": 0, "moved": 0, "merged": 0, "overlap": 0}
+    for i in note_order(chart.time, chart.lane):
+        i = int(i)
+        w0 = min(max(chart.width[i], 1), LANES)
+        l0 = min(max(chart.lane[i], 1), LANES)
+        w = profile.width or w0
+        cands = profile.candidates(w, 2 * l0 + w0 - 1)
+        t = chart.time[i]
+        if chart.type[i] == guide:
+            lane = cands[0]
+        else:
+            hold = has_hold[i] and chart.hold[i] > 0
+            end = t + chart.hold[i] if hold else t
+            for k, lane in enumerate(cands):
+                if all(free[c] < t - TIME_EPS for c in range(lane, lane + w)):
+                    break
+            else:
+                k, lane = 0, cands[0]
+                if not hold and any(abs(start[c] - t) <= TIME_EPS for c in range(lane, lane + w)):
+                    counts["merged"] += 1
+                    continue
+                counts["overlap"] += 1
+            for c in range(lane, lane + w):
+                free[c] = max(free[c], end)
+                start[c] = t
+            if k:
+                counts["moved"] += 1
+        if lane == cands[0] and (lane != chart.lane[i] or w != chart.width[i]):
+            counts["snapped"] += 1
+        lanes[i], widths[i] = lane, w
+        keep.append(i)
+    keep.sort()
+    out = chart.take(keep)
+    out.lane = array("b", (lanes[i] for i in keep))
+    out.width = array("b", (widths[i] for i in keep))
+    if out.flags is not None:
+        # 置き直した lane は必ず書く（"lane" の無かったノーツも配置先を持つ）
+        out.flags = array("B", (f & ~FLAG_NO_LANE for f in out.flags))
+    if out.paths is not None:
+        if profile.width is None:
+            # 幅を変えないプロファイル: 経路もノーツと同じだけ横にずらす
+            out.paths = [[dict(p, lane=p.get("lane", 0) + (lanes[i] - chart.lane[i])) for p in pth]
+                         if pth and lanes[i] != chart.lane[i] else pth for i, pth in zip(keep, out.paths)]
+        else:
+            out.paths = None
+    return out, counts
+
+
+def stage(profile: str = "4"):
+    """chart_pipeline のステージ: 譜面を profile の配置に置き換える（重なりも解消する）。"""
+    prof = PROFILES[profile]
+
+    def reduce_lanes(chart, diff, song):
+        return reduce_chart(chart, prof)[0]
+    return chart_pipeline.chart_stage(reduce_lanes)
+
+
+# ---- 書き出し ----
+def reduce_song(job) -> Dict:
+    """
+    Worker: (song_dir, rel, out_root, profile names, dry_run) -> {dir, charts: {diff: {profile: counts}},
+    written, seconds, error}。曲フォルダの譜面を 1 回ずつ読み、プロファイルごとに out_root/<profile>/<rel>/ へ書く。
+    """
+    song_dir, rel, out_root, names, dry_run = job
+    t0 = time.perf_counter()
+    res = {"dir": song_dir, "charts": {}, "written": 0, "notes": 0, "error": None}
+    try:
+        song = chart_pipeline.load_song(song_dir)
+        charts = song.charts
+        for diff in charts:
+            if "bin" in song.formats.get(diff, ()):
+                song.chart_tempo(diff)  # .bin の bpm / マーカーは元の .bin から（全プロファイルで共有）
+        res["notes"] = sum(len(c) for c in charts.values())
+        for name in names:
+            variant = chart_pipeline.Song(song_dir, song.meta, charts={})
+            variant.formats, variant.tempo, variant._meta_newline = song.formats, song.tempo, song._meta_newline
+            for diff, chart in charts.items():
+                variant.charts[diff], counts = reduce_chart(chart, PROFILES[name])
+                res["charts"].setdefault(diff, {})[name] = counts
+            out_dir = os.path.join(out_root, name, rel)
+            if not dry_run:
+                os.makedirs(out_dir, exist_ok=True)
+            for fname, data in chart_pipeline.song_payloads(variant).items():
+                if dry_run or toolutil.write_if_changed(os.path.join(out_dir, fname), data):
+                    res["written"] += 1
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: {e}"
+    res["seconds"] = time.perf_counter() - t0
+    return res
+
+
+def reduce_file(path: str, names: List[str], out_dir: Optional[str], dry_run: bool) -> Dict:
+    """One chart file -> <stem>_<profile>.json（隣か out_dir）。Returns {profile: counts}."""
+    chart = chart_pipeline.read_chart(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out = {}
+    for name in names:
+        variant, out[name] = reduce_chart(chart, PROFILES[name])
+        dst = os.path.join(out_dir or os.path.dirname(path), f"{stem}_{name}.json")
+        if not dry_run:
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            toolutil.write_if_changed(dst, chart_pipeline.chart_json_text(variant))
+    return out
+
+
+def _line(where: str, per_profile: Dict[str, Dict[str, int]]) -> str:
+    return f"[RED] {where}: " + " / ".join(
+        f"{p}: moved={c['moved']} merged={c['merged']} overlap={c['overlap']} snapped={c['snapped']}"
+        for p, c in per_profile.items())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="12 レーンの譜面から 4 / 6 レーンなどの配置違いを作る（重なりも解消）")
+    ap.add_argument("paths", nargs="+", help="譜面ファイル / 曲フォルダ / charts フォルダ")
+    ap.add_argument("--out", default=None,
+                    help="出力先（フォルダ入力では必須: <out>/<プロファイル>/<曲フォルダ>/、ファイル入力では既定は隣）")
+    ap.add_argument("--profiles", default="4,6,12", help=f"カンマ区切り（{', '.join(PROFILES)}）")
+    ap.add_argument("--report", metavar="FILE", default=None, help="譜面ごとの moved / merged を JSON で書き出す（- で標準出力）")
+    ap.add_argument("--dry-run", action="store_true", help="書き出さずに集計だけ表示")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.profiles.split(",") if n.strip()]
+    bad = [n for n in names if n not in PROFILES]
+    if bad or not names:
+        print(f"[ERR] --profiles: {', '.join(bad) or '(空)'} (known: {', '.join(PROFILES)})")
+        sys.exit(1)
+    files = [p for p in args.paths if os.path.isfile(p)]
+    songs = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            base = p if os.path.isfile(os.path.join(p, "metadata.json")) else None
+            for d in chart_pipeline.collect_songs(p):
+                rel = os.path.basename(os.path.normpath(d)) if base else os.path.relpath(d, p)
+                songs.append((d, rel))
+        elif not os.path.isfile(p):
+            print(f"[ERR] 見つかりません: {p}")
+            sys.exit(1)
+    if songs and not args.out:
+        print("[ERR] フォルダを入力にするときは --out が必要です")
+        sys.exit(1)
+
+    stats = toolstats.from_args("reduce_lanes", args, total=len(files) + len(songs))
+    report = {}
+    totals = {n: {"notes": 0, "snapped": 0, "moved": 0, "merged": 0, "overlap": 0} for n in names}
+    errors = written = 0
+
+    def add(where, per_diff):
+        report[where] = per_diff
+        for per_profile in per_diff.values():
+            for name, c in per_profile.items():
+                for k in totals[name]:
+                    totals[name][k] += c[k]
+
+    with stats.stage("files"):
+        for p in files:
+            t0 = time.perf_counter()
+            try:
+                counts = reduce_file(p, names, args.out, args.dry_run)
+            except (OSError, ValueError) as e:
+                errors += 1
+                stats.log(f"[ERR] {p}: {e}")
+                stats.file(p, "error", time.perf_counter() - t0, error=str(e))
+                continue
+            add(p, {"chart": counts})
+            written += 0 if args.dry_run else len(names)
+            stats.log(_line(p, counts))
+            stats.file(p, "ok", time.perf_counter() - t0, notes=next(iter(counts.values()))["notes"])
+
+    jobs = [(d, rel, args.out, names, args.dry_run) for d, rel in songs]
+    with stats.stage("songs"):
+        for res in toolutil.map_jobs(reduce_song, jobs, args.jobs):
+            d = res["dir"]
+            if res["error"]:
+                errors += 1
+                stats.log(f"[ERR] {d}: {res['error']}")
+                stats.file(d, "error", res["seconds"], error=res["error"])
+                continue
+            add(d, res["charts"])
+            written += res["written"]
+            lines = [_line(os.path.join(d, diff), c) for diff, c in res["charts"].items()]
+            stats.file(d, "ok", res["seconds"], line="\n".join(lines) or None, notes=res["notes"],
+                       writes=res["written"])
+
+    if args.report:
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.report == "-":
+            print(text)
+        else:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    stats.finish(errors=errors, written=written, profiles=totals)
+    for name, c in totals.items():
+        print(f"[{name}] notes={c['notes']} moved={c['moved']} merged={c['merged']} overlap={c['overlap']} "
+              f"snapped={c['snapped']}")
+    tag = "書き出し予定" if args.dry_run else "書き出し"
+    print(f"== 完了: 譜面ファイル {len(files)} / 曲 {len(songs)} / {tag} {written} ファイル / エラー {errors} ==")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
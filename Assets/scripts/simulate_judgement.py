@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ObjJudgement と同じ判定をオフラインで再現するオートプレイ / 人間モデルのシミュレーター。
+
+- 譜面（<difficulty>.json または .bin）と metadata.json の bpm から、ObjClone と同じ規則で到着時刻（秒）を出す
+  （arrival があれば優先、無ければ |time| × 60 / bpm。guide と fake は判定対象外、long は longstart だけ判定）
+- 判定は ObjJudgement と同じ: 4 グループ（1-3 / 4-6 / 7-9 / 10-12）× 4 種別のキューの先頭だけを見る
+  非フリックのキー（d/f/j/k）は normal → critical → longstart の順、フリック（e/r/u/i）は flick のみ
+  |差| <= judgeWindow × 1 / 2 / 3 / 4 で Perfect / Great / Good / Bad、到着 + 4 倍を過ぎた先頭と
+  到着 + 5 倍を過ぎたノーツは Miss。スコア・コンボ・ライフの増減も ObjJudgement と同じ
+- プレイヤーモデル: ノーツ 1 個につきキーを 1 回押す（幅のあるノーツはかかるグループのうち空いているキー）
+  同じキーは --repress フレーム空けないと押し直せない・押下は次のフレームで判定される（--fps、0 で量子化なし）
+  オートプレイはずれ 0、人間モデルは正規分布のずれ（--mean / --sigma ms）と押し忘れ（--miss-rate）を
+  シードごとに引く。同じキーに同時に複数ノーツが来る「押せない同時押し」はオートプレイでも Perfect にならない
+- 時刻の計算（秒への変換・ずれの生成・押し直し間隔・フレーム量子化・スコア / コンボ / 分布の集計）は
+  シード × ノーツの NumPy 配列でまとめて計算し、キュー先頭の照合だけをシードごとに 1 パスで回す
+- 譜面単位でプロセスプール並列。--report FILE で譜面ごとの結果を JSON に出す
+
+出力する値:
+- maxScore      全 Perfect のスコア（判定されるノーツだけの上限）
+- calcMaxScore  ObjJudgement.CalcMaxScore と同じ値（ロングの終点も 100 点として数えるので maxScore より大きい）
+- auto          オートプレイのスコア / 最大コンボ / 判定分布と、Perfect にならなかったノーツの時刻
+- human         シードごとのスコア率の平均・p5 / p50 / p95、最大コンボの平均、フルコンボ率、ライフ 0 以下になった率
+
+使い方:
+    python simulate_judgement.py --root Assets/StreamingAssets/charts [--seeds 200] [--sigma 18] [--jobs 0]
+    python simulate_judgement.py path/to/master.json --seeds 0 --report sim.json
+"""
+
+import os, sys, json, time, argparse
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    print("NumPy が見つかりません。先に `python3 -m pip install numpy` を実行してください。")
+    sys.exit(1)
+
+import toolstats
+import toolutil
+from chartbin import BIN_EXT, NOTE_TYPES, read_chart_bin
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+# ObjJudgement の既定値
+JUDGE_WINDOW = 0.01
+MAX_LIFE = 1000
+GROUPS = ((1, 3), (4, 6), (7, 9), (10, 12))
+JUDGES = ("perfect", "great", "good", "bad", "miss")
+PERFECT, GREAT, GOOD, BAD, MISS = range(5)
+# 判定する種別（ObjJudgement.TypeIndex の順。long = longstart）
+KINDS = ("normal", "critical", "flick", "long")
+FLICK = KINDS.index("flick")
+# キーを押したときに見るキューの順（TriggerGroup と同じ）
+KEY_QUEUES = ((0, 1, 3), (FLICK,))
+BASE_SCORE = np.array([100, 200, 100, 300])
+JUDGE_MUL = np.array([1.0, 0.7, 0.5, 0.0, 0.0])
+MISS_DAMAGE = np.array([80, 80, 80, 200])
+BAD_DAMAGE = np.rint(MISS_DAMAGE * 0.625).astype(int)
+# CalcMaxScore は longroot(0) / longend(100) の NoteInfo も数える
+LONG_END_SCORE = 100
+
+# プレイヤーモデルの既定値
+DEFAULT_FPS = 60.0
+DEFAULT_REPRESS_FRAMES = 2  # 押す → 離す → 押す
+DEFAULT_SIGMA_MS = 18.0
+
+# 種別 × 判定 → 加点 / コンボ加算 / ライフ減少（ObjJudgement.ApplyHit / ApplyBad / ApplyMiss）
+SCORE_TABLE = np.rint(BASE_SCORE[:, None] * JUDGE_MUL[None, :]).astype(np.int64)
+COMBO_TABLE = np.array([[1, 1, 1, 0, 0]] * 3 + [[3, 2, 1, 0, 0]], dtype=np.int64)
+DAMAGE_TABLE = np.stack([np.zeros(4, int), np.zeros(4, int), np.zeros(4, int), BAD_DAMAGE, MISS_DAMAGE], axis=1)
+
+
+class SimChart:
+    """Judged notes in arrival order: seconds, kind index (KINDS), group bitmask; key is set by simulate()."""
+    __slots__ = ("t", "kind", "mask", "key", "calc_max_score")
+
+    def __init__(self, t, kind, mask, calc_max_score: int):
+        self.t = t
+        self.kind = kind
+        self.mask = mask
+        self.key = None
+        self.calc_max_score = calc_max_score
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def max_score(self) -> int:
+        return int(BASE_SCORE[self.kind].sum())
+
+
+def _load_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _notes_of(doc) -> List[Dict]:
+    # ObjClone と同じく 配列 / {"array": [...]} / {"notes": [...]} を受け付ける
+    if isinstance(doc, list):
+        return doc
+    if isinstance(doc, dict):
+        return doc.get("array") or doc.get("notes") or []
+    return []
+
+
+def load_chart(path: str, meta: Optional[Dict] = None) -> SimChart:
+    """Chart (.json / .bin) + metadata.json -> SimChart, with ObjClone's time / lane rules."""
+    if meta is None:
+        try:
+            meta = _load_json(os.path.join(os.path.dirname(path), "metadata.json"))
+        except (OSError, ValueError):
+            meta = {}
+    if path.endswith(BIN_EXT):
+        cb = read_chart_bin(path)
+        names = [NOTE_TYPES[ty] for ty in cb.type]
+        time_ = np.frombuffer(cb.time, dtype=np.float64)
+        lane = np.frombuffer(cb.lane, dtype=np.int8).astype(np.int64)
+        width = np.frombuffer(cb.width, dtype=np.int8).astype(np.int64)
+        arrival = speed = np.zeros(len(names))
+        fake = np.zeros(len(names), dtype=bool)
+    else:
+        notes = _notes_of(_load_json(path))
+        names = [str(n.get("type", "normal")) for n in notes]
+        col = lambda key, default=0.0: np.array([float(n.get(key, default) or 0.0) for n in notes], dtype=np.float64)
+        time_, arrival, speed = col("time"), col("arrival"), col("speed")
+        lane, width = col("lane", 1).astype(np.int64), col("width", 1).astype(np.int64)
+        fake = np.array([bool(n.get("fake", False)) for n in notes], dtype=bool)
+
+    bpm = float(meta.get("bpm") or 0.0)
+    # ObjClone: arrival(秒) が最優先、次に拍 × 60 / bpm、bpm が無ければ旧来の 秒/Z 解釈
+    if bpm > 1e-3:
+        sec = np.abs(time_) * (60.0 / bpm)
+    else:
+        sec = np.where(speed != 0, np.abs(time_ * 60.0 / np.where(speed != 0, speed, 1.0)), np.abs(time_))
+    sec = np.where(np.abs(arrival) > 1e-6, np.abs(arrival), sec)
+
+    kind = np.array([KINDS.index(n) if n in KINDS else -1 for n in names], dtype=np.int64)
+    judged = (kind >= 0) & ~fake
+    n_long = int(((kind == KINDS.index("long")) & ~fake).sum())
+
+    # ObjClone で width を 1..12 に丸めたあと、NoteToRange で lane..lane+width-1 を 1..12 に丸める
+    width = np.clip(np.where(width <= 0, 1, width), 1, 12)
+    lo = np.clip(lane, 1, 12)
+    hi = np.clip(lane + width - 1, 1, 12)
+    mask = np.zeros(len(kind), dtype=np.int64)
+    for g, (glo, ghi) in enumerate(GROUPS):
+        mask |= ((lo <= ghi) & (glo <= hi)).astype(np.int64) << g
+
+    # BuildQueues と同じ到達時刻順。同時刻は譜面の順（C# の Array.Sort は不安定なので実機とは入れ替わることがある）
+    order = np.argsort(sec[judged], kind="stable")
+    t, kind, mask = sec[judged][order], kind[judged][order], mask[judged][order]
+    calc_max = int(BASE_SCORE[kind].sum()) + LONG_END_SCORE * n_long
+    return SimChart(t, kind, mask, calc_max)
+
+
+def assign_keys(t, kind, mask, repress: float):
+    """
+    Key (0..7 = d f j k e r u i) for each note: the lowest group the note covers whose key is free again
+    (押し直し間隔ぶん空いている)、全部ふさがっていれば一番早く空くキー。ずれに依らないので譜面ごとに 1 回だけ。
+    """
+    n = len(t)
+    key = np.zeros(n, dtype=np.int64)
+    free = [-np.inf] * 8
+    for i, (ti, ki, mi) in enumerate(zip(t.tolist(), kind.tolist(), mask.tolist())):
+        base = 4 if ki == FLICK else 0
+        cands = [base + g for g in range(4) if mi >> g & 1] or [base]
+        k = next((c for c in cands if free[c] <= ti + 1e-9), None)
+        if k is None:
+            k = min(cands, key=lambda c: free[c])
+        key[i] = k
+        free[k] = max(ti, free[k]) + repress
+    return key
+
+
+def press_times(chart: SimChart, offsets, fps: float, repress: float):
+    """
+    offsets (seeds × notes, 秒。押さないノーツは inf) -> 実際に判定される押下時刻（同じ shape）。
+    キーごとに押下を時刻順に並べ、押し直し間隔 r を q_j = max(p_j, q_{j-1} + r) で詰める
+    （= j·r + cummax(p_i − i·r)）。最後に次のフレームの頭へ切り上げる。
+    """
+    lead = 0.5 / fps if fps > 0 else 0.0  # 到着にいちばん近いフレームで押す
+    p = chart.t[None, :] + offsets - lead
+    for k in range(8):
+        cols = np.nonzero(chart.key == k)[0]
+        if len(cols) == 0:
+            continue
+        pk = np.sort(p[:, cols], axis=1)
+        step = np.arange(len(cols)) * repress
+        p[:, cols] = step + np.maximum.accumulate(pk - step, axis=1)
+    if fps > 0:
+        p = np.ceil(p * fps - 1e-9) / fps
+    return p
+
+
+def replay(chart: SimChart, press_t, window: float = JUDGE_WINDOW) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    One seed: presses (times in the chart's key order; inf = not pressed) through ObjJudgement's queues.
+    Returns (judgement per note, note indices in the order they were judged).
+    """
+    n = len(chart)
+    t = chart.t.tolist()
+    queues = [[] for _ in range(16)]  # group * 4 + TypeIndex
+    for i, (ki, mi) in enumerate(zip(chart.kind.tolist(), chart.mask.tolist())):
+        for g in range(4):
+            if mi >> g & 1:
+                queues[g * 4 + ki].append(i)
+    heads = [0] * 16
+    judge = [MISS] * n
+    consumed = bytearray(n)
+    order = []
+    w1, w2, w3, w4, w5 = window, window * 2, window * 3, window * 4, window * 5
+
+    keys = chart.key
+    finite = np.isfinite(press_t)
+    seq = np.lexsort((keys[finite], press_t[finite]))  # 同じフレームでは d f j k e r u i の順
+    miss_ptr = 0
+    for now, key in zip(press_t[finite][seq].tolist(), keys[finite][seq].tolist()):
+        # AutoMissQueues: 到着 + 5 倍を過ぎたもの
+        lim = now - w5
+        while miss_ptr < n and t[miss_ptr] < lim:
+            if not consumed[miss_ptr]:
+                consumed[miss_ptr] = 1
+                order.append(miss_ptr)
+            miss_ptr += 1
+        g = key & 3
+        for ty in KEY_QUEUES[key >> 2]:
+            qi = g * 4 + ty
+            q, h = queues[qi], heads[qi]
+            hit = False
+            while h < len(q):
+                i = q[h]
+                if consumed[i]:
+                    h += 1
+                    continue
+                d = abs(t[i] - now)
+                if d <= w4:
+                    judge[i] = PERFECT if d <= w1 else GREAT if d <= w2 else GOOD if d <= w3 else BAD
+                    consumed[i] = 1
+                    order.append(i)
+                    h += 1
+                    hit = True
+                    break
+                if t[i] + w4 < now:  # 取りこぼし
+                    consumed[i] = 1
+                    order.append(i)
+                    h += 1
+                    continue
+                break  # まだ手前
+            heads[qi] = h
+            if hit:
+                break
+    order.extend(i for i in range(n) if not consumed[i])
+    return np.array(judge, dtype=np.int64), np.array(order, dtype=np.int64)
+
+
+def score_runs(chart: SimChart, judge, order) -> Dict[str, "np.ndarray"]:
+    """Vectorized totals for seeds × notes judgement / order matrices (ObjJudgement の加点・コンボ・ライフ)."""
+    kind = chart.kind[None, :]
+    score = SCORE_TABLE[kind, judge].sum(axis=1)
+    rows = np.arange(judge.shape[0])[:, None]
+    j_ord = judge[rows, order]
+    k_ord = chart.kind[order]
+    inc = COMBO_TABLE[k_ord, j_ord]
+    c = np.cumsum(inc, axis=1)
+    # Bad / Miss でコンボが 0 に戻る: その時点の累計を引く
+    base = np.maximum.accumulate(np.where(j_ord >= BAD, c, 0), axis=1)
+    max_combo = (c - base).max(axis=1) if c.shape[1] else np.zeros(judge.shape[0], dtype=np.int64)
+    life = MAX_LIFE - np.cumsum(DAMAGE_TABLE[k_ord, j_ord], axis=1)
+    min_life = life.min(axis=1) if life.shape[1] else np.full(judge.shape[0], MAX_LIFE)
+    counts = np.stack([(judge == j).sum(axis=1) for j in range(len(JUDGES))], axis=1)
+    return {"score": score, "maxCombo": max_combo, "minLife": min_life, "counts": counts}
+
+
+def simulate(chart: SimChart, seeds: List[int], sigma: float = DEFAULT_SIGMA_MS / 1000.0, mean: float = 0.0,
+             miss_rate: float = 0.0, fps: float = DEFAULT_FPS, repress_frames: int = DEFAULT_REPRESS_FRAMES,
+             window: float = JUDGE_WINDOW) -> Dict:
+    """Autoplay + one human run per seed. Returns the report dict for one chart."""
+    n = len(chart)
+    repress = repress_frames / fps if fps > 0 else repress_frames / DEFAULT_FPS
+    chart.key = assign_keys(chart.t, chart.kind, chart.mask, repress)
+    full_combo = int(COMBO_TABLE[chart.kind, PERFECT].sum())
+    out = {"notes": n, "maxScore": chart.max_score, "calcMaxScore": chart.calc_max_score, "maxCombo": full_combo}
+
+    auto_t = press_times(chart, np.zeros((1, n)), fps, repress)
+    j, o = replay(chart, auto_t[0], window)
+    auto = score_runs(chart, j[None, :], o[None, :])
+    blocked = np.nonzero(j != PERFECT)[0]
+    out["auto"] = {"score": int(auto["score"][0]), "maxCombo": int(auto["maxCombo"][0]),
+                   "counts": dict(zip(JUDGES, auto["counts"][0].tolist())),
+                   "notPerfect": len(blocked),
+                   "notPerfectAt": [round(float(chart.t[i]), 4) for i in blocked[:20]]}
+
+    if seeds:
+        offsets = np.empty((len(seeds), n))
+        for r, seed in enumerate(seeds):
+            rng = np.random.default_rng(seed)
+            offsets[r] = rng.normal(mean, sigma, n) if sigma > 0 else mean
+            if miss_rate > 0:
+                offsets[r][rng.random(n) < miss_rate] = np.inf
+        pt = press_times(chart, offsets, fps, repress)
+        runs = [replay(chart, row, window) for row in pt]
+        judge = np.stack([r[0] for r in runs]) if n else np.zeros((len(seeds), 0), dtype=np.int64)
+        order = np.stack([r[1] for r in runs]) if n else np.zeros((len(seeds), 0), dtype=np.int64)
+        res = score_runs(chart, judge, order)
+        rate = res["score"] / chart.max_score if chart.max_score else np.zeros(len(seeds))
+        p5, p50, p95 = np.percentile(rate, [5, 50, 95]) if len(rate) else (0.0, 0.0, 0.0)
+        out["human"] = {
+            "seeds": len(seeds), "sigmaMs": sigma * 1000.0, "meanMs": mean * 1000.0, "missRate": miss_rate,
+            "scoreRate": {"mean": round(float(rate.mean()), 5), "p5": round(float(p5), 5),
+                          "p50": round(float(p50), 5), "p95": round(float(p95), 5)},
+            "maxComboMean": round(float(res["maxCombo"].mean()), 2),
+            "fullComboRate": round(float((res["maxCombo"] == full_combo).mean()), 5),
+            "lifeOutRate": round(float((res["minLife"] <= 0).mean()), 5),
+            "countsMean": dict(zip(JUDGES, (round(float(x), 2) for x in res["counts"].mean(axis=0)))),
+        }
+    return out
+
+
+def _sim_job(job) -> Tuple[str, Dict]:
+    """Worker: (path, seeds, sigma, mean, miss_rate, fps, repress_frames, window) -> (path, report or {error})."""
+    path, *params = job
+    t0 = time.perf_counter()
+    try:
+        res = simulate(load_chart(path), *params)
+    except Exception as e:
+        res = {"error": f"{type(e).__name__}: {e}"}
+    res["seconds"] = round(time.perf_counter() - t0, 6)
+    return path, res
+
+
+def collect_charts(paths: List[str]) -> List[str]:
+    """Chart files from files / song folders / charts roots (<difficulty>.json、無ければ .bin)."""
+    out = []
+    for p in paths:
+        if os.path.isfile(p):
+            out.append(p)
+            continue
+        dirs = [p] if os.path.isfile(os.path.join(p, "metadata.json")) else \
+            sorted(e.path for e in os.scandir(p) if e.is_dir() and not e.name.startswith("."))
+        for d in dirs:
+            for diff in DIFFICULTIES:
+                for ext in (".json", BIN_EXT):
+                    f = os.path.join(d, diff + ext)
+                    if os.path.isfile(f):
+                        out.append(f)
+                        break
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ObjJudgement の判定をオフラインで再現してスコア上限・判定分布を出す")
+    ap.add_argument("paths", nargs="*", help="譜面ファイル / 曲フォルダ / charts フォルダ（省略時は --root）")
+    ap.add_argument("--root", default="Assets/StreamingAssets/charts", help="charts フォルダ")
+    ap.add_argument("--seeds", type=int, default=100, help="人間モデルのシード数（0 でオートプレイだけ）")
+    ap.add_argument("--seed-base", type=int, default=0, help="シードの開始番号（seed-base .. seed-base+seeds-1）")
+    ap.add_argument("--sigma", type=float, default=DEFAULT_SIGMA_MS, help="押下タイミングのずれの標準偏差（ms）")
+    ap.add_argument("--mean", type=float, default=0.0, help="押下タイミングの平均のずれ（ms、+ で遅い）")
+    ap.add_argument("--miss-rate", type=float, default=0.0, help="ノーツを押し忘れる確率")
+    ap.add_argument("--fps", type=float, default=DEFAULT_FPS, help="判定フレームレート（0 でフレーム量子化なし）")
+    ap.add_argument("--repress", type=int, default=DEFAULT_REPRESS_FRAMES, help="同じキーを押し直せる最短フレーム数")
+    ap.add_argument("--window", type=float, default=JUDGE_WINDOW * 1000.0, help="judgeWindow（ms）")
+    ap.add_argument("--report", metavar="FILE", default=None, help="譜面ごとの結果を JSON で書き出す（- で標準出力）")
+    ap.add_argument("--strict", action="store_true", help="オートプレイで Perfect にならないノーツがあれば終了コード 1")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    charts = collect_charts(args.paths or [args.root])
+    if not charts:
+        print(f"[ERR] 譜面が見つかりません: {' '.join(args.paths or [args.root])}", file=sys.stderr)
+        sys.exit(1)
+    seeds = list(range(args.seed_base, args.seed_base + max(0, args.seeds)))
+    params = (seeds, args.sigma / 1000.0, args.mean / 1000.0, args.miss_rate, args.fps, args.repress,
+              args.window / 1000.0)
+    jobs = [(p,) + params for p in charts]
+    stats = toolstats.from_args("simulate_judgement", args, total=len(jobs))
+
+    report = {}
+    errors = blocked = 0
+    with stats.stage("simulate"):
+        for path, res in toolutil.map_jobs(_sim_job, jobs, args.jobs):
+            seconds = res.pop("seconds", 0.0)
+            report[path] = res
+            if "error" in res:
+                errors += 1
+                stats.log(f"[ERR] {path}: {res['error']}")
+                stats.file(path, "error", seconds, error=res["error"])
+                continue
+            auto = res["auto"]
+            line = (f"[SIM] {path}: notes={res['notes']} max={res['maxScore']} (calc {res['calcMaxScore']}) "
+                    f"auto={auto['score']} combo={auto['maxCombo']}/{res['maxCombo']}")
+            if "human" in res:
+                h = res["human"]
+                line += (f" human={h['scoreRate']['mean'] * 100:.1f}% "
+                         f"(p5 {h['scoreRate']['p5'] * 100:.1f}%) FC={h['fullComboRate'] * 100:.0f}%")
+            if auto["notPerfect"]:
+                blocked += 1
+                stats.log(f"[WARN] {path}: オートプレイで Perfect にならないノーツ {auto['notPerfect']} 個 "
+                          f"（同じキーの同時押しなど） t={auto['notPerfectAt'][:5]}")
+            stats.file(path, "ok", seconds, line=line, notes=res["notes"])
+
+    if args.report:
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.report == "-":
+            print(text)
+        else:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    stats.finish(charts=len(charts), seeds=len(seeds), blocked=blocked, errors=errors)
+    print(f"== 完了: 譜面 {len(charts)} / シード {len(seeds)} / 同時押しで上限に届かない譜面 {blocked} / "
+          f"エラー {errors} ==")
+    sys.exit(1 if errors or (args.strict and blocked) else 0)
+
+
+if __name__ == "__main__":
+    main()
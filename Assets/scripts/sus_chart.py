@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SUS 譜面を 1 行ずつ読んで、ゲームの譜面 JSON と同じノーツ列（time/lane/width/type/hold, time は拍）にする。
+
+2 つの読み方がある（どちらも小節長 #MMM02 と BPM 定義 #BPMxx / BPM 変化 #MMM08 を扱う）:
+- 既定: ObjClone.LoadSusChart と同じ規則（実際にゲームが .sus を読むときの挙動）
+    ; と // 以降はコメント、#MEASUREBS 対応、2 文字 = 1 トークン、
+    1x = タップ（トークン先頭 C/c で critical）、5x = フリック、2xy = ロング（同じチャンネルの点を 2 個ずつ組む）、
+    lane = x(36 進) - 1、width = トークン 2 文字目（2xy は y）
+- lane_map 指定時: SusLoader (ScriptableObject) と同じ規則
+    #MMMCC:DATA（CC は 16 進 2 桁）の 1 文字 = 1 シンボル、'0' 以外をノーツにし、
+    lane/width/type は laneMap（JsonUtility.ToJson(SusLoader) で書き出した JSON）から引く。
+    SusLoader は小節長を beatsPerMeasure 固定で扱うが、ここでは #MMM02 があればそれを優先する
+
+ノーツの拍は小節長が全部わかってから決まるので、読みながら (小節, 位置) を貯めて最後に累積和で拍へ変換する。
+"""
+
+import re, json
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from chartbin import TYPE_CODES
+
+DEFAULT_BPM = 120.0           # ObjClone / SusLoader の defaultBpm
+DEFAULT_MEASURE_LENGTH = 4.0  # 4/4（四分音符 = 1 拍）
+
+# SusLoader の laneMap 初期値（12..1C → lane 1..11, width 3, normal）
+DEFAULT_LANE_MAP = [{"channel": f"{0x12 + i:02X}", "lane": i + 1, "width": 3, "type": "normal"} for i in range(11)]
+
+_RX_DATA = re.compile(r"^\s*#(\d{3})([0-9A-Za-z]{2,3})\s*:\s*([0-9A-Za-z]+)")
+_RX_MEASURE_LEN = re.compile(r"^\s*#(\d{3})02\s*:\s*([0-9]+(?:\.[0-9]+)?)\s*$")
+_RX_MEASURE_BASE = re.compile(r"^\s*#MEASUREBS\s+(\d+)\s*$")
+_RX_BPM_DEF = re.compile(r"^#BPM([0-9A-Za-z]{2}):\s*([0-9.]+)$")
+_RX_BPM_PLAIN = re.compile(r"^#BPM:\s*([0-9.]+)$")
+_RX_TITLE = re.compile(r'^#TITLE\s+"(.*)"\s*$')
+# SusLoader の正規表現（行末まで一致が必要）
+_RX_LOADER_DATA = re.compile(r"^#(\d{3})([0-9A-Fa-f]{2}):([0-9A-Za-z]+)$")
+
+
+def b36(ch: str) -> int:
+    # ObjClone.B36 と同じ（範囲外は 0）
+    if "0" <= ch <= "9":
+        return ord(ch) - 48
+    if "a" <= ch <= "z":
+        return ord(ch) - 87
+    if "A" <= ch <= "Z":
+        return ord(ch) - 55
+    return 0
+
+
+def _clamp(v: int, lo: int, hi: int) -> int:
+    return lo if v < lo else hi if v > hi else v
+
+
+class SusChart:
+    """Parsed SUS: note columns (time/hold in beats, type = chartbin NOTE_TYPES index) + tempo events."""
+    __slots__ = ("time", "lane", "width", "type", "hold", "bpm", "bpm_events", "title")
+
+    def __init__(self):
+        self.time = array("d")
+        self.lane = array("b")
+        self.width = array("b")
+        self.type = array("b")
+        self.hold = array("d")
+        self.bpm = DEFAULT_BPM
+        self.bpm_events: List[Tuple[float, float]] = []
+        self.title: Optional[str] = None
+
+    def __len__(self):
+        return len(self.time)
+
+
+def load_lane_map(path: str) -> Dict:
+    """Read a SusLoader export: {"laneMap": [...], "beatsPerMeasure", "defaultBpm"} or a bare laneMap list."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"laneMap": data}
+    if not isinstance(data, dict) or not isinstance(data.get("laneMap"), list):
+        raise ValueError(f"{path}: laneMap がありません")
+    channels = {}
+    for e in data["laneMap"]:
+        ch = str(e.get("channel") or "").strip()
+        if not ch:
+            continue
+        ty = e.get("type") or "normal"
+        if ty not in ("normal", "critical", "flick"):
+            raise ValueError(f"{path}: channel {ch}: unsupported type {ty!r}")
+        channels[ch.upper()] = (int(e.get("lane", 1)), int(e.get("width", 3)), ty)  # 後勝ち
+    return {"channels": channels,
+            "beatsPerMeasure": float(data.get("beatsPerMeasure", DEFAULT_MEASURE_LENGTH)),
+            "defaultBpm": float(data.get("defaultBpm", DEFAULT_BPM))}
+
+
+class _Measures:
+    """#MMM02 の小節長テーブル。小節 m の長さ = m 以下で最後に定義された値（同じ小節は後勝ち）。"""
+
+    def __init__(self, default: float):
+        self.lengths = {0: default}
+
+    def set(self, meas: int, length: float):
+        self.lengths[meas] = length
+
+    def starts(self, last: int) -> Tuple[List[float], List[float]]:
+        """Start beat and length of measures 0..last (prefix sums)."""
+        starts, lens = [], []
+        cur, acc = self.lengths[0], 0.0
+        for m in range(last + 1):
+            cur = self.lengths.get(m, cur)
+            starts.append(acc)
+            lens.append(cur)
+            acc += cur
+        return starts, lens
+
+
+def parse_sus(lines, lane_map: Optional[Dict] = None) -> SusChart:
+    """
+    lines: iterable of text lines (e.g. an open file). lane_map: load_lane_map() result for
+    SusLoader rules, None for ObjClone.LoadSusChart rules.
+    """
+    loader = lane_map is not None
+    measures = _Measures(lane_map["beatsPerMeasure"] if loader else DEFAULT_MEASURE_LENGTH)
+    # (小節, 位置の分子, 分母, lane, width, type) — 拍は最後にまとめて計算
+    taps: List[Tuple[int, int, int, int, int, int]] = []
+    holds: Dict[str, List[Tuple[int, int, int, int, int]]] = {}
+    bpm_defs: Dict[str, float] = {}
+    bpm_refs: List[Tuple[int, int, int, str]] = []
+    first_def = None
+    title = None
+    meas_base = 0
+    last_meas = 0
+
+    for raw in lines:
+        s = raw.strip()
+        if not s or s[0] != "#":
+            continue
+        # ---- ヘッダ類（BPM 定義・タイトル）: SusLoader.ParseBpm と同じくコメント除去前の行で見る
+        m = _RX_BPM_DEF.match(s)
+        if m:
+            try:
+                v = float(m.group(2))
+            except ValueError:
+                continue
+            bpm_defs[m.group(1).upper()] = v
+            if first_def is None:
+                first_def = v
+            continue
+        m = _RX_BPM_PLAIN.match(s)
+        if m:
+            try:
+                v = float(m.group(1))
+            except ValueError:
+                continue
+            if first_def is None:
+                first_def = v
+            continue
+        m = _RX_TITLE.match(s)
+        if m:
+            title = m.group(1).strip() or None
+            continue
+
+        if not loader:
+            p = s.find(";")
+            if p >= 0:
+                s = s[:p]
+            p = s.find("//")
+            if p >= 0:
+                s = s[:p]
+            s = s.strip()
+            if not s:
+                continue
+            m = _RX_MEASURE_BASE.match(s)
+            if m:
+                meas_base = int(m.group(1))
+                continue
+
+        m = _RX_MEASURE_LEN.match(s)
+        if m:
+            measures.set(int(m.group(1)) + meas_base, float(m.group(2)))
+            continue
+
+        m = (_RX_LOADER_DATA if loader else _RX_DATA).match(s)
+        if not m:
+            continue
+        meas = int(m.group(1)) + meas_base
+        chan, data = m.group(2), m.group(3)
+
+        if chan == "08":
+            # BPM 変化：2 文字 = BPM 定義の番号
+            divs = len(data) // 2
+            for i in range(divs):
+                tok = data[2 * i:2 * i + 2]
+                if tok != "00":
+                    bpm_refs.append((meas, i, divs, tok.upper()))
+            last_meas = max(last_meas, meas)
+            continue
+
+        if loader:
+            cfg = lane_map["channels"].get(chan.upper())
+            if cfg is None:
+                continue
+            lane, width, ty = _clamp(cfg[0], 1, 12), _clamp(cfg[1], 1, 12), TYPE_CODES[cfg[2]]
+            n = len(data)
+            for i, sym in enumerate(data):
+                if sym != "0":
+                    taps.append((meas, i, n, lane, width, ty))
+            last_meas = max(last_meas, meas)
+            continue
+
+        divs = len(data) // 2
+        ch0 = chan[0]
+        if divs <= 0 or ch0 not in "125":
+            continue
+        # SUS レーン(左端) → ゲームレーン: -2 ずらす
+        lane = _clamp(b36(chan[1]) + 1 - 2, 1, 12)
+        last_meas = max(last_meas, meas)
+        if ch0 == "2":
+            w_chan = _clamp(b36(chan[2]), 1, 12) if len(chan) >= 3 else -1
+            pts = holds.setdefault(chan, [])
+            for i in range(divs):
+                tok = data[2 * i:2 * i + 2]
+                if tok != "00":
+                    pts.append((meas, i, divs, lane, w_chan if w_chan > 0 else _clamp(b36(tok[1]), 1, 12)))
+            continue
+        for i in range(divs):
+            tok = data[2 * i:2 * i + 2]
+            if tok == "00":
+                continue
+            if ch0 == "5":
+                ty = TYPE_CODES["flick"]
+            elif tok[0] in "Cc":
+                ty = TYPE_CODES["critical"]
+            else:
+                ty = TYPE_CODES["normal"]
+            taps.append((meas, i, divs, lane, _clamp(b36(tok[1]), 1, 12), ty))
+
+    starts, lens = measures.starts(last_meas)
+
+    def beat(meas: int, i: int, divs: int) -> float:
+        return starts[meas] + i / divs * lens[meas]
+
+    out = SusChart()
+    out.title = title
+    for meas, i, divs, lane, width, ty in taps:
+        out.time.append(beat(meas, i, divs)); out.lane.append(lane); out.width.append(width)
+        out.type.append(ty); out.hold.append(0.0)
+    # 2xy: 同じチャンネルの点を拍順に並べ、2 個ずつ start-end にする（余りの 1 点は捨てる）
+    long_code = TYPE_CODES["long"]
+    for pts in holds.values():
+        seq = sorted(((beat(m, i, d), lane, w) for m, i, d, lane, w in pts), key=lambda p: p[0])
+        for k in range(0, len(seq) - 1, 2):
+            (sb, lane, w), (eb, _, _) = seq[k], seq[k + 1]
+            out.time.append(sb); out.lane.append(lane); out.width.append(w)
+            out.type.append(long_code); out.hold.append(max(0.0, eb - sb))
+
+    for meas, i, divs, tok in bpm_refs:
+        if tok in bpm_defs:
+            out.bpm_events.append((beat(meas, i, divs), bpm_defs[tok]))
+    out.bpm_events.sort(key=lambda e: e[0])
+    default = lane_map["defaultBpm"] if loader else DEFAULT_BPM
+    start = [v for b, v in out.bpm_events if v > 0]
+    out.bpm = start[0] if start else (first_def if first_def and first_def > 0 else default)
+    return out
+
+
+def load_sus(path: str, lane_map: Optional[Dict] = None) -> SusChart:
+    # BOM 付き UTF-8 も読めるように
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        return parse_sus(f, lane_map)
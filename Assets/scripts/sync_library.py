@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+曲ライブラリ（元フォルダ）から Assets/StreamingAssets/charts への差分同期。
+
+- 比較は (size, mtime_ns) が同じなら同一とみなし、size が同じで mtime だけ違うときは中身の sha256 で判定
+  （中身が同じなら mtime だけ合わせて次回から stat で済むようにする）。--checksum で常にハッシュ比較
+- 新規 / 変更ファイルだけをプロセスプール並列でコピー。--link auto（既定）は
+  reflink（同じファイルシステムの Btrfs / XFS などで中身を共有するコピー）→ ハードリンク → 通常コピーの順に試す
+  ハードリンクは元ファイルと実体が同じなので、charts 側を直接書き換えるツールを使うときは --link copy で
+- 書き込みは一時ファイル + rename（Unity や --watch 中の変換が書きかけのファイルを読まない）
+- charts 側にだけあるファイル（orphan）は既定では一覧表示のみ、--delete で消す（空になったフォルダも消す）
+  .meta（Unity が作る）とドットファイル（キャッシュ類）は比較・orphan の対象外。
+  ほかのツールが charts 側で作るもの（catalog.json、曲フォルダの cover.png / cover_<size>.png、譜面の隣の .bin）も
+  src に無いのが普通なので orphan にしない（src から曲フォルダごと消えたときは orphan）
+- chart.py と同じく曲フォルダの足場を作る: metadata.json が無ければ make_metadata.py の TEMPLATE で作成、
+  --stubs で無い難易度に "[]" の空譜面も置く（空譜面も DifficultySelect にボタンとして出るので既定はオフ）
+- --dry-run では何も書かずに、コピー / リンク / 削除 / 足場作成の予定とバイト数だけ表示
+- --stats FILE / --profile / --verbose は toolstats.py
+
+使い方:
+    python sync_library.py --src ~/pjsk_library [--dst Assets/StreamingAssets/charts] [--link auto|reflink|hardlink|copy]
+                           [--checksum] [--delete] [--stubs] [--dry-run] [--jobs 0]
+"""
+
+import os, re, sys, json, time, errno, shutil, argparse
+from typing import Dict, List, Optional, Tuple
+
+import toolstats
+import toolutil
+from build_catalog import CATALOG_NAME
+from chartbin import BIN_EXT
+from make_metadata import TEMPLATE
+from toolutil import file_sha256, write_atomic
+
+DIFFICULTIES = ["easy", "normal", "hard", "expert", "master"]
+SCAFFOLD_NAMES = {"metadata.json"} | {f"{d}.json" for d in DIFFICULTIES}
+# mosaic_covers.py の出力（先頭が cover.png、以降は cover_<size>.png）
+COVER_RE = re.compile(r"cover(_\d+)?\.png")
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+# Unity が StreamingAssets 配下に作るもの・一時ファイルは見ない
+IGNORE_SUFFIXES = (".meta", ".tmp")
+# Linux の FICLONE ioctl（_IOW(0x94, 9, int)）
+_FICLONE = 0x40049409
+
+
+def _ignored(name: str) -> bool:
+    return name.startswith(".") or name.endswith(IGNORE_SUFFIXES)
+
+
+def scan_tree(root: str) -> Dict[str, Tuple[int, int, int, int]]:
+    """rel path (/ 区切り) -> (size, mtime_ns, st_dev, st_ino)。ドットフォルダ・.meta は除く。"""
+    out = {}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with it:
+            for e in it:
+                if _ignored(e.name):
+                    continue
+                rel = f"{rel_dir}/{e.name}" if rel_dir else e.name
+                try:
+                    if e.is_dir(follow_symlinks=True):
+                        stack.append(rel)
+                    elif e.is_file(follow_symlinks=True):
+                        st = e.stat(follow_symlinks=True)
+                        out[rel] = (st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+                except FileNotFoundError:
+                    pass
+    return out
+
+
+
+def classify(src: Tuple, dst: Optional[Tuple], checksum: bool) -> str:
+    """new / same / changed / verify（size は同じで mtime が違う → ハッシュで確かめる）"""
+    if dst is None:
+        return "new"
+    if src[2:] == dst[2:]:
+        return "same"  # 同じ inode（前回ハードリンクしたもの）
+    if src[0] != dst[0]:
+        return "changed"
+    if checksum or src[1] != dst[1]:
+        return "verify"
+    return "same"
+
+
+def _reflink(src: str, tmp: str):
+    import fcntl
+    with open(src, "rb") as fs, open(tmp, "wb") as fd:
+        fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+    shutil.copystat(src, tmp)
+
+
+def place_file(src: str, dst: str, mode: str) -> str:
+    """
+    src を dst に置く（一時ファイル + rename）。実際に使った方法（reflink / hardlink / copy）を返す。
+    auto と reflink は使えないとき（別のファイルシステム・未対応の FS / OS）次の方法に落ちる。
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with toolutil.atomic_output(dst) as tmp:
+        return _place(src, tmp, mode)
+
+
+def _place(src: str, tmp: str, mode: str) -> str:
+    # tmp は temp_path が作った空ファイル。ハードリンクは既存の名前には張れないので消してから
+    tries = {"auto": ("reflink", "hardlink", "copy"), "reflink": ("reflink", "copy"),
+             "hardlink": ("hardlink", "copy"), "copy": ("copy",)}[mode]
+    for how in tries:
+        try:
+            if how == "reflink":
+                if not sys.platform.startswith("linux"):
+                    continue
+                _reflink(src, tmp)
+            elif how == "hardlink":
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                os.link(src, tmp)
+            else:
+                shutil.copy2(src, tmp)
+        except OSError as e:
+            if how == "copy" or e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                                                errno.EPERM, errno.EMLINK, errno.ENOSYS, errno.EBADF):
+                raise
+            continue
+        return how
+    raise OSError(errno.EIO, f"could not place {src}")
+
+
+def sync_file(job) -> Dict:
+    """
+    Worker: (rel, src, dst, state, mode, dry_run) -> {rel, action, how, bytes, hashed, seconds, error}.
+    action: copied / updated / same（verify で中身が同じだった）/ error
+    """
+    rel, src, dst, state, mode, dry_run = job
+    t0 = time.perf_counter()
+    res = {"rel": rel, "action": "error", "how": None, "bytes": 0, "hashed": 0, "seconds": 0.0, "error": None}
+    try:
+        size = os.path.getsize(src)
+        if state == "verify":
+            res["hashed"] = size * 2
+            if file_sha256(src) == file_sha256(dst):
+                if not dry_run:
+                    shutil.copystat(src, dst)  # 次回は stat だけで一致する
+                res["action"] = "same"
+                return res
+        res["action"] = "copied" if state == "new" else "updated"
+        res["bytes"] = size
+        res["how"] = mode if dry_run else place_file(src, dst, mode)
+    except OSError as e:
+        res["action"] = "error"
+        res["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        res["seconds"] = time.perf_counter() - t0
+    return res
+
+
+def scaffold_song(folder: str, have: set, stubs: bool) -> List[Tuple[str, str]]:
+    """
+    chart.py と同じ足場: 無い metadata.json を TEMPLATE（title = フォルダ名）で、stubs なら無い難易度に "[]"。
+    have は同期後にその曲フォルダにある（予定の）ファイル名。[(name, text)] を返す（書くのは呼び出し側）。
+    """
+    out = []
+    if "metadata.json" not in have:
+        meta = json.loads(json.dumps(TEMPLATE))
+        meta["title"] = folder
+        out.append(("metadata.json", json.dumps(meta, ensure_ascii=False, indent=2) + "\n"))
+    if stubs:
+        for d in DIFFICULTIES:
+            if f"{d}.json" not in have and f"{d}.sus" not in have:
+                out.append((f"{d}.json", "[]"))
+    return out
+
+
+def is_scaffold_file(rel: str, src_songs: set) -> bool:
+    """曲フォルダ直下の metadata.json / <difficulty>.json（足場や変換の出力）は src に無くても残す。"""
+    folder, _, name = rel.partition("/")
+    return folder in src_songs and name in SCAFFOLD_NAMES
+
+
+def is_generated_file(rel: str, src: Dict, src_songs: set) -> bool:
+    """
+    charts 側でほかのツールが作るもの: build_catalog の catalog.json、mosaic_covers の cover.png / cover_<size>.png、
+    chartbin / 変換の <譜面>.bin（同じ名前の .json が src にあるか足場のもの）。
+    """
+    if rel == CATALOG_NAME:
+        return True
+    folder, _, name = rel.partition("/")
+    if folder not in src_songs or "/" in name:
+        return False
+    if COVER_RE.fullmatch(name):
+        return True
+    if name.endswith(BIN_EXT):
+        chart = rel[:-len(BIN_EXT)] + ".json"
+        return chart in src or is_scaffold_file(chart, src_songs)
+    return False
+
+
+def remove_empty_dirs(root: str, rels: List[str]):
+    """消したファイルの親フォルダを、空になっていれば root の手前まで消す。"""
+    for d in sorted({os.path.dirname(r) for r in rels if "/" in r}, key=len, reverse=True):
+        while d:
+            p = os.path.join(root, d)
+            try:
+                os.rmdir(p)
+            except OSError:
+                break
+            # Unity の <folder>.meta が残っていれば一緒に消す
+            if os.path.exists(p + ".meta"):
+                os.remove(p + ".meta")
+            d = os.path.dirname(d)
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def run(src_root: str, dst_root: str, mode: str = "auto", checksum: bool = False, delete: bool = False,
+        stubs: bool = False, scaffold: bool = True, dry_run: bool = False, jobs: int = 0,
+        stats: Optional["toolstats.RunStats"] = None) -> int:
+    if stats is None:
+        stats = toolstats.RunStats("sync_library")
+    with stats.stage("scan"):
+        src = scan_tree(src_root)
+        dst = scan_tree(dst_root)
+
+    plan = {"new": [], "changed": [], "verify": [], "same": []}
+    for rel in sorted(src):
+        plan[classify(src[rel], dst.get(rel), checksum)].append(rel)
+
+    # 曲フォルダ（src 直下のフォルダ）ごとの足場。src から消えた曲は足場を作らず orphan として扱う
+    src_songs = {rel.split("/", 1)[0] for rel in src if "/" in rel}
+    have: Dict[str, set] = {folder: set() for folder in src_songs}
+    for rel in list(src) + list(dst):
+        folder, _, name = rel.partition("/")
+        if folder in have and name and "/" not in name:
+            have[folder].add(name)
+    scaffolds: Dict[str, List[Tuple[str, str]]] = {}
+    if scaffold:
+        for folder in sorted(src_songs):
+            files = [(f"{folder}/{name}", text) for name, text in scaffold_song(folder, have[folder], stubs)]
+            if files:
+                scaffolds[folder] = files
+    # 足場で作るもの（前回の実行で作ったものも含む）とほかのツールの出力は orphan にしない
+    orphans = sorted(rel for rel in dst if rel not in src and not is_scaffold_file(rel, src_songs)
+                     and not is_generated_file(rel, src, src_songs))
+
+    work = [(rel, os.path.join(src_root, rel), os.path.join(dst_root, rel),
+             "new" if rel in plan["new"] else ("changed" if rel in plan["changed"] else "verify"),
+             mode, dry_run)
+            for rel in plan["new"] + plan["changed"] + plan["verify"]]
+    stats.set_total(len(src))
+    for rel in plan["same"]:
+        stats.file(rel, "same")
+
+    totals = {"copied": 0, "updated": 0, "same": len(plan["same"]), "error": 0}
+    moved = hashed = 0
+    by_how: Dict[str, int] = {}
+    tag = "[DRY]" if dry_run else "[OK]"
+    with stats.stage("sync"):
+        for res in toolutil.map_jobs(sync_file, work, jobs):
+            action = res["action"]
+            totals[action] += 1
+            hashed += res["hashed"]
+            if action == "error":
+                stats.log(f"[ERR] {res['rel']}: {res['error']}")
+                stats.file(res["rel"], "error", res["seconds"], error=res["error"])
+                continue
+            if action != "same":
+                moved += res["bytes"]
+                by_how[res["how"]] = by_how.get(res["how"], 0) + res["bytes"]
+            stats.file(res["rel"], action, res["seconds"],
+                       line=None if action == "same" else f"{tag} {action} ({res['how']}) {res['rel']}",
+                       bytesOut=res["bytes"])
+
+    made = 0
+    for folder, files in scaffolds.items():
+        for rel, text in files:
+            if not dry_run:
+                write_atomic(os.path.join(dst_root, rel), text)
+            made += 1
+            stats.log(f"{tag} scaffold {rel}")
+
+    removed_bytes = 0
+    if orphans:
+        for rel in orphans:
+            removed_bytes += dst[rel][0]
+            if delete and not dry_run:
+                try:
+                    os.remove(os.path.join(dst_root, rel))
+                    if os.path.exists(os.path.join(dst_root, rel + ".meta")):
+                        os.remove(os.path.join(dst_root, rel + ".meta"))
+                except OSError as e:
+                    totals["error"] += 1
+                    stats.log(f"[ERR] {rel}: {e}")
+                    continue
+            if delete:
+                stats.log(f"{tag} delete {rel}")
+        if delete and not dry_run:
+            remove_empty_dirs(dst_root, orphans)
+        if not delete:
+            stats.log(f"[WARN] charts 側にだけあるファイル {len(orphans)} 件（--delete で削除）:")
+            for rel in orphans:
+                stats.log(f"  {rel}")
+
+    stats.finish(copied=totals["copied"], updated=totals["updated"], same=totals["same"], errors=totals["error"],
+                 bytesMoved=moved, bytesHashed=hashed, byMethod=by_how, orphans=len(orphans),
+                 orphanBytes=removed_bytes, scaffolded=made, dryRun=dry_run)
+    head = "== DRY RUN（書き込みなし）" if dry_run else "== 完了"
+    print(f"{head}: 新規 {totals['copied']} / 更新 {totals['updated']} / 同一 {totals['same']} / "
+          f"足場 {made} / orphan {len(orphans)}{'（削除）' if delete else ''} / エラー {totals['error']} ==")
+    methods = ", ".join(f"{k} {fmt_bytes(v)}" for k, v in sorted(by_how.items())) or "-"
+    print(f"   転送 {fmt_bytes(moved)}（{methods}） / ハッシュ比較 {fmt_bytes(hashed)} / "
+          f"orphan {fmt_bytes(removed_bytes)}")
+    return totals["error"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="曲ライブラリから StreamingAssets/charts への差分同期")
+    ap.add_argument("--src", required=True, help="元の曲ライブラリ（<song>/ フォルダの集まり）")
+    ap.add_argument("--dst", default="Assets/StreamingAssets/charts", help="同期先の charts フォルダ")
+    ap.add_argument("--link", choices=LINK_MODES, default="auto",
+                    help="置き方: auto = reflink → hardlink → copy の順に試す")
+    ap.add_argument("--checksum", action="store_true", help="size と mtime が同じでも中身のハッシュで比べる")
+    ap.add_argument("--delete", action="store_true", help="charts 側にだけあるファイルを削除する")
+    ap.add_argument("--stubs", action="store_true", help="無い難易度に空譜面 \"[]\" を置く（chart.py と同じ）")
+    ap.add_argument("--no-scaffold", action="store_true", help="metadata.json の足場を作らない")
+    ap.add_argument("--dry-run", action="store_true", help="書き込まずに予定だけ表示")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="並列プロセス数（0 で CPU 数）")
+    toolstats.add_arguments(ap)
+    args = ap.parse_args()
+
+    src_root = os.path.abspath(os.path.expanduser(args.src))
+    dst_root = os.path.abspath(os.path.expanduser(args.dst))
+    if not os.path.isdir(src_root):
+        print(f"[ERR] src が見つかりません: {src_root}", file=sys.stderr)
+        sys.exit(1)
+    if src_root == dst_root or dst_root.startswith(src_root + os.sep) or src_root.startswith(dst_root + os.sep):
+        print("[ERR] src と dst が同じ / 入れ子になっています", file=sys.stderr)
+        sys.exit(1)
+    if not args.dry_run:
+        os.makedirs(dst_root, exist_ok=True)
+
+    err = run(src_root, dst_root, args.link, args.checksum, args.delete, args.stubs, not args.no_scaffold,
+              args.dry_run, args.jobs, toolstats.from_args("sync_library", args))
+    sys.exit(1 if err else 0)
+
+
+if __name__ == "__main__":
+    main()
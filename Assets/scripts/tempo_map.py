@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍(beat) → 秒 / 見た目位置 の区分線形テーブル（累積和つき）。
+
+- 区間境界 = BPM 変化の拍 ∪ speedScaleMarkers の拍（beat 0 は常に含む）
+- seconds[i]  : beat[i] の時刻（beat 0 = 0 秒）。区間内は 60/bpm[i] で線形
+- position[i] : beat[i] までの ∫forward dbeat（ObjClone の ZDistanceBetweenBeats と同じ積分）
+- positionReverse[i] : 逆走(reverse 倍率)での同じ積分
+- forward/reverse は ObjClone.GetDirScaleForBeat と同じ規則（<=0 のマーカー値は直前の値を維持）
+
+検索はすべて bisect（NumPy があれば searchsorted）で O(log n)。
+metadata.json には to_json() の列形式で "tempoMap" として保存する。
+"""
+
+from array import array
+from bisect import bisect_right
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy は任意
+    np = None
+
+TEMPO_MAP_VERSION = 1
+DEFAULT_BPM = 180.0
+DEFAULT_FORWARD = 1.0
+DEFAULT_REVERSE = 1.0 / 6.0
+# ObjClone.GetDirScaleForBeat の許容誤差（beat + 1e-6 >= marker.beat で適用）
+MARKER_EPS = 1e-6
+
+_COLUMNS = ("beat", "bpm", "seconds", "forward", "reverse", "position", "positionReverse")
+
+
+class TempoMap:
+    """Piecewise tempo/scroll table with prefix sums. Columns are array('d') of equal length."""
+
+    def __init__(self):
+        for name in _COLUMNS:
+            setattr(self, _attr(name), array("d"))
+
+    def __len__(self):
+        return len(self.beat)
+
+    # ---- 構築 ----
+    @classmethod
+    def from_events(cls, bpm_events: Sequence[Tuple[float, float]], markers: Sequence[Dict],
+                    default_bpm: float = DEFAULT_BPM) -> "TempoMap":
+        """
+        bpm_events: [(beat, bpm)] (USC の出現順。同じ拍は後勝ち、bpm<=0 は無視)
+        markers:    speedScaleMarkers（{beat, forward, reverse}）
+        """
+        bpms = sorted(((float(b), float(v)) for b, v in bpm_events if float(v) > 0), key=lambda e: e[0])
+        marks = sorted(markers, key=lambda m: float(m.get("beat", 0.0)))
+        edges = sorted({0.0, *(b for b, _ in bpms), *(float(m.get("beat", 0.0)) for m in marks)})
+
+        tm = cls()
+        bpm = bpms[0][1] if bpms else float(default_bpm)
+        fwd, rev = DEFAULT_FORWARD, DEFAULT_REVERSE
+        bi = mi = 0
+        for i, b in enumerate(edges):
+            while bi < len(bpms) and bpms[bi][0] <= b:
+                bpm = bpms[bi][1]
+                bi += 1
+            while mi < len(marks) and b + MARKER_EPS >= float(marks[mi].get("beat", 0.0)):
+                f = float(marks[mi].get("forward", 0.0))
+                r = float(marks[mi].get("reverse", 0.0))
+                if f > 0:
+                    fwd = f
+                if r > 0:
+                    rev = r
+                mi += 1
+            if i == 0:
+                sec = pos = pos_r = 0.0
+            else:
+                db = b - edges[i - 1]
+                sec = tm.seconds[-1] + db * (60.0 / tm.bpm[-1])
+                pos = tm.position[-1] + db * tm.forward[-1]
+                pos_r = tm.position_reverse[-1] + db * tm.reverse[-1]
+            tm.beat.append(b); tm.bpm.append(bpm); tm.seconds.append(sec)
+            tm.forward.append(fwd); tm.reverse.append(rev)
+            tm.position.append(pos); tm.position_reverse.append(pos_r)
+
+        # beat 0 を 0 秒 / 位置 0 に揃える（負の拍に境界がある場合）
+        k = bisect_right(tm.beat, 0.0) - 1
+        for col in (tm.seconds, tm.position, tm.position_reverse):
+            base = col[k]
+            if base:
+                for j in range(len(col)):
+                    col[j] -= base
+        return tm
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "TempoMap":
+        tm = cls()
+        for name in _COLUMNS:
+            setattr(tm, _attr(name), array("d", (float(x) for x in data.get(name, []))))
+        if len({len(getattr(tm, _attr(n))) for n in _COLUMNS}) != 1 or not len(tm):
+            raise ValueError("tempoMap columns are missing or have different lengths")
+        return tm
+
+    @classmethod
+    def from_metadata(cls, meta: Dict) -> "TempoMap":
+        """metadata.json の tempoMap を使う。無ければ bpm（一定）と speedScaleMarkers から組み立てる。"""
+        if isinstance(meta.get("tempoMap"), dict):
+            return cls.from_json(meta["tempoMap"])
+        bpm = meta.get("bpm")
+        bpm = float(bpm) if bpm else DEFAULT_BPM
+        return cls.from_events([(0.0, bpm)], meta.get("speedScaleMarkers") or [])
+
+    def to_json(self) -> Dict:
+        out = {"version": TEMPO_MAP_VERSION}
+        for name in _COLUMNS:
+            out[name] = list(getattr(self, _attr(name)))
+        return out
+
+    # ---- 単発の検索 ----
+    def segment_index(self, beat: float) -> int:
+        return max(0, bisect_right(self.beat, beat) - 1)
+
+    def beat_to_seconds(self, beat: float) -> float:
+        i = self.segment_index(beat)
+        return self.seconds[i] + (beat - self.beat[i]) * (60.0 / self.bpm[i])
+
+    def seconds_to_beat(self, sec: float) -> float:
+        i = max(0, bisect_right(self.seconds, sec) - 1)
+        return self.beat[i] + (sec - self.seconds[i]) * (self.bpm[i] / 60.0)
+
+    def beat_to_position(self, beat: float, reverse: bool = False) -> float:
+        i = self.segment_index(beat)
+        if reverse:
+            return self.position_reverse[i] + (beat - self.beat[i]) * self.reverse[i]
+        return self.position[i] + (beat - self.beat[i]) * self.forward[i]
+
+    def dir_scale(self, beat: float, speed_sign: int = 1) -> float:
+        """Same value as ObjClone.GetDirScaleForBeat (with the default inspector scales)."""
+        i = max(0, bisect_right(self.beat, beat + MARKER_EPS) - 1)
+        return self.forward[i] if speed_sign >= 0 else self.reverse[i]
+
+    # ---- ノーツ配列の一括変換 ----
+    def beats_to_seconds(self, beats):
+        """Vectorized beat_to_seconds. NumPy array if NumPy is available, else array('d')."""
+        return self._batch(beats, self.seconds, None)
+
+    def beats_to_positions(self, beats, reverse: bool = False):
+        """Vectorized beat_to_position."""
+        if reverse:
+            return self._batch(beats, self.position_reverse, self.reverse)
+        return self._batch(beats, self.position, self.forward)
+
+    def _batch(self, beats, prefix, slope: Optional[array]):
+        if np is not None:
+            b = np.asarray(beats, dtype=np.float64)
+            edges = np.frombuffer(self.beat, dtype=np.float64)
+            idx = np.maximum(np.searchsorted(edges, b, side="right") - 1, 0)
+            rate = (60.0 / np.frombuffer(self.bpm, dtype=np.float64)) if slope is None \
+                else np.frombuffer(slope, dtype=np.float64)
+            return np.frombuffer(prefix, dtype=np.float64)[idx] + (b - edges[idx]) * rate[idx]
+        out = array("d")
+        for x in beats:
+            i = self.segment_index(x)
+            rate = (60.0 / self.bpm[i]) if slope is None else slope[i]
+            out.append(prefix[i] + (x - self.beat[i]) * rate)
+        return out
+
+
+def _attr(name: str) -> str:
+    return "position_reverse" if name == "positionReverse" else name
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ツール共通の計測レイヤー（mmw4cc_to_mygame.py / mosaic_covers.py / metadata 系スクリプトで使う）。
+
+- --stats FILE: ファイルごと・ステージごとの時間、読み書きバイト数、オブジェクト数 / ノーツ数を JSON Lines で追記
+    {"kind": "start", ...} / {"kind": "file", "path", "status", "seconds", "stages", "bytesIn", ...} /
+    {"kind": "stage", "name", "seconds"} / {"kind": "summary", "statuses", "slowest", ...}
+- --profile [FILE]: 実行全体を cProfile で計測して pstats 形式で保存（プロセスプールのワーカー内は含まれないので、
+  変換処理そのものを見たいときは --jobs 1 で）
+- ファイルごとの [OK] 行は --verbose のときだけ。既定は端末なら 1 行の進捗表示（--no-progress で消す）
+
+使い方（各ツールの中で）:
+    toolstats.add_arguments(ap)
+    stats = toolstats.from_args("mosaic_covers", args, total=len(work))
+    stats.file(path, "ok", seconds, line=f"[OK] {path}", bytesIn=..., bytesOut=...)
+    stats.finish()
+"""
+
+import os, sys, json, time, heapq, cProfile, shutil
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+STATS_VERSION = 1
+# summary に載せる遅いファイルの件数
+SLOWEST_N = 10
+# 進捗行の更新間隔（秒）。毎ファイル書くと出力そのものが重くなる
+PROGRESS_INTERVAL = 0.2
+# 数値として合計するフィールド
+COUNTERS = ("bytesIn", "bytesOut", "objects", "notes", "pathNodesIn", "pathNodesOut")
+
+
+class RunStats:
+    """Per-run collector: JSONL records, run/file stages, slowest files, progress line, optional cProfile."""
+
+    def __init__(self, tool: str, stats_path: Optional[str] = None, profile_path: Optional[str] = None,
+                 verbose: bool = True, progress: bool = False, total: int = 0):
+        self.tool = tool
+        self.verbose = verbose
+        self.progress = progress and not verbose
+        self.total = total
+        self.done = 0
+        self.statuses: Dict[str, int] = {}
+        self.counters = {k: 0 for k in COUNTERS}
+        self.stages: Dict[str, float] = {}
+        self.slowest = []  # (seconds, path) の最小ヒープ
+        self.t0 = time.perf_counter()
+        self._last_progress = 0.0
+        self._progress_len = 0
+        self._out = open(stats_path, "a", encoding="utf-8") if stats_path else None
+        self.profile_path = profile_path
+        self._prof = None
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self._write({"kind": "start", "argv": sys.argv[1:], "time": time.time(), "total": total})
+        if profile_path:
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+
+    def _write(self, rec: Dict):
+        if self._out is not None:
+            rec = dict({"v": STATS_VERSION, "tool": self.tool, "run": self.run_id}, **rec)
+            self._out.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def set_total(self, total: int):
+        self.total = total
+
+    def log(self, line: str):
+        """Print a line without tearing the progress line."""
+        self._clear_progress()
+        print(line)
+
+    def file(self, path: str, status: str = "ok", seconds: float = 0.0, line: Optional[str] = None, **fields):
+        """
+        One processed item. status は ok / skip / cached / error など自由（summary で件数を数える）。
+        fields: stages={name: seconds}, bytesIn, bytesOut, objects, notes, その他そのまま記録するもの。
+        """
+        self.done += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for k in COUNTERS:
+            v = fields.get(k)
+            if v:
+                self.counters[k] += v
+        for name, sec in (fields.get("stages") or {}).items():
+            self.stages[name] = self.stages.get(name, 0.0) + sec
+        if seconds > 0:
+            item = (seconds, str(path))
+            if len(self.slowest) < SLOWEST_N:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+        if self._out is not None:
+            self._write(dict({"kind": "file", "path": str(path), "status": status, "seconds": round(seconds, 6)},
+                             **fields))
+        if line and self.verbose:
+            print(line)
+        elif self.progress:
+            self._show_progress(str(path))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Run-level stage (scan, pool, save...)."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            sec = time.perf_counter() - t
+            self.stages[name] = self.stages.get(name, 0.0) + sec
+            self._write({"kind": "stage", "name": name, "seconds": round(sec, 6)})
+
+    def _show_progress(self, name: str, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL and self.done != self.total:
+            return
+        self._last_progress = now
+        counts = " ".join(f"{k}={v}" for k, v in sorted(self.statuses.items()))
+        total = f"/{self.total}" if self.total else ""
+        text = f"[{self.done}{total}] {counts} {now - self.t0:.1f}s {name}"
+        width = shutil.get_terminal_size((100, 20)).columns - 1
+        text = text[:width]
+        sys.stderr.write("\r" + text + " " * max(0, self._progress_len - len(text)))
+        sys.stderr.flush()
+        self._progress_len = len(text)
+
+    def _clear_progress(self):
+        if self._progress_len:
+            sys.stderr.write("\r" + " " * self._progress_len + "\r")
+            sys.stderr.flush()
+            self._progress_len = 0
+
+    def finish(self, **extra) -> Dict:
+        """Stop profiling, write the summary record and close the stats file. Returns the summary."""
+        if self._prof is not None:
+            self._prof.disable()
+            self._prof.dump_stats(self.profile_path)
+            self._prof = None
+        self._clear_progress()
+        summary = {"kind": "summary", "seconds": round(time.perf_counter() - self.t0, 6), "files": self.done,
+                   "statuses": self.statuses, "stages": {k: round(v, 6) for k, v in self.stages.items()},
+                   "slowest": [{"path": p, "seconds": round(s, 6)} for s, p in sorted(self.slowest, reverse=True)]}
+        summary.update(self.counters)
+        summary.update(extra)
+        self._write(summary)
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+        if self.profile_path:
+            print(f"[PROF] {self.profile_path}（python -m pstats {self.profile_path} で確認）")
+        return summary
+
+
+def add_arguments(ap):
+    ap.add_argument("--stats", metavar="FILE", default=None,
+                    help="ファイル/ステージごとの計測を JSON Lines で追記する")
+    ap.add_argument("--profile", metavar="FILE", nargs="?", const="", default=None,
+                    help="cProfile の結果を pstats で保存（FILE 省略時は <ツール名>.pstats）")
+    ap.add_argument("--verbose", "-v", action="store_true", help="ファイルごとの [OK] 行を表示する")
+    ap.add_argument("--no-progress", action="store_true", help="進捗行を表示しない")
+
+
+def from_args(tool: str, args, total: int = 0) -> RunStats:
+    profile = args.profile
+    if profile == "":
+        profile = f"{tool}.pstats"
+    return RunStats(tool, stats_path=args.stats, profile_path=profile, verbose=args.verbose,
+                    progress=not args.no_progress and sys.stderr.isatty(), total=total)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ツール共通の小物（Assets/scripts の各ツールと mmw4cc_to_mygame.py で使う。計測は toolstats.py）。
+
+- map_jobs(fn, work, jobs): --jobs の並列実行。jobs は 0 で CPU 数。1 以下か work が 1 件以下ならこのプロセスで順に、
+  それ以外は ProcessPoolExecutor（chunksize = 件数 / (ワーカー数 × 4)）で実行し、結果を work の順に 1 件ずつ返す
+- file_sha256(path): ファイルの SHA-256（HASH_CHUNK ずつ読む）
+- write_atomic(path, data): 一時ファイル + rename で書く（ゲームやほかのツールが書きかけを読まない）。
+  str は UTF-8 で、改行は変換しない
+- write_if_changed(path, data): 今の中身と同じなら書かない（mtime も変えない）。書いたら True
+- atomic_output(path): zip / PNG など自分で書き出すものを一時ファイル経由にする with 文（失敗したら一時ファイルを消す）
+- temp_path(path): path と同じフォルダに一意な名前（<name>.<乱数>.tmp）の空ファイルを作って返す。
+  一時ファイルは全部これで作るので、同じ path に同時に書く別プロセス（--watch と手動実行、サービスと CLI など）が
+  互いの書きかけを rename したり消したりしない
+
+使い方（各ツールの中で）:
+    for res in toolutil.map_jobs(worker, jobs, args.jobs):
+        ...
+    toolutil.write_if_changed(path, json.dumps(obj, ensure_ascii=False, indent=2))
+"""
+
+import os, hashlib, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence, Union
+
+HASH_CHUNK = 1024 * 1024
+# 1 ワーカーあたりのチャンク数の目安（小さいほど偏りに強く、大きいほど往復が減る）
+CHUNKS_PER_WORKER = 4
+# mkstemp は 0600 で作るので、普通に open したときと同じ権限に直す
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def worker_count(jobs: int) -> int:
+    """--jobs の値をプロセス数に（0 以下は CPU 数）。"""
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def map_jobs(fn: Callable, work: Sequence, jobs: int = 0) -> Iterator:
+    """
+    fn(item) for item in work, in order. fn と item はプロセスプールに渡すので pickle できること（トップレベル関数）。
+    結果は 1 件ずつ返すので、呼び出し元は進捗を出しながら受け取れる。途中で抜けたら残りは取り消す。
+    """
+    n = worker_count(jobs)
+    if n <= 1 or len(work) <= 1:
+        for item in work:
+            yield fn(item)
+        return
+    ex = ProcessPoolExecutor(max_workers=n)
+    try:
+        yield from ex.map(fn, work, chunksize=max(1, len(work) // (n * CHUNKS_PER_WORKER)))
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def temp_path(path) -> str:
+    """Create an empty, uniquely named file in path's folder and return its name (caller removes or renames it)."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        os.chmod(tmp, 0o666 & ~_UMASK)
+    except OSError:
+        pass
+    return tmp
+
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temporary path (temp_path) next to path; on success it replaces path, on error it is removed."""
+    tmp = temp_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_atomic(path, data: Union[bytes, str]):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with atomic_output(path) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
+
+
+def write_if_changed(path, data: Union[bytes, str]) -> bool:
+    """Write data unless path already holds the same bytes. Returns True if written."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    write_atomic(path, data)
+    return True
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mmw4cc_to_mygame.py の変換ベンチマーク（合成 USC 譜面 + ステージ別計測 + ベースライン比較）
+
+- シード付きの合成 USC を生成: single（normal/critical/flick）、connections の多い slide、guide（midpoints）、
+  細かい BPM 変化、timeScaleGroup（changes 付き）。オブジェクト数は 1k〜1M まで指定可能
+  生成物は --work のフォルダに usc-<size>-s<seed>.usc として残し、次回以降は再利用する
+- 変換を load / classify / map_lanes / sort / markers / write のステージに分けて計測（--repeat 回の最小値）
+- ピークメモリは tracemalloc を有効にした別の 1 回で計測（計測中は遅くなるので時間には使わない）
+- 結果は JSON で出力し、compare でベースラインと比べて閾値を超えた悪化があれば終了コード 1
+
+使い方:
+    python bench_mmw4cc.py run --out bench.json [--sizes 1k,10k,100k,1m] [--seed 1] [--repeat 3] [--stream]
+    python bench_mmw4cc.py run --out bench.json --baseline base.json [--threshold 0.10]
+    python bench_mmw4cc.py compare base.json bench.json [--threshold 0.10] [--stage-threshold sort=0.25]
+"""
+
+import os, sys, json, time, random, argparse, platform, tempfile, tracemalloc
+from typing import Dict, List
+
+import mmw4cc_to_mygame as conv
+import toolutil  # Assets/scripts は mmw4cc_to_mygame が sys.path に入れている
+
+BENCH_VERSION = 1
+STAGES = ["load", "classify", "map_lanes", "sort", "markers", "write"]
+# 生成するオブジェクトの割合（残りは single）
+SLIDE_RATIO = 0.20
+GUIDE_RATIO = 0.05
+BPM_RATIO = 0.02
+TSG_RATIO = 0.01
+# slide 1 本あたりの connections 数（start/end 込み）
+MAX_CONNECTIONS = 32
+# これより小さい差（秒）はノイズとして悪化扱いしない
+MIN_SECONDS = 0.005
+
+
+def parse_size(text: str) -> int:
+    t = text.strip().lower()
+    mul = 1
+    if t.endswith("k"):
+        t, mul = t[:-1], 1000
+    elif t.endswith("m"):
+        t, mul = t[:-1], 1000000
+    return int(float(t) * mul)
+
+
+def _lane(rng: random.Random):
+    # USC の lane は中心（-6..6）、size は半幅
+    size = rng.choice((0.5, 1.0, 1.5, 2.0, 3.0))
+    return rng.uniform(-6.0 + size, 6.0 - size), size
+
+
+def generate_usc(n_objects: int, seed: int) -> Dict:
+    """Seeded synthetic USC with roughly n_objects top-level objects (same seed -> same chart)."""
+    rng = random.Random(seed)
+    objs = [{"type": "bpm", "beat": 0.0, "bpm": 160.0}]
+    objs.append({"type": "timeScaleGroup", "changes": [{"beat": 0.0, "timeScale": 1.0}]})
+    # 1 拍に 4 個程度の密度になるよう譜面の長さを決める
+    length = max(16.0, n_objects / 4.0)
+    while len(objs) < n_objects:
+        r = rng.random()
+        beat = round(rng.uniform(0.0, length) * 4) / 4  # 16 分にスナップ（同時押しも出る）
+        if r < BPM_RATIO:
+            objs.append({"type": "bpm", "beat": beat, "bpm": round(rng.uniform(60.0, 300.0), 3)})
+        elif r < BPM_RATIO + TSG_RATIO:
+            changes = [{"beat": round(beat + k * rng.uniform(0.25, 2.0), 4), "timeScale": round(rng.uniform(0.25, 4.0), 3)}
+                       for k in range(rng.randint(1, 16))]
+            objs.append({"type": "timeScaleGroup", "changes": changes})
+        elif r < BPM_RATIO + TSG_RATIO + SLIDE_RATIO:
+            n_conn = rng.randint(2, MAX_CONNECTIONS)
+            critical = rng.random() < 0.2
+            conns, b = [], beat
+            for k in range(n_conn):
+                lane, size = _lane(rng)
+                kind = "start" if k == 0 else "end" if k == n_conn - 1 else rng.choice(("tick", "attach"))
+                c = {"type": kind, "beat": b, "lane": lane, "size": size, "critical": critical,
+                     "timeScaleGroup": 0}
+                if kind in ("start", "tick"):
+                    c["ease"] = rng.choice(("linear", "in", "out"))
+                if kind in ("start", "end"):
+                    c["judgeType"] = "normal"
+                conns.append(c)
+                b += rng.choice((0.25, 0.5, 1.0))
+            objs.append({"type": "slide", "critical": critical, "connections": conns})
+        elif r < BPM_RATIO + TSG_RATIO + SLIDE_RATIO + GUIDE_RATIO:
+            pts, b = [], beat
+            for _ in range(rng.randint(2, 8)):
+                lane, size = _lane(rng)
+                pts.append({"beat": b, "lane": lane, "size": size, "ease": "linear", "timeScaleGroup": 0})
+                b += rng.choice((0.5, 1.0, 2.0))
+            objs.append({"type": "guide", "color": "green", "fade": "out", "midpoints": pts})
+        else:
+            lane, size = _lane(rng)
+            o = {"type": "single", "beat": beat, "lane": lane, "size": size,
+                 "critical": rng.random() < 0.15, "trace": False, "timeScaleGroup": 0}
+            if rng.random() < 0.15:
+                o["direction"] = rng.choice(("up", "left", "right"))
+            objs.append(o)
+    return {"usc": {"offset": -0.0, "objects": objs}}
+
+
+def ensure_input(work: str, n_objects: int, seed: int) -> str:
+    path = os.path.join(work, f"usc-{n_objects}-s{seed}.usc")
+    if not os.path.isfile(path):
+        os.makedirs(work, exist_ok=True)
+        with toolutil.atomic_output(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(generate_usc(n_objects, seed), f, separators=(",", ":"))
+    return path
+
+
+def run_once(path: str, out_dir: str, stream: bool, fmt: str) -> Dict:
+    """One conversion split into stages (seconds)."""
+    timings = {}
+    t0 = time.perf_counter()
+    usc = conv.UscStream(path) if stream else conv.load_usc_objects(path)
+    timings["load"] = time.perf_counter() - t0  # stream は読み込みが classify に含まれる
+    chart = conv.convert_usc(usc, timings)
+    t0 = time.perf_counter()
+    conv.write_chart_outputs(chart, os.path.join(out_dir, "master.json"), fmt)
+    with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump({"bpm": chart.bpm, "speedScaleMarkers": chart.markers, "tempoMap": chart.tempo.to_json()},
+                  f, ensure_ascii=False, indent=2)
+    timings["write"] = time.perf_counter() - t0
+    timings["notes"] = len(chart)
+    return timings
+
+
+def bench_size(n_objects: int, args) -> Dict:
+    path = ensure_input(args.work, n_objects, args.seed)
+    best = {s: None for s in STAGES}
+    totals = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for _ in range(max(1, args.repeat)):
+            t = run_once(path, out_dir, args.stream, args.format)
+            for s in STAGES:
+                best[s] = t[s] if best[s] is None else min(best[s], t[s])
+            totals.append(sum(t[s] for s in STAGES))
+            notes = t["notes"]
+        peak = None
+        if not args.no_memory:
+            tracemalloc.start()
+            try:
+                run_once(path, out_dir, args.stream, args.format)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    return {"name": f"usc-{n_objects}", "objects": n_objects, "notes": notes, "bytes": os.path.getsize(path),
+            "stages": {s: round(best[s], 6) for s in STAGES}, "total": round(min(totals), 6),
+            "peakBytes": peak}
+
+
+def compare(base: Dict, cur: Dict, threshold: float, stage_thresholds: Dict[str, float],
+            mem_threshold: float) -> List[str]:
+    """Regressions of cur against base (same case names only). Returns printable lines."""
+    for key in ("seed", "stream", "format", "python", "numpy"):
+        if base.get(key) != cur.get(key):
+            print(f"[WARN] {key} が違います: {base.get(key)!r} -> {cur.get(key)!r}")
+    by_name = {r["name"]: r for r in base.get("results", [])}
+    regressions = []
+    for r in cur.get("results", []):
+        b = by_name.get(r["name"])
+        if b is None:
+            print(f"[SKIP] {r['name']}: ベースラインにありません")
+            continue
+        rows = [(s, b["stages"].get(s), r["stages"].get(s), stage_thresholds.get(s, threshold)) for s in STAGES]
+        rows.append(("total", b.get("total"), r.get("total"), stage_thresholds.get("total", threshold)))
+        for name, old, new, thr in rows:
+            if old is None or new is None:
+                continue
+            ratio = new / old if old > 0 else float("inf") if new > 0 else 1.0
+            bad = new - old > MIN_SECONDS and ratio > 1.0 + thr
+            line = f"{r['name']:>12} {name:<10} {old:10.4f}s -> {new:10.4f}s  {ratio - 1.0:+7.1%}"
+            print(("[NG] " if bad else "     ") + line)
+            if bad:
+                regressions.append(line)
+        old, new = b.get("peakBytes"), r.get("peakBytes")
+        if old and new:
+            bad = new > old * (1.0 + mem_threshold)
+            line = f"{r['name']:>12} {'peak':<10} {old / 2**20:9.1f}MB -> {new / 2**20:9.1f}MB  {new / old - 1.0:+7.1%}"
+            print(("[NG] " if bad else "     ") + line)
+            if bad:
+                regressions.append(line)
+    return regressions
+
+
+def parse_stage_thresholds(items: List[str]) -> Dict[str, float]:
+    out = {}
+    for it in items or []:
+        name, _, val = it.partition("=")
+        if name not in STAGES + ["total"] or not val:
+            raise SystemExit(f"[ERR] --stage-threshold {it!r}: NAME=RATIO（NAME は {', '.join(STAGES)}, total）")
+        out[name] = float(val)
+    return out
+
+
+def load_json(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_threshold_args(p):
+    p.add_argument("--threshold", type=float, default=0.10, help="悪化とみなす時間の増加率（既定 0.10 = +10%%）")
+    p.add_argument("--stage-threshold", action="append", metavar="STAGE=RATIO", help="ステージ別の閾値（複数可）")
+    p.add_argument("--mem-threshold", type=float, default=0.10, help="ピークメモリの増加率の閾値")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="mmw4cc_to_mygame.py の変換ベンチマーク")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sr = sub.add_parser("run", help="合成 USC で計測して JSON に保存")
+    sr.add_argument("--out", required=True, help="結果 JSON の出力先")
+    sr.add_argument("--sizes", default="1k,10k,100k", help="オブジェクト数（カンマ区切り、k/m 可。例 1k,10k,100k,1m）")
+    sr.add_argument("--seed", type=int, default=1)
+    sr.add_argument("--repeat", type=int, default=3, help="各サイズの計測回数（ステージごとに最小値を採用）")
+    sr.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "mmw4cc_bench"),
+                    help="合成 USC の置き場（再利用する）")
+    sr.add_argument("--stream", action="store_true", help="UscStream で読む（load は classify に含まれる）")
+    sr.add_argument("--format", choices=conv.OUTPUT_FORMATS, default="json")
+    sr.add_argument("--no-memory", action="store_true", help="tracemalloc によるピークメモリ計測を省く")
+    sr.add_argument("--baseline", default=None, help="計測後にこのベースラインと比較する")
+    add_threshold_args(sr)
+    sc = sub.add_parser("compare", help="2 つの結果 JSON を比較")
+    sc.add_argument("baseline")
+    sc.add_argument("current")
+    add_threshold_args(sc)
+    args = ap.parse_args()
+    stage_thr = parse_stage_thresholds(args.stage_threshold)
+
+    if args.cmd == "compare":
+        regressions = compare(load_json(args.baseline), load_json(args.current), args.threshold, stage_thr,
+                              args.mem_threshold)
+        print(f"== 完了 regressions={len(regressions)} ==")
+        sys.exit(1 if regressions else 0)
+
+    results = []
+    for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+        r = bench_size(size, args)
+        results.append(r)
+        st = r["stages"]
+        peak = f", peak={r['peakBytes'] / 2**20:.1f}MB" if r["peakBytes"] else ""
+        print(f"[OK] {r['name']}: notes={r['notes']}, total={r['total']:.4f}s ("
+              + ", ".join(f"{s}={st[s]:.4f}" for s in STAGES) + f"){peak}")
+    doc = {"version": BENCH_VERSION, "seed": args.seed, "repeat": args.repeat, "stream": args.stream,
+           "format": args.format, "python": platform.python_version(), "numpy": conv.np is not None,
+           "platform": platform.platform(), "results": results}
+    toolutil.write_atomic(args.out, json.dumps(doc, ensure_ascii=False, indent=2))
+    print(f"== 完了 cases={len(results)} -> {args.out} ==")
+    if args.baseline:
+        regressions = compare(load_json(args.baseline), doc, args.threshold, stage_thr, args.mem_threshold)
+        print(f"== 比較 regressions={len(regressions)} ==")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
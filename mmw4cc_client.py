@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mmw4cc_server.py に変換を頼む薄いクライアント。使い方は mmw4cc_to_mygame.py と同じ。
+
+- 引数はそのままサービスへ送り（カレントディレクトリも送るので相対パスもそのまま使える）、
+  ワーカーの表示内容を出して同じ終了コードで終わる
+- サービスの待ち行列がいっぱい（503）なら Retry-After だけ待って送り直す（--retry-for 秒まで）
+- サービスが動いていないとき / --watch のときは、このプロセスで mmw4cc_to_mygame.py をそのまま実行する
+  （--no-fallback ならエラーで終わる）
+- 接続先は --server URL か環境変数 MMW4CC_SERVER（既定 http://127.0.0.1:8765）。プロキシの環境変数は使わない
+- サービスが起動時に書くトークン（~/.mmw4cc/server_<port>.token）を読んで X-MMW4CC-Token で送る
+  （同じユーザーでないと読めないので、ほかのユーザーやブラウザからは変換を頼めない）
+- 読み込むのは標準ライブラリだけ（変換モジュールを import するのは手元で実行するときだけ）
+
+使い方:
+    python mmw4cc_client.py <input> <outroot> [--format both] [--stages normalize_lanes] ...
+    python mmw4cc_client.py --server http://127.0.0.1:9000 --no-fallback song.usc out
+"""
+
+import os, sys, json, time
+import urllib.error, urllib.parse, urllib.request
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SERVER = "http://127.0.0.1:8765"
+SERVER_ENV = "MMW4CC_SERVER"
+# 503 が続いたときに送り直し続ける秒数
+RETRY_FOR = 60.0
+# サービスのトークン（mmw4cc_server.py が起動時に書き、終了時に消す）
+TOKEN_DIR = os.path.join(os.path.expanduser("~"), ".mmw4cc")
+TOKEN_HEADER = "X-MMW4CC-Token"
+
+# localhost への要求がプロキシに流れないように
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+class Unavailable(Exception):
+    """The service could not be reached (or kept answering 503 for RETRY_FOR seconds)."""
+
+
+def token_path(port: int) -> str:
+    return os.path.join(TOKEN_DIR, f"server_{port}.token")
+
+
+def read_token(server: str) -> Optional[str]:
+    """Token of the service listening on server's port (None if it has not written one)."""
+    try:
+        with open(token_path(urllib.parse.urlsplit(server).port or 80), "r", encoding="ascii") as f:
+            return f.read().strip() or None
+    except (OSError, ValueError):
+        return None
+
+
+def split_args(argv: List[str]) -> Tuple[Dict, List[str]]:
+    """クライアント自身のオプション（--server / --no-fallback / --retry-for）と変換の引数に分ける。"""
+    opts = {"server": os.environ.get(SERVER_ENV) or DEFAULT_SERVER, "fallback": True, "retry_for": RETRY_FOR}
+    rest = []
+    it = iter(argv)
+    for a in it:
+        name, eq, val = a.partition("=")
+        if name in ("--server", "--retry-for"):
+            if not eq:
+                val = next(it, None)
+                if val is None:
+                    sys.exit(f"[ERR] {name} に値が要る")
+            if name == "--server":
+                opts["server"] = val
+            else:
+                try:
+                    opts["retry_for"] = float(val)
+                except ValueError:
+                    sys.exit(f"[ERR] --retry-for は秒数: {val}")
+        elif a == "--no-fallback":
+            opts["fallback"] = False
+        else:
+            rest.append(a)
+    return opts, rest
+
+
+def post(server: str, body: Dict, retry_for: float) -> Dict:
+    """POST /convert. 503 は Retry-After を待って送り直す。つながらなければ Unavailable。"""
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    deadline = time.monotonic() + retry_for
+    while True:
+        headers = {"Content-Type": "application/json"}
+        token = read_token(server)  # サービスが再起動していればトークンも変わっているので毎回読む
+        if token:
+            headers[TOKEN_HEADER] = token
+        req = urllib.request.Request(server.rstrip("/") + "/convert", data=data, headers=headers)
+        try:
+            with _opener.open(req) as r:  # 変換が終わるまで待つ（時間の上限は付けない）
+                return json.loads(r.read())
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                try:
+                    msg = json.loads(e.read()).get("error", "")
+                except ValueError:
+                    msg = ""
+                raise RuntimeError(f"HTTP {e.code} {msg}".strip())
+            try:
+                wait = float(e.headers.get("Retry-After") or 1)
+            except ValueError:
+                wait = 1.0
+            if time.monotonic() + wait > deadline:
+                raise Unavailable(f"待ち行列がいっぱいのまま {retry_for:.0f} 秒たちました")
+            time.sleep(wait)
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            raise Unavailable(str(getattr(e, "reason", e)))
+
+
+def run_local(argv: List[str]):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import mmw4cc_to_mygame
+    mmw4cc_to_mygame.main(argv)
+
+
+def main():
+    opts, argv = split_args(sys.argv[1:])
+    if "--watch" not in argv:
+        try:
+            res = post(opts["server"], {"items": [{"argv": argv, "cwd": os.getcwd()}]}, opts["retry_for"])
+        except Unavailable as e:
+            if not opts["fallback"]:
+                sys.exit(f"[ERR] {opts['server']} に接続できません: {e}")
+            print(f"[WARN] {opts['server']} に接続できないので手元で変換します（{e}）", file=sys.stderr)
+        except RuntimeError as e:
+            sys.exit(f"[ERR] {opts['server']}: {e}")
+        else:
+            r = res["results"][0]
+            sys.stdout.write(r.get("log", ""))
+            if r.get("error"):
+                print(f"[ERR] 変換失敗: {r['error']}")
+            sys.exit(r.get("exitCode", 0 if r.get("ok") else 1))
+    run_local(argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mmw4cc_to_mygame.py の常駐変換サービス（127.0.0.1 の HTTP）。変換モジュールを読み込み済みのワーカープロセスで
+変換するので、譜面 1 つごとに python を起動して import する時間がかからない。
+
+- ワーカーは ProcessPoolExecutor（--workers、0 で CPU 数）。起動時に全ワーカーを立ち上げておく
+- POST /convert {"items": [...]} で 1 件以上をまとめて受け付け、全件終わったら {"results": [...]} を返す。item は
+    {"argv": [...], "cwd": "..."}  mmw4cc_to_mygame.py と同じ引数（相対パスは cwd 基準）。出力を書き、表示内容を log で返す
+    {"usc": {...}, "name": "master.usc", "format": "json", "slidePaths": 0.25, "stages": [...], "outroot": "..."}
+        USC（ファイルの中身そのまま、または "usc" の中身）をメモリ上で変換する。outroot があれば曲フォルダに書き、
+        無ければ chartJson（<difficulty>.json と同じ中身）/ chartBin（.bin の base64）/ metadata を返す
+- 待ち行列は --queue 件まで。入りきらない要求は丸ごと 503 + Retry-After で断る（mmw4cc_client.py は待って送り直す）
+- 空いたワーカーの数に合わせて待ち行列の item をまとめて 1 タスクで渡す（最大 BATCH_MAX 件。待ちが無ければ 1 件ずつで、
+  まとめるためにわざと待たせはしない）
+- 同じ出力ルートに書く item は同時に走らせない（.mmw4cc_manifest.json / metadata.json の書き込みがぶつかるため）
+- GET /health: 待ち行列の長さ / 実行中の件数 / ワーカー数。GET /metrics: 件数と、種類（argv / usc）ごとの
+  受付から完了までと待ち行列での待ち時間の p50 / p90 / p99 / max（直近 LATENCY_WINDOW 件）
+- 127.0.0.1 でだけ待ち受ける。argv はどこにでも書けるので、ほかのユーザーやブラウザ（CSRF / DNS リバインディング）
+  から頼まれないように:
+    起動時に乱数のトークンを ~/.mmw4cc/server_<port>.token（0600）に書き、POST /convert は X-MMW4CC-Token が一致するときだけ
+    受け付ける（mmw4cc_client.py が読んで送る）。終了時にファイルは消す
+    Host は 127.0.0.1:<port> / localhost:<port> だけ、Origin 付き（ブラウザから）の要求は断る、
+    POST の Content-Type は application/json だけ
+- --watch はサービスでは受け付けない（クライアントが手元で実行する）
+
+使い方:
+    python mmw4cc_server.py [--port 8765] [--workers 0] [--queue 256]
+    python mmw4cc_client.py <input> <outroot> [mmw4cc_to_mygame.py と同じオプション]
+    curl http://127.0.0.1:8765/metrics
+    curl -H "X-MMW4CC-Token: $(cat ~/.mmw4cc/server_8765.token)" -H "Content-Type: application/json" \
+         -d '{"items": [{"argv": ["song.usc", "out"], "cwd": "'$PWD'"}]}' http://127.0.0.1:8765/convert
+"""
+
+import os, sys, io, hmac, json, time, base64, signal, secrets, argparse, threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout, redirect_stderr
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import mmw4cc_to_mygame as conv
+import chart_pipeline  # Assets/scripts は mmw4cc_to_mygame が sys.path に入れている
+from mmw4cc_client import TOKEN_DIR, TOKEN_HEADER, token_path
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE = 256
+# ワーカーへ 1 タスクで渡す item の上限
+BATCH_MAX = 16
+# レイテンシの分位点を出す直近の件数
+LATENCY_WINDOW = 2048
+PERCENTILES = (50, 90, 99)
+# 受け付ける要求ボディの上限（バイト）
+MAX_BODY = 256 * 1024 * 1024
+# 503 で返す再送までの秒数
+RETRY_AFTER = 1
+KINDS = ("argv", "usc")
+
+
+# ---- ワーカー側（ProcessPoolExecutor で動く） ----
+def _warm(_=None) -> int:
+    # 起動時に全ワーカーを立ち上げるための空タスク（変換モジュールは import 済み）
+    time.sleep(0.05)
+    return os.getpid()
+
+def run_argv(item: Dict) -> Dict:
+    """mmw4cc_to_mygame.main(argv) を cwd で実行し、表示内容と終了コードを返す。"""
+    out = io.StringIO()
+    code = 0
+    prev = os.getcwd()
+    try:
+        os.chdir(item.get("cwd") or prev)
+        with redirect_stdout(out), redirect_stderr(out):
+            try:
+                conv.main([str(a) for a in item["argv"]])
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception as e:
+                print(f"[ERR] {type(e).__name__}: {e}")
+                code = 1
+    finally:
+        os.chdir(prev)
+    return {"ok": code == 0, "exitCode": code, "log": out.getvalue()}
+
+def convert_payload(item: Dict) -> Dict:
+    """USC の中身をメモリ上で変換する。outroot があれば write_song で書き、無ければ変換結果を返す。"""
+    data = item["usc"]
+    usc = data.get("usc", data) if isinstance(data, dict) else None
+    if not isinstance(usc, dict):
+        raise ValueError("usc は JSON オブジェクトで渡す")
+    name = item.get("name") or "chart.usc"
+    fmt = item.get("format") or "json"
+    if fmt not in conv.OUTPUT_FORMATS:
+        raise ValueError(f"format は {', '.join(conv.OUTPUT_FORMATS)} のどれか: {fmt}")
+    stages = list(item.get("stages") or [])
+    chart = conv.convert_usc(usc, None, item.get("slidePaths"))
+    if item.get("outroot"):
+        _, outs = conv.write_song(chart, name, item["outroot"], fmt, stages)
+        return {"ok": True, "outputs": outs, "notes": len(chart), "log": f"[OK] {name} -> {', '.join(outs)}\n"}
+
+    # 書き出さない: write_song と同じ手順で譜面と metadata を作って返す（既存の metadata.json とのマージは無し）
+    folder, chart_name = conv.song_names(chart, name)
+    chart = conv.apply_stages(chart, stages, os.path.splitext(chart_name)[0])
+    meta = conv.song_metadata(chart, chart.title or folder)
+    if stages:
+        meta = chart_pipeline.named_stages(stages)(chart_pipeline.Song(meta=meta, charts={})).meta
+    res = {"ok": True, "folder": folder, "chartName": chart_name, "notes": len(chart), "metadata": meta}
+    if fmt in ("json", "both"):
+        res["chartJson"] = chart_pipeline.chart_json_text(chart)
+    if fmt in ("bin", "both"):
+        data = chart_pipeline.chart_bin_bytes(chart, chart.bpm, chart.markers)
+        res["chartBin"] = base64.b64encode(data).decode("ascii")
+    return res
+
+def run_batch(items: List[Dict]) -> List[Dict]:
+    """Worker: まとめて渡された item を順に実行する（同じ出力ルートの item も順番どおり）。"""
+    results = []
+    for item in items:
+        t0 = time.perf_counter()
+        try:
+            res = run_argv(item) if "argv" in item else convert_payload(item)
+        except Exception as e:
+            res = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        res["seconds"] = round(time.perf_counter() - t0, 6)
+        results.append(res)
+    return results
+
+
+# ---- サービス側 ----
+def percentiles(values) -> Dict[str, float]:
+    """p50 / p90 / p99 / max (ms, nearest-rank) of a window of seconds."""
+    v = sorted(values)
+    if not v:
+        return {"count": 0}
+    out = {"count": len(v)}
+    for p in PERCENTILES:
+        out[f"p{p}"] = round(v[max(0, -(-p * len(v) // 100) - 1)] * 1000.0, 3)
+    out["max"] = round(v[-1] * 1000.0, 3)
+    return out
+
+
+class Metrics:
+    """Counters plus rolling latency windows per item kind (thread safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t0 = time.time()
+        self.counts = {"requests": 0, "items": 0, "ok": 0, "errors": 0, "rejected": 0, "batches": 0,
+                       "batchedItems": 0, "workerRestarts": 0}
+        self.latency = {k: deque(maxlen=LATENCY_WINDOW) for k in KINDS}
+        self.queue_wait = {k: deque(maxlen=LATENCY_WINDOW) for k in KINDS}
+
+    def add(self, **counts):
+        with self.lock:
+            for k, v in counts.items():
+                self.counts[k] += v
+
+    def item_done(self, kind: str, ok: bool, latency: float, wait: float):
+        with self.lock:
+            self.counts["ok" if ok else "errors"] += 1
+            self.latency[kind].append(latency)
+            self.queue_wait[kind].append(wait)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts = dict(self.counts)
+            lat = {k: percentiles(v) for k, v in self.latency.items()}
+            wait = {k: percentiles(v) for k, v in self.queue_wait.items()}
+        counts["avgBatch"] = round(counts["batchedItems"] / counts["batches"], 3) if counts["batches"] else 0.0
+        return {"uptime": round(time.time() - self.t0, 3), "counts": counts, "latencyMs": lat, "queueWaitMs": wait}
+
+
+class Job:
+    """One queued item: the payload sent to the worker, its output-root key and the caller's Future."""
+    __slots__ = ("kind", "item", "key", "future", "t_in", "t_start")
+
+    def __init__(self, item: Dict, key: Optional[str]):
+        self.kind = "argv" if "argv" in item else "usc"
+        self.item = item
+        self.key = key
+        self.future = Future()
+        self.t_in = time.perf_counter()
+        self.t_start = None
+
+
+class Service:
+    """
+    Bounded queue + dispatcher thread in front of a warm ProcessPoolExecutor.
+    ワーカー 1 つにつき 1 タスク（= 1 バッチ）だけ渡し、残りは待ち行列に置く（待ち行列の長さ = 本当の待ち）。
+    """
+
+    def __init__(self, workers: int, max_queue: int = DEFAULT_QUEUE, batch_max: int = BATCH_MAX):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.batch_max = batch_max
+        self.metrics = Metrics()
+        self.cond = threading.Condition()
+        self.pending = deque()
+        self.busy = set()  # 実行中のバッチが書いている出力ルート
+        self.free = workers
+        self.in_flight = 0
+        self.closed = False
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.pids = sorted(set(self.pool.map(_warm, range(workers))))
+        self.thread = threading.Thread(target=self._dispatch, name="dispatch", daemon=True)
+        self.thread.start()
+
+    def submit(self, jobs: List[Job]) -> bool:
+        """Queue all jobs, or none of them if the queue would overflow (returns False)."""
+        with self.cond:
+            if self.closed or len(self.pending) + len(jobs) > self.max_queue:
+                self.metrics.add(rejected=1)
+                return False
+            self.pending.extend(jobs)
+            self.cond.notify()
+        self.metrics.add(requests=1, items=len(jobs))
+        return True
+
+    def health(self) -> Dict:
+        with self.cond:
+            return {"status": "closing" if self.closed else "ok", "pid": os.getpid(), "workers": self.workers,
+                    "workerPids": self.pids, "queueDepth": len(self.pending), "maxQueue": self.max_queue,
+                    "inFlight": self.in_flight, "busyOutroots": len(self.busy)}
+
+    def _take(self) -> List[Job]:
+        # 呼び出し元が cond を持っている。空きワーカーで待ちを割った件数（1..batch_max）を先頭から取る。
+        # 出力ルートが実行中の item は飛ばして順番を保ったまま残す
+        if self.free <= 0 or not self.pending:
+            return []
+        size = max(1, min(self.batch_max, -(-len(self.pending) // self.free)))
+        batch, skipped = [], []
+        while self.pending and len(batch) < size:
+            job = self.pending.popleft()
+            if job.key is not None and job.key in self.busy:
+                skipped.append(job)
+            else:
+                batch.append(job)
+        self.pending.extendleft(reversed(skipped))
+        return batch
+
+    def _dispatch(self):
+        while True:
+            with self.cond:
+                batch = self._take()
+                while not batch and not self.closed:
+                    self.cond.wait()
+                    batch = self._take()
+                if self.closed:
+                    return
+                keys = {j.key for j in batch if j.key is not None}
+                self.busy |= keys
+                self.free -= 1
+                self.in_flight += len(batch)
+                pool = self.pool
+            now = time.perf_counter()
+            for j in batch:
+                j.t_start = now
+            self.metrics.add(batches=1, batchedItems=len(batch))
+            try:
+                fut = pool.submit(run_batch, [j.item for j in batch])
+            except (BrokenProcessPool, RuntimeError) as e:
+                fut = Future()
+                fut.set_exception(e)
+            fut.add_done_callback(lambda f, b=batch, k=keys, p=pool: self._done(f, b, k, p))
+
+    def _done(self, fut: Future, batch: List[Job], keys, pool):
+        try:
+            results = fut.result()
+        except Exception as e:
+            results = [{"ok": False, "error": f"{type(e).__name__}: {e}"}] * len(batch)
+            if isinstance(e, BrokenProcessPool):
+                self._restart(pool)
+        now = time.perf_counter()
+        for j, res in zip(batch, results):
+            self.metrics.item_done(j.kind, bool(res.get("ok")), now - j.t_in, j.t_start - j.t_in)
+            j.future.set_result(res)
+        with self.cond:
+            self.busy -= keys
+            self.free += 1
+            self.in_flight -= len(batch)
+            self.cond.notify()
+
+    def _restart(self, broken):
+        # ワーカーが落ちた（メモリ不足など）: プールを作り直す。同じプールの失敗が続いても 1 回だけ
+        with self.cond:
+            if self.pool is not broken or self.closed:
+                return
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.metrics.add(workerRestarts=1)
+        print("[WARN] ワーカーが異常終了したためプールを作り直しました", flush=True)
+        broken.shutdown(wait=False)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            dropped = list(self.pending)
+            self.pending.clear()
+        for j in dropped:
+            j.future.set_result({"ok": False, "error": "サービスを停止しました"})
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def outroot_key(argv: List[str], cwd: str) -> Optional[str]:
+    """
+    The output root an argv item writes to (同じ出力ルートの item を同時に走らせないためのキー).
+    引数が解釈できないときは None（ワーカーがそのまま実行してエラーを返す）。--watch は ValueError。
+    """
+    if any(a in ("-h", "--help") for a in argv):
+        return None
+    ap = conv.build_parser()
+
+    def fail(*_args, **_kw):
+        raise LookupError
+    ap.error = ap.exit = fail  # 解釈できなくてもサービスのプロセスを終わらせない
+    try:
+        args = ap.parse_args(argv)
+    except LookupError:
+        return None
+    if args.watch:
+        raise ValueError("--watch はサービスでは使えない（mmw4cc_client.py は手元で実行する）")
+    return os.path.normcase(os.path.abspath(os.path.join(cwd, args.outroot)))
+
+def parse_items(body: Dict) -> List[Job]:
+    """Validate a /convert body and build its jobs. Raises ValueError with a message for the client."""
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('{"items": [...]} で 1 件以上を渡す')
+    jobs = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"items[{i}] がオブジェクトではない")
+        if "argv" in item:
+            argv, cwd = item["argv"], item.get("cwd") or os.getcwd()
+            if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+                raise ValueError(f"items[{i}].argv は文字列のリスト")
+            if not os.path.isabs(cwd):
+                raise ValueError(f"items[{i}].cwd は絶対パス")
+            key = outroot_key(argv, cwd)
+        elif "usc" in item:
+            out = item.get("outroot")
+            if out is not None and not os.path.isabs(out):
+                raise ValueError(f"items[{i}].outroot は絶対パス")
+            key = os.path.normcase(os.path.abspath(out)) if out else None
+        else:
+            raise ValueError(f"items[{i}] には argv か usc が要る")
+        jobs.append(Job(item, key))
+    return jobs
+
+
+def write_token(port: int) -> str:
+    """Write a new random token for port (owner-only file) and return it."""
+    token = secrets.token_urlsafe(32)
+    os.makedirs(TOKEN_DIR, mode=0o700, exist_ok=True)
+    path = token_path(port)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "mmw4cc_server"
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, obj: Dict, headers: Dict = None):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _refuse(self, status: int, error: str) -> bool:
+        self.close_connection = True  # POST のボディは読まずに断るので、この接続は使い回さない
+        self._send(status, {"error": error})
+        return False
+
+    def _allowed(self) -> bool:
+        """Host / Origin の確認。ブラウザ経由（CSRF / DNS リバインディング）の要求を断る。"""
+        host = (self.headers.get("Host") or "").lower()
+        if host not in self.server.allowed_hosts:
+            return self._refuse(403, f"Host が不正: {host!r}")
+        if self.headers.get("Origin") is not None:
+            return self._refuse(403, "Origin 付き（ブラウザから）の要求は受け付けない")
+        return True
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        svc = self.server.service
+        if self.path == "/health":
+            self._send(200, svc.health())
+        elif self.path == "/metrics":
+            self._send(200, dict(svc.metrics.snapshot(), **svc.health()))
+        else:
+            self._send(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self._refuse(404, f"not found: {self.path}")
+            return
+        if not self._allowed():
+            return
+        ctype = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+        if ctype != "application/json":
+            self._refuse(415, f"Content-Type は application/json だけ: {ctype!r}")
+            return
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER) or "", self.server.token):
+            self._refuse(403, f"{TOKEN_HEADER} が無いか一致しない（{token_path(self.server.server_address[1])} の値）")
+            return
+        t0 = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY:
+            self.close_connection = True
+            self._send(413, {"error": f"Content-Length が不正か MAX_BODY ({MAX_BODY}) を超えている"})
+            return
+        try:
+            jobs = parse_items(json.loads(self.rfile.read(length) or b"null"))
+        except ValueError as e:  # json.JSONDecodeError も ValueError
+            self._send(400, {"error": str(e)})
+            return
+        svc = self.server.service
+        if not svc.submit(jobs):
+            h = svc.health()
+            self._send(503, {"error": "queue full", "queueDepth": h["queueDepth"], "maxQueue": h["maxQueue"]},
+                       {"Retry-After": RETRY_AFTER})
+            return
+        results = [j.future.result() for j in jobs]
+        self._send(200, {"results": results, "seconds": round(time.perf_counter() - t0, 6)})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"[HTTP] {self.address_string()} {fmt % args}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="mmw4cc_to_mygame.py の常駐変換サービス（127.0.0.1 の HTTP）")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"待ち受けるポート（既定 {DEFAULT_PORT}）")
+    ap.add_argument("--workers", "-j", type=int, default=0, help="ワーカープロセス数（0 で CPU 数, 既定 0）")
+    ap.add_argument("--queue", type=int, default=DEFAULT_QUEUE,
+                    help=f"待ち行列に置ける item 数。超える要求は 503 で断る（既定 {DEFAULT_QUEUE}）")
+    ap.add_argument("--batch", type=int, default=BATCH_MAX,
+                    help=f"ワーカーへ 1 タスクでまとめて渡す item の上限（既定 {BATCH_MAX}）")
+    ap.add_argument("--verbose", "-v", action="store_true", help="HTTP の要求ごとにログを出す")
+    args = ap.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if args.queue < 1 or args.batch < 1:
+        print("[ERR] --queue / --batch は 1 以上")
+        sys.exit(1)
+
+    try:
+        httpd = ThreadingHTTPServer((HOST, args.port), Handler)
+    except OSError as e:
+        print(f"[ERR] {HOST}:{args.port} で待ち受けられません: {e}")
+        sys.exit(1)
+    httpd.daemon_threads = True
+    httpd.verbose = args.verbose
+    port = httpd.server_address[1]
+    httpd.allowed_hosts = {f"127.0.0.1:{port}", f"localhost:{port}"}
+    try:
+        httpd.token = write_token(port)
+    except OSError as e:
+        print(f"[ERR] トークンを書けません: {e}")
+        httpd.server_close()
+        sys.exit(1)
+    t0 = time.perf_counter()
+    httpd.service = Service(workers, args.queue, args.batch)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)  # kill / サービス管理からの停止も Ctrl+C と同じ後片付けをする
+    print(f"[OK] http://{HOST}:{port} で待ち受け中（workers={workers}, queue={args.queue}, "
+          f"起動 {(time.perf_counter() - t0) * 1000:.0f}ms）。Ctrl+C で終了", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[OK] 終了します")
+    finally:
+        httpd.server_close()
+        httpd.service.close()
+        try:
+            os.remove(token_path(port))
+        except OSError:
+            pass
+        c = httpd.service.metrics.snapshot()["counts"]
+        print(f"== 完了: 要求 {c['requests']} / item {c['items']} / ok {c['ok']} / エラー {c['errors']} / "
+              f"断った要求 {c['rejected']} ==")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,68 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-MMW4CC (USC or JSON) -> MyGame converter (START-based long mapping)
-- 入力: .usc も .json もOK（どちらも JSON）
-- ディレクトリ指定時は再帰で .usc/.json を一括変換
-- slide/guide は START の lane/size を採用、END の lane/size は無視
+MMW4CC (USC or JSON) / SUS -> MyGame converter (START-based long mapping)
+- 入力: .usc も .json もOK（どちらも JSON）。.sus は Assets/scripts/sus_chart.py で 1 行ずつ読んで同じ出力にする
+  （既定は ObjClone.LoadSusChart と同じ規則、--sus-lane-map で SusLoader の laneMap JSON を使う規則）
+- ディレクトリ指定時は再帰で .usc/.json/.sus を一括変換
+- slide/guide は START の lane/size を採用、END の lane/size は無視（guide は midpoints の最初/最後）
+- --slide-paths TOL で long/guide に途中の形を "path": [{beat, lane, width, ease}, ...] として残す
+  （lane/width は連続値のレーン単位。RDP 風の間引きで TOL レーン以内の点は落とし、USC の ease はそのまま）
 - hold = endBeat - startBeat (beats)
 - 12レーン: center±size をレーン境界にスナップして lane(1..12)/width を算出
 - 難易度名はファイル名に含まれるキーワードから推定（easy/normal/hard/expert/master）
 - metadata.title があれば出力フォルダ名を title にリネーム（安全な文字に整形）
+- --jobs N でディレクトリ一括変換をプロセスプールで並列実行（結果は入力のソート順で集計）
+- 変換は convert_usc() の 1 パスで行い、ノーツは array の列（time/lane/width/type/hold）に保持して最後に直列化
+- lane/width の写像と (time, lane) ソートは列単位でまとめて実行（NumPy があれば使用、無ければ純 Python）
+- 大きな入力（STREAM_MIN_BYTES 以上、または --stream 指定時）は UscStream で objects を 1 件ずつ読みながら変換
+- --format json|bin|both で <difficulty>.json の隣にバイナリ譜面 <difficulty>.bin も出力（形式は Assets/scripts/chartbin.py）
+- metadata.json に tempoMap（拍→秒/見た目位置の累積テーブル, Assets/scripts/tempo_map.py）を書き出す
+- 出力ルートの .mmw4cc_manifest.json に入力のハッシュを記録し、未変更の入力は再変換しない（--force で無視）
+- --watch で変換後も入力を監視し、変更されたファイルだけを変換し直す（Assets/scripts/fswatch.py: inotify、
+  無ければ scandir ポーリング。--debounce ms で連続保存をまとめる）。出力は一時ファイル + rename で書き、
+  metadata.json は title / テンポ関連が変わったときだけ更新する（他のキーは残す）
+- --stages normalize_lanes,fix_metadata などで Assets/scripts/chart_pipeline.py のステージを書き出す前にメモリ上で当てる
+  （譜面も metadata.json も読み 1 回・書き 1 回。中間ファイルは作らない）
+- ディレクトリ変換のファイルごとの [OK] 行は --verbose のときだけ（既定は進捗 1 行）。
+  --stats FILE / --profile で計測を残す（Assets/scripts/toolstats.py）
+- 常駐サービス mmw4cc_server.py（ワーカーは import 済み）経由でも同じ引数で実行できる: mmw4cc_client.py <input> <outroot> ...
 """
 
-import json, math, sys, os, re
-from typing import Tuple, List, Dict
+import json, math, sys, os, re, argparse, time
+from array import array
+from typing import Tuple, List, Dict, Set
 from pathlib import Path
 
+try:
+    import numpy as np
+except ImportError:  # NumPy は任意（無ければ純 Python の同等処理を使う）
+    np = None
+
+# 共有モジュール（chartbin など）は Assets/scripts に置いている
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Assets", "scripts"))
+import chartbin
+import chart_pipeline
+from chart_pipeline import Chart, write_chart_json
+from tempo_map import TempoMap
+import sus_chart
+import toolstats
+import toolutil
+from toolutil import file_sha256
+import fswatch
+
 DEFAULT_REVERSE = 1.0/6.0
-ALLOWED_EXTS = {".usc", ".json"}
+ALLOWED_EXTS = {".usc", ".json", ".sus"}
+
+OUTPUT_FORMATS = ("json", "bin", "both")
+
+# これ以上のサイズの入力は json.load せずにストリーミングで読む
+STREAM_MIN_BYTES = 64 * 1024 * 1024
+
+# 出力内容に影響する変更を入れたら上げる（マニフェストのキャッシュが無効になる）
+# 4: guide の開始/終了を midpoints から取る
+CONVERTER_VERSION = "4"
+MANIFEST_NAME = ".mmw4cc_manifest.json"
 
 DIFF_KEYS = [
     ("master",  "master"),
@@ -54,6 +100,26 @@ def map_lane_width_from_center_size(center: float, size: float) -> Tuple[int,int
     lane  = left_idx
     return lane, width
 
+def map_lane_width_batch(centers, sizes) -> Tuple[array, array]:
+    """
+    Column version of map_lane_width_from_center_size(): int8 lane/width arrays, identical
+    element by element to the scalar function (including the width>=1 and 1..13 clamps).
+    """
+    if np is not None and len(centers):
+        c = np.asarray(centers, dtype=np.float64)
+        s = np.asarray(sizes, dtype=np.float64)
+        # 非有限値は scalar 版と同じ例外にするためフォールバックへ回す
+        if np.isfinite(c).all() and np.isfinite(s).all():
+            left_idx  = np.clip(np.floor((c - s) + 7.0), 1, 12)
+            right_idx = np.clip(np.ceil((c + s) + 7.0), left_idx + 1, 13)  # 最低幅1
+            width = np.clip(right_idx - left_idx, 1, 12)
+            return array("b", left_idx.astype(np.int8).tobytes()), array("b", width.astype(np.int8).tobytes())
+    lanes, widths = array("b"), array("b")
+    for center, size in zip(centers, sizes):
+        lane, width = map_lane_width_from_center_size(center, size)
+        lanes.append(lane); widths.append(width)
+    return lanes, widths
+
 def load_usc_objects(path: str) -> Dict:
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -61,6 +127,153 @@ def load_usc_objects(path: str) -> Dict:
     usc = data.get("usc", {})
     return usc
 
+class UscStream:
+    """
+    Incremental reader for {"usc": {..., "objects": [...]}} files.
+    get("objects") yields the entries one at a time straight from the file; the other usc
+    fields (offset, title, ...) are collected as the parser passes them, wherever they appear.
+    Reading a field finishes the parse first, so use fields after consuming the objects.
+    """
+    CHUNK = 1 << 20
+
+    def __init__(self, path: str, chunk: int = CHUNK):
+        self.path = path
+        self.chunk = chunk
+        self.fields: Dict = {}
+        self._started = False
+        self._done = False
+
+    def get(self, key, default=None):
+        if key == "objects":
+            return self._objects()
+        self._finish()
+        return self.fields.get(key, default)
+
+    def __contains__(self, key):
+        self._finish()
+        return key in self.fields
+
+    def __getitem__(self, key):
+        self._finish()
+        return self.fields[key]
+
+    def _finish(self):
+        if not self._done:
+            for _ in self._objects():
+                pass
+
+    def _objects(self):
+        if self._started:
+            if not self._done:
+                raise RuntimeError("UscStream objects can only be iterated once")
+            return
+        self._started = True
+        with open(self.path, "r", encoding="utf-8") as f:
+            r = _JsonChunkReader(f, self.chunk)
+            r.expect("{")
+            if r.peek() == "}":
+                r.take()
+            else:
+                while True:
+                    key = r.value()
+                    r.expect(":")
+                    if key == "usc" and r.peek() == "{":
+                        yield from self._usc_members(r)
+                    else:
+                        r.value()  # usc 以外のトップレベルは読み捨て
+                    if r.expect(",}") == "}":
+                        break
+        self._done = True
+
+    def _usc_members(self, r: "_JsonChunkReader"):
+        self.fields.clear()  # usc が重複した場合は json.load と同じく後勝ち
+        r.expect("{")
+        if r.peek() == "}":
+            r.take()
+            return
+        while True:
+            key = r.value()
+            r.expect(":")
+            if key == "objects" and r.peek() == "[":
+                self.fields.pop("objects", None)
+                r.take()
+                if r.peek() == "]":
+                    r.take()
+                else:
+                    while True:
+                        yield r.value()
+                        if r.expect(",]") == "]":
+                            break
+            else:
+                self.fields[key] = r.value()
+            if r.expect(",}") == "}":
+                return
+
+class _JsonChunkReader:
+    # ファイルを chunk 単位で読みつつ、値は json の raw_decode（C 実装）でまとめてデコードする
+    _decoder = json.JSONDecoder()
+    _ws = re.compile(r"[ \t\n\r]*")
+    _num_tail = re.compile(r"[0-9.eE+\-]*")
+
+    def __init__(self, f, chunk: int):
+        self.f = f
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = self._ws.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError(f"unexpected end of JSON: {self.f.name}")
+
+    def take(self) -> str:
+        ch = self.peek()
+        self.pos += 1
+        return ch
+
+    def expect(self, chars: str) -> str:
+        ch = self.take()
+        if ch not in chars:
+            raise ValueError(f"expected one of {chars!r} but got {ch!r} in {self.f.name}")
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                val, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # 数値やリテラルがバッファ末尾で切れている可能性があるので、続きを読んでから確定する
+            # （"-0.1" が "-0." で切れると raw_decode は -0 を返すため、数値の続きになり得る文字も見る）
+            if self._num_tail.match(self.buf, end).end() == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return val
+
+def load_usc(path: str, stream: bool = False):
+    """usc dict (json.load) or, for big files / stream=True, a UscStream over the same data."""
+    if stream or os.path.getsize(path) >= STREAM_MIN_BYTES:
+        return UscStream(path)
+    return load_usc_objects(path)
+
 def first_bpm(objs) -> float:
     for obj in objs:
         if obj.get("type") == "bpm":
@@ -73,26 +286,26 @@ def first_bpm(objs) -> float:
     return 180.0
 
 def build_speed_markers(objs, base_bpm: float):
+    bpm_events = [(float(o.get("beat", 0)), float(o.get("bpm", 0))) for o in objs if o.get("type") == "bpm"]
+    ts_changes = [(float(ch.get("beat", 0)), float(ch.get("timeScale", 1.0)))
+                  for o in objs if o.get("type") == "timeScaleGroup" for ch in o.get("changes", [])]
+    return speed_markers_from_events(bpm_events, ts_changes, base_bpm)
+
+def speed_markers_from_events(bpm_events, ts_changes, base_bpm: float):
+    # bpm_events: [(beat, bpm)], ts_changes: [(beat, timeScale)]（いずれも objects の出現順）
     marks = {}
     # BPM 変化を timeScale に寄与させる（基準 BPM 比）
-    for obj in objs:
-        if obj.get("type") == "bpm":
-            b  = float(obj.get("beat", 0))
-            bv = float(obj.get("bpm", 0))
-            if bv > 0 and base_bpm > 0:
-                sc = base_bpm / bv
-                m = marks.setdefault(b, {})
-                m["forward"] = m.get("forward", 1.0) * sc
-                m["reverse"] = m.get("reverse", DEFAULT_REVERSE) * sc
+    for b, bv in bpm_events:
+        if bv > 0 and base_bpm > 0:
+            sc = base_bpm / bv
+            m = marks.setdefault(b, {})
+            m["forward"] = m.get("forward", 1.0) * sc
+            m["reverse"] = m.get("reverse", DEFAULT_REVERSE) * sc
     # timeScaleGroup
-    for obj in objs:
-        if obj.get("type") == "timeScaleGroup":
-            for ch in obj.get("changes", []):
-                b  = float(ch.get("beat", 0))
-                ts = float(ch.get("timeScale", 1.0))
-                m = marks.setdefault(b, {})
-                m["forward"] = m.get("forward", 1.0) * ts
-                m["reverse"] = m.get("reverse", DEFAULT_REVERSE) * ts
+    for b, ts in ts_changes:
+        m = marks.setdefault(b, {})
+        m["forward"] = m.get("forward", 1.0) * ts
+        m["reverse"] = m.get("reverse", DEFAULT_REVERSE) * ts
     out = [{"beat": 0.0, "forward": 1.0, "reverse": DEFAULT_REVERSE}]
     for b in sorted(marks.keys()):
         if b == 0:
@@ -107,6 +320,13 @@ def build_speed_markers(objs, base_bpm: float):
 
 def get_start_end_from_slide(obj):
     # START/END を connections から取得（START の lane/size を採用）
+    # guide は connections ではなく midpoints を持つので、最初/最後の点を START/END とする
+    mids = obj.get("midpoints")
+    if isinstance(mids, list) and mids and not obj.get("connections"):
+        pts = sorted(mids, key=lambda m: float(m.get("beat", 0)))
+        s, e = pts[0], pts[-1]
+        s_beat = float(s.get("beat", 0))
+        return s_beat, float(e.get("beat", s_beat)), float(s.get("lane", 0)), float(s.get("size", 1))
     conns = obj.get("connections", [])
     if isinstance(conns, list) and conns:
         starts = [c for c in conns if c.get("type") == "start"]
@@ -125,213 +345,792 @@ def get_start_end_from_slide(obj):
     s_size   = float(obj.get("size", 1))
     return s_beat, e_beat, s_center, s_size
 
-def convert_one_file(path_in: str, out_root: str):
-    usc = load_usc_objects(path_in)
-    objs = usc.get("objects", [])
-    bpm  = first_bpm(objs)
-    offset = float(usc.get("offset", 0.0)) if "offset" in usc else 0.0
+# ---- slide / guide の経路（--slide-paths） ----
+# USC の ease 名 -> 区間内の補間 (t: 0..1)。ease は「その点から次の点まで」の曲がり方
+EASES = {
+    "linear": lambda t: t,
+    "in": lambda t: t * t,
+    "out": lambda t: 1.0 - (1.0 - t) * (1.0 - t),
+    "inout": lambda t: 2.0 * t * t if t < 0.5 else 1.0 - 2.0 * (1.0 - t) * (1.0 - t),
+    "outin": lambda t: (0.5 - 2.0 * (0.5 - t) * (0.5 - t)) if t < 0.5 else (0.5 + 2.0 * (t - 0.5) * (t - 0.5)),
+}
+PATH_DIGITS = 4  # lane/width の小数桁
 
-    out_notes = []
-    for obj in objs:
-        if obj.get("trace") is True:
+def _ease_name(v) -> str:
+    name = str(v or "linear").lower().replace("ease", "").replace("_", "").replace("-", "")
+    return name if name in EASES else "linear"
+
+def slide_points(obj) -> List[Tuple[float, float, float, str]]:
+    """
+    Control points of a slide (start/tick/end connections) or guide (midpoints) as
+    (beat, left, width, ease) in game lane units: left = center - size + 7 (lane 1 = 1.0), width = 2*size.
+    attach は曲線上の判定点で形を持たないので除く。
+    """
+    src = obj.get("connections") or obj.get("midpoints") or []
+    pts = []
+    for c in src:
+        if not isinstance(c, dict) or c.get("type") == "attach" or "lane" not in c:
+            continue
+        center, size = float(c.get("lane", 0)), float(c.get("size", 1))
+        pts.append((float(c.get("beat", 0)), center - size + 7.0, 2.0 * size, _ease_name(c.get("ease"))))
+    pts.sort(key=lambda p: p[0])
+    return pts
+
+def _at(p0, p1, beat: float, ease: str) -> Tuple[float, float]:
+    # p0 -> p1 を p0 の ease で補間した (left, right)
+    span = p1[0] - p0[0]
+    f = EASES[ease]((beat - p0[0]) / span) if span > 0 else 0.0
+    l0, r0 = p0[1], p0[1] + p0[2]
+    l1, r1 = p1[1], p1[1] + p1[2]
+    return l0 + (l1 - l0) * f, r0 + (r1 - r0) * f
+
+def decimate_path(pts, tol: float) -> List[int]:
+    """
+    Ramer–Douglas–Peucker style simplification. Returns kept indices (always first and last).
+    区間 i..j を i の ease で補間したとき、間の元の点と元の各区間の中点（元の ease で評価）の
+    左端/右端のずれが最大 tol（レーン単位）以下なら間を落とす。再帰ではなくスタックで回す。
+    """
+    n = len(pts)
+    if n <= 2:
+        return list(range(n))
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
             continue
+        worst, split = 0.0, -1
+        for k in range(i, j):
+            # 元の区間 k..k+1 の中点（曲がった区間の膨らみを見る）
+            mb = 0.5 * (pts[k][0] + pts[k + 1][0])
+            ol, orr = _at(pts[k], pts[k + 1], mb, pts[k][3])
+            pl, pr = _at(pts[i], pts[j], mb, pts[i][3])
+            err = max(abs(pl - ol), abs(pr - orr))
+            if k > i:
+                pl, pr = _at(pts[i], pts[j], pts[k][0], pts[i][3])
+                err = max(err, abs(pl - pts[k][1]), abs(pr - pts[k][1] - pts[k][2]))
+            if err > worst:
+                worst, split = err, k if k > i else k + 1
+        if worst > tol and i < split < j:
+            keep[split] = True
+            stack.append((i, split))
+            stack.append((split, j))
+    return [i for i in range(n) if keep[i]]
+
+def path_json(pts, kept: List[int]) -> List[Dict]:
+    return [{"beat": pts[i][0], "lane": round(pts[i][1], PATH_DIGITS), "width": round(pts[i][2], PATH_DIGITS),
+             "ease": pts[i][3]} for i in kept]
+
+class ConvertedChart(Chart):
+    """
+    Result of convert_usc() / convert_sus(): a chart_pipeline.Chart (ノーツの列の持ち方はそちらの docstring) plus
+    the values written to metadata.json: bpm / offset / title / markers（speedScaleMarkers）/ tempo（TempoMap）。
+    flags / extra は使わない（flags が None = long/guide だけが hold を持つ）。paths は --slide-paths のときだけ入る。
+    objects は読んだ入力オブジェクト数、path_nodes = (元の制御点数, 間引き後の点数)。
+    """
+    __slots__ = ("bpm", "offset", "title", "markers", "tempo", "objects", "path_nodes")
+
+    def __init__(self):
+        super().__init__()
+        self.bpm = 180.0
+        self.offset = 0.0
+        self.title = None
+        self.markers = []
+        self.tempo = None
+        self.objects = 0  # 読んだ入力オブジェクト数（統計用）
+        self.path_nodes = (0, 0)
+
+def stage_timer(timings: Dict = None):
+    """lap(name) adds the time since the previous lap to timings[name]; a no-op when timings is None."""
+    if timings is None:
+        return lambda name: None
+    last = [time.perf_counter()]
+    def lap(name):
+        now = time.perf_counter()
+        timings[name] = timings.get(name, 0.0) + (now - last[0])
+        last[0] = now
+    return lap
+
+def convert_usc(usc: Dict, timings: Dict = None, path_tol: float = None) -> ConvertedChart:
+    """
+    One pass over usc["objects"]: notes go into columns, bpm / timeScaleGroup events are
+    collected on the way and turned into speedScaleMarkers at the end.
+    usc may be a UscStream; top-level fields are only read after the objects are consumed.
+    timings (optional dict) receives seconds per stage: classify / map_lanes / sort / markers (+ paths).
+    path_tol (lanes) keeps each slide/guide path, decimated with decimate_path(); None = no paths.
+    """
+    lap = stage_timer(timings)
+    out = ConvertedChart()
+    raw_paths = [] if path_tol is not None else None
+    times, types, holds = out.time, out.type, out.hold
+    centers, sizes = array("d"), array("d")  # lane/width は最後に列単位で写像する
+    bpm_events = []
+    ts_changes = []
+    base_bpm = None
+
+    n_objects = 0
+    for obj in usc.get("objects", []):
+        n_objects += 1
         t = obj.get("type")
+        if t == "bpm":
+            b  = float(obj.get("beat", 0))
+            bv = float(obj.get("bpm", 0))
+            bpm_events.append((b, bv))
+            if base_bpm is None and bv > 0:
+                base_bpm = bv
+            continue
+        if t == "timeScaleGroup":
+            for ch in obj.get("changes", []):
+                ts_changes.append((float(ch.get("beat", 0)), float(ch.get("timeScale", 1.0))))
+            continue
+        if obj.get("trace") is True:
+            continue
         if t == "single":
-            beat = float(obj.get("beat", 0))
-            center = float(obj.get("lane", 0))
-            size = float(obj.get("size", 1))
-            lane, width = map_lane_width_from_center_size(center, size)
-            has_dir = ("direction" in obj and obj["direction"] is not None)
-            crit = bool(obj.get("critical", False))
-            if (not crit) and (not has_dir):
-                typ = "normal"
-            elif crit and (not has_dir):
-                typ = "critical"
-            elif has_dir:
-                typ = "flick"
+            center, size = float(obj.get("lane", 0)), float(obj.get("size", 1))
+            if "direction" in obj and obj["direction"] is not None:
+                code = 2  # flick
+            elif obj.get("critical", False):
+                code = 1  # critical
             else:
-                typ = "normal"
-            out_notes.append({"time": beat, "lane": lane, "width": width, "type": typ})
+                code = 0  # normal
+            times.append(float(obj.get("beat", 0)))
+            hold = 0.0
+            if raw_paths is not None:
+                raw_paths.append(None)
         elif t in ("slide", "guide"):
-            s_beat, e_beat, s_center, s_size = get_start_end_from_slide(obj)
+            s_beat, e_beat, center, size = get_start_end_from_slide(obj)  # START 基準
+            code = 3 if t == "slide" else 4
+            times.append(s_beat)
             hold = max(0.0, e_beat - s_beat)
-            lane, width = map_lane_width_from_center_size(s_center, s_size)  # START 基準
-            out_notes.append({
-                "time": s_beat, "lane": lane, "width": width,
-                "type": ("long" if t == "slide" else "guide"),
-                "hold": hold
-            })
-
-    out_notes.sort(key=lambda n: (n["time"], n["lane"]))
-    markers = build_speed_markers(objs, bpm)
+            if raw_paths is not None:
+                raw_paths.append(slide_points(obj))
+        else:
+            continue
+        centers.append(center); sizes.append(size); types.append(code); holds.append(hold)
 
-    # 出力先の曲フォルダ名：metadata.title があればそれに
-    meta_title = None
+    lap("classify")
+    out.objects = n_objects
+    if raw_paths is not None:
+        n_in = n_out = 0
+        for k, pts in enumerate(raw_paths):
+            if not pts or len(pts) < 2:
+                raw_paths[k] = None
+                continue
+            kept = decimate_path(pts, path_tol)
+            n_in += len(pts)
+            n_out += len(kept)
+            raw_paths[k] = path_json(pts, kept)
+        out.paths = raw_paths
+        out.path_nodes = (n_in, n_out)
+        lap("paths")
+    out.lane, out.width = map_lane_width_batch(centers, sizes)
+    del centers, sizes
+    lap("map_lanes")
+    out.sort()
+    lap("sort")
+    out.bpm = base_bpm if base_bpm is not None else 180.0
+    out.offset = float(usc.get("offset", 0.0)) if "offset" in usc else 0.0
     # usc の top-level に title が来るケースも一応見る
     if "title" in usc and isinstance(usc["title"], str) and usc["title"].strip():
-        meta_title = usc["title"].strip()
-    # objects内や別構造にタイトルが無い場合は None
+        out.title = usc["title"].strip()
+    out.markers = speed_markers_from_events(bpm_events, ts_changes, out.bpm)
+    out.tempo = TempoMap.from_events(bpm_events, out.markers, out.bpm)
+    lap("markers")
+    return out
 
-    # フォルダ名
-    folder_name = meta_title if meta_title else os.path.splitext(os.path.basename(path_in))[0]
-    folder_name = safe_folder_name(folder_name)
-    song_dir = os.path.join(out_root, folder_name)
-    os.makedirs(song_dir, exist_ok=True)
+def convert_sus(sus: "sus_chart.SusChart", timings: Dict = None) -> ConvertedChart:
+    """SusChart (sus_chart.parse_sus) -> ConvertedChart with the same sorting and tempo data as convert_usc."""
+    lap = stage_timer(timings)
+    out = ConvertedChart()
+    out.time, out.lane, out.width, out.type, out.hold = sus.time, sus.lane, sus.width, sus.type, sus.hold
+    out.objects = len(sus)
+    out.sort()
+    lap("sort")
+    out.bpm = sus.bpm
+    out.title = sus.title
+    out.markers = speed_markers_from_events(sus.bpm_events, [], out.bpm)
+    out.tempo = TempoMap.from_events(sus.bpm_events, out.markers, out.bpm)
+    lap("markers")
+    return out
+
+def load_chart(path: str, stream: bool = False, lane_map: Dict = None, timings: Dict = None,
+               path_tol: float = None) -> ConvertedChart:
+    """
+    Parse any supported input (.usc/.json or .sus) into a ConvertedChart (timings: see convert_usc, plus load).
+    path_tol: see convert_usc (SUS のロングは始点と終点しか無いので経路は付けない).
+    """
+    lap = stage_timer(timings)
+    if os.path.splitext(path)[1].lower() == ".sus":
+        sus = sus_chart.load_sus(path, lane_map)  # SUS は常に 1 行ずつ読む（読み込みと分類は load にまとめて計上）
+        lap("load")
+        return convert_sus(sus, timings)
+    usc = load_usc(path, stream)
+    lap("load")  # stream の場合は読み込みの大半が classify 側に入る
+    return convert_usc(usc, timings, path_tol)
+
+def chart_outputs(json_path: str, fmt: str = "json") -> List[str]:
+    """Files written for one chart in the given --format (identified by its .json path)."""
+    outs = []
+    if fmt in ("json", "both"):
+        outs.append(json_path)
+    if fmt in ("bin", "both"):
+        outs.append(chartbin.bin_path_for(json_path))
+    return outs
+
+def write_chart_outputs(chart: ConvertedChart, json_path: str, fmt: str = "json") -> List[str]:
+    # 一時ファイルに書いてから rename（ゲームが書きかけの譜面を読まないように）
+    outs = chart_outputs(json_path, fmt)
+    for path in outs:
+        if path.endswith(chartbin.BIN_EXT):
+            toolutil.write_atomic(path, chart_pipeline.chart_bin_bytes(chart, chart.bpm, chart.markers))
+        else:
+            with toolutil.atomic_output(path) as tmp:
+                write_chart_json(chart, tmp)
+    return outs
 
-    # 難易度ファイル名
+def apply_stages(chart: ConvertedChart, stages: List[str], name: str) -> ConvertedChart:
+    """
+    --stages の譜面側（chart_pipeline.STAGES）を、書き出す前のメモリ上の chart に当てる。
+    metadata 側のステージは write_metadata() でマージ後の metadata に当てる。
+    """
+    if not stages:
+        return chart
+    song = chart_pipeline.Song(meta={}, charts={name: chart})
+    out = chart_pipeline.named_stages(stages)(song).charts[name]
+    if out is not chart:
+        # Chart を差し替えるステージでも bpm / テンポなどの変換結果は残す
+        for slot in Chart.__slots__:
+            setattr(chart, slot, getattr(out, slot))
+    return chart
+
+def song_names(chart: ConvertedChart, path_in: str) -> Tuple[str, str]:
+    """(曲フォルダ名, 譜面ファイル名) for a single-file conversion: folder = metadata.title or the input stem."""
+    folder_name = chart.title if chart.title else os.path.splitext(os.path.basename(path_in))[0]
     diff = detect_difficulty_from_filename(path_in)
-    chart_name = f"{diff}.json" if diff else "chart.json"
+    return safe_folder_name(folder_name), (f"{diff}.json" if diff else "chart.json")
+
+def song_metadata(chart: ConvertedChart, title: str) -> Dict:
+    """The metadata.json keys the converter owns (title とテンポ関連)."""
+    return {
+        "title": title,
+        "bpm": chart.bpm,
+        "offset": chart.offset,
+        "speedScaleMarkers": chart.markers,
+        "tempoMap": chart.tempo.to_json()
+    }
+
+def write_song(chart: ConvertedChart, path_in: str, out_root: str, fmt: str = "json",
+               stages: List[str] = None) -> Tuple[str, List[str]]:
+    """
+    Write one converted chart as <out_root>/<曲フォルダ>/<difficulty>.json (+ .bin) and merge metadata.json.
+    path_in は名前（フォルダ名 / 難易度の推定）にだけ使う。Returns (chart .json path, written chart files).
+    """
+    # 出力先の曲フォルダ名：metadata.title があればそれに
+    folder_name, chart_name = song_names(chart, path_in)
+    song_dir = os.path.join(out_root, folder_name)
+    os.makedirs(song_dir, exist_ok=True)
     chart_path = os.path.join(song_dir, chart_name)
+    chart = apply_stages(chart, stages, os.path.splitext(chart_name)[0])
 
     # 書き出し
-    with open(chart_path, "w", encoding="utf-8") as f:
-        json.dump(out_notes, f, ensure_ascii=False, indent=2)
-
-    meta_out = {
-        "title": meta_title if meta_title else folder_name,
-        "bpm": bpm,
-        "offset": offset,
-        "speedScaleMarkers": markers
-    }
-    with open(os.path.join(song_dir, "metadata.json"), "w", encoding="utf-8") as f:
-        json.dump(meta_out, f, ensure_ascii=False, indent=2)
+    outs = write_chart_outputs(chart, chart_path, fmt)
+    write_metadata(os.path.join(song_dir, "metadata.json"), song_metadata(chart, chart.title or folder_name), stages)
+    return chart_path, outs
 
-    print(f"[OK] {path_in} -> {chart_path}")
+def convert_one_file(path_in: str, out_root: str, stream: bool = False, fmt: str = "json", lane_map: Dict = None,
+                     path_tol: float = None, stages: List[str] = None):
+    chart = load_chart(path_in, stream, lane_map, path_tol=path_tol)
+    chart_path, outs = write_song(chart, path_in, out_root, fmt, stages)
+    print(f"[OK] {path_in} -> {', '.join(outs)}")
+    return chart_path
 
-def convert_one_file_flat(path_in: str, out_dir: str, out_name: str):
+def convert_one_file_flat(path_in: str, out_dir: str, out_name: str, quiet: bool = False,
+                          stream: bool = False, fmt: str = "json", lane_map: Dict = None, info: Dict = None,
+                          path_tol: float = None, stages: List[str] = None):
     """
-    Convert one USC/JSON file and write chart JSON directly under out_dir with the given out_name.
-    Returns a tuple (meta_title, bpm, offset, markers).
+    Convert one USC/JSON/SUS file and write chart JSON directly under out_dir with the given out_name.
+    Returns a tuple (meta_title, bpm, offset, markers, tempo_map_json).
     Does NOT write metadata.json here (caller writes once for folder).
+    quiet=True suppresses the [OK] line (used by worker processes).
+    stream=True parses the input incrementally (see UscStream).
+    fmt selects json / bin / both outputs (out_name is always the .json name).
+    lane_map is a sus_chart.load_lane_map() result for .sus inputs (None = ObjClone rules).
+    info (optional dict) receives per-file stats for toolstats: seconds, stages, bytesIn/Out, objects, notes, outputs
+    (+ pathNodesIn/Out with path_tol).
+    path_tol keeps slide/guide paths in the chart JSON (see convert_usc).
+    stages: chart_pipeline のステージ名。譜面側だけをここで当てる（metadata 側は呼び出し元の write_metadata）。
     """
-    usc = load_usc_objects(path_in)
-    objs = usc.get("objects", [])
-    bpm  = first_bpm(objs)
-    offset = float(usc.get("offset", 0.0)) if "offset" in usc else 0.0
-
-    out_notes = []
-    for obj in objs:
-        if obj.get("trace") is True:
-            continue
-        t = obj.get("type")
-        if t == "single":
-            beat = float(obj.get("beat", 0))
-            center = float(obj.get("lane", 0))
-            size = float(obj.get("size", 1))
-            lane, width = map_lane_width_from_center_size(center, size)
-            has_dir = ("direction" in obj and obj["direction"] is not None)
-            crit = bool(obj.get("critical", False))
-            if (not crit) and (not has_dir):
-                typ = "normal"
-            elif crit and (not has_dir):
-                typ = "critical"
-            elif has_dir:
-                typ = "flick"
-            else:
-                typ = "normal"
-            out_notes.append({"time": beat, "lane": lane, "width": width, "type": typ})
-        elif t in ("slide", "guide"):
-            s_beat, e_beat, s_center, s_size = get_start_end_from_slide(obj)
-            hold = max(0.0, e_beat - s_beat)
-            lane, width = map_lane_width_from_center_size(s_center, s_size)  # START 基準
-            out_notes.append({
-                "time": s_beat, "lane": lane, "width": width,
-                "type": ("long" if t == "slide" else "guide"),
-                "hold": hold
-            })
-
-    out_notes.sort(key=lambda n: (n["time"], n["lane"]))
-    markers = build_speed_markers(objs, bpm)
+    t0 = time.perf_counter()
+    timings = {} if info is not None else None
+    chart = load_chart(path_in, stream, lane_map, timings, path_tol)
+    if stages:
+        t_st = time.perf_counter()
+        chart = apply_stages(chart, stages, os.path.splitext(out_name)[0])
+        if timings is not None:
+            timings["stages"] = time.perf_counter() - t_st
 
     os.makedirs(out_dir, exist_ok=True)
     chart_path = os.path.join(out_dir, out_name)
-    with open(chart_path, "w", encoding="utf-8") as f:
-        json.dump(out_notes, f, ensure_ascii=False, indent=2)
+    t1 = time.perf_counter()
+    outs = write_chart_outputs(chart, chart_path, fmt)
+    if info is not None:
+        now = time.perf_counter()
+        timings["write"] = now - t1
+        info.update(seconds=now - t0, stages=timings, bytesIn=os.path.getsize(path_in),
+                    bytesOut=sum(os.path.getsize(p) for p in outs), objects=chart.objects, notes=len(chart),
+                    outputs=outs)
+        if chart.paths is not None:
+            info.update(pathNodesIn=chart.path_nodes[0], pathNodesOut=chart.path_nodes[1])
 
-    meta_title = None
-    if "title" in usc and isinstance(usc["title"], str) and usc["title"].strip():
-        meta_title = usc["title"].strip()
+    if not quiet:
+        print(f"[OK] {path_in} -> {', '.join(outs)}")
+    return chart.title, chart.bpm, chart.offset, chart.markers, chart.tempo.to_json()
 
-    print(f"[OK] {path_in} -> {chart_path}")
-    return meta_title, bpm, offset, markers
+def _convert_flat_job(job):
+    # ProcessPoolExecutor 用（トップレベル関数である必要がある）
+    src, out_dir, out_name, opts = job
+    info = {}
+    t0 = time.perf_counter()
+    try:
+        meta = convert_one_file_flat(src, out_dir, out_name, quiet=True, info=info, **opts)
+        return src, os.path.join(out_dir, out_name), meta, None, info
+    except Exception as e:
+        return src, None, None, str(e), {"seconds": time.perf_counter() - t0}
 
-def collect_inputs(target: str) -> List[str]:
+def _convert_flat_group(group):
+    return [_convert_flat_job(job) for job in group]
+
+def collect_inputs(target: str, outroot: str = None, outputs=()) -> List[str]:
+    """
+    Input files under target (a file is returned as is when its extension is allowed).
+    フォルダでは自分の出力を入力に拾わないよう、隠しファイル / 隠しフォルダ（MANIFEST_NAME を含む）、metadata.json、
+    outroot 以下（outroot が target の中にあるとき）、outputs（マニフェストにある出力のパス）を除く。
+    """
     paths = []
     if os.path.isfile(target):
         ext = os.path.splitext(target)[1].lower()
         if ext in ALLOWED_EXTS:
             paths.append(os.path.abspath(target))
     else:
-        for root, _, files in os.walk(target):
+        # outroot == target（入力フォルダにそのまま出力）のときはフォルダごとは除けないので outputs で見分ける
+        out_dir = os.path.realpath(outroot) if outroot else None
+        if out_dir == os.path.realpath(target):
+            out_dir = None
+        own = {os.path.abspath(p) for p in outputs}
+        for root, dirs, files in os.walk(target):
+            dirs[:] = [d for d in dirs
+                       if not d.startswith(".") and os.path.realpath(os.path.join(root, d)) != out_dir]
             for fn in files:
+                if fn.startswith(".") or fn == "metadata.json":
+                    continue
                 ext = os.path.splitext(fn)[1].lower()
                 if ext in ALLOWED_EXTS:
-                    paths.append(os.path.join(root, fn))
+                    p = os.path.join(root, fn)
+                    if not own or os.path.abspath(p) not in own:
+                        paths.append(p)
+    # os.walk の順序は FS 依存なので、並列/逐次どちらでも同じ結果になるようソート
+    paths.sort()
     return paths
 
 def infer_out_name(path: Path, default_name: str) -> str:
     diff = detect_difficulty_from_filename(str(path))
     return f"{diff}.json" if diff else default_name
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage:")
-        print("  python mmw4cc_to_mygame.py <input(.usc/.json or dir)> <out_root_dir>")
-        sys.exit(1)
+def write_metadata(path: str, meta_out: Dict, stages: List[str] = None) -> bool:
+    """
+    Write the converter's metadata keys into path. 既存の metadata.json の他のキー（rootoffsetMs, artist,
+    levels など）は残し、変換結果のキー（title とテンポ関連）が全部同じならファイルに触らない。
+    stages（chart_pipeline のステージ名）はマージ後の metadata に当て、結果が今のファイルと同じなら書かない。
+    offset はゲームで効くときだけ書く（migrate_metadata の v2 "rootoffset" が消す形にそろえ、毎回の書き直しを防ぐ）:
+    既存に rootoffsetMs があれば offset は無視されるので触らず、0 で既存にも無ければ足さない。
+    読み込み 1 回・書き込み最大 1 回。
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        old = json.loads(text)
+        if not isinstance(old, dict):
+            old = {}
+    except (OSError, ValueError):
+        text, old = None, {}
+    if "offset" in meta_out and (old.get("rootoffsetMs") or (not meta_out["offset"] and "offset" not in old)):
+        meta_out = {k: v for k, v in meta_out.items() if k != "offset"}
+    if not stages and old and all(k in old and old[k] == v for k, v in meta_out.items()):
+        return False
+    merged = dict(old)
+    merged.update(meta_out)
+    if stages:
+        song = chart_pipeline.Song(os.path.dirname(path), merged, charts={})
+        merged = chart_pipeline.named_stages(stages)(song).meta
+    new_text = json.dumps(merged, ensure_ascii=False, indent=2)
+    if new_text == text:
+        return False
+    toolutil.write_atomic(path, new_text)
+    return True
+
+class ConvertCache:
+    """
+    Persistent manifest (<out_root>/.mmw4cc_manifest.json) of converted inputs.
+    entries: abs source path -> {sha256, size, mtime_ns, version, output, format, meta[, sus_lane_map]}
+    size/mtime_ns が一致すればハッシュ計算も省略し、違えば内容ハッシュで最終判定する。
+    .sus は --sus-lane-map の内容でも出力が変わるので、そのハッシュ（sus_key, 無指定は ""）も照合する。
+    --slide-paths の許容誤差（path_tol, 無指定は None）と --stages（stages, 無指定は []）も出力に効くので照合する。
+    """
 
-    target  = sys.argv[1]
-    outroot = sys.argv[2]
+    def __init__(self, out_root: str, force: bool = False, sus_key: str = "", path_tol: float = None,
+                 stages: List[str] = None):
+        self.path = os.path.join(out_root, MANIFEST_NAME)
+        self.force = force
+        self.sus_key = sus_key
+        self.path_tol = path_tol
+        self.stages = list(stages or [])
+        self.entries: Dict[str, Dict] = {}
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("entries"), dict):
+                self.entries = data["entries"]
+        except (OSError, ValueError):
+            pass
+
+    def _digest(self, src: str, st: os.stat_result = None) -> str:
+        # --watch で同じキャッシュを使い回すので、メモは stat ごとに持つ
+        st = st or os.stat(src)
+        key = (src, st.st_size, st.st_mtime_ns)
+        d = self._digests.get(key)
+        if d is None:
+            d = self._digests[key] = file_sha256(src)
+        return d
+
+    def lookup(self, src: str, output: str, fmt: str = "json"):
+        """Return the manifest entry if src is unchanged since it was converted to output, else None."""
+        if self.force:
+            return None
+        e = self.entries.get(os.path.abspath(src))
+        if not e or e.get("version") != CONVERTER_VERSION or e.get("output") != os.path.abspath(output):
+            return None
+        if e.get("format", "json") != fmt or not all(os.path.isfile(p) for p in chart_outputs(output, fmt)):
+            return None
+        if src.lower().endswith(".sus") and e.get("sus_lane_map", "") != self.sus_key:
+            return None
+        if e.get("path_tol") != self.path_tol or e.get("stages", []) != self.stages:
+            return None
+        st = os.stat(src)
+        if e.get("size") != st.st_size or e.get("mtime_ns") != st.st_mtime_ns:
+            if e.get("sha256") != self._digest(src):
+                return None
+            # touch されただけ：stat を更新して次回はハッシュ不要にする
+            e["size"], e["mtime_ns"] = st.st_size, st.st_mtime_ns
+        return e
+
+    def stamp(self, src: str) -> Tuple[int, int, str]:
+        """
+        (size, mtime_ns, sha256) of src. 変換で読む前に取って record() に渡す（変換中に保存し直されたら
+        次回は stat もハッシュも合わないので変換し直す。後から取ると新しい中身を古い出力に記録してしまう）。
+        """
+        st = os.stat(src)
+        return st.st_size, st.st_mtime_ns, self._digest(src, st)
+
+    def record(self, src: str, output: str, meta, fmt: str, stamp: Tuple[int, int, str]):
+        """stamp: stamp(src) taken before src was read for this conversion."""
+        size, mtime_ns, digest = stamp
+        e = self.entries[os.path.abspath(src)] = {
+            "sha256": digest,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "version": CONVERTER_VERSION,
+            "output": os.path.abspath(output),
+            "format": fmt,
+            "meta": list(meta) if isinstance(meta, tuple) else meta,
+        }
+        if src.lower().endswith(".sus") and self.sus_key:
+            e["sus_lane_map"] = self.sus_key
+        if self.path_tol is not None:
+            e["path_tol"] = self.path_tol
+        if self.stages:
+            e["stages"] = self.stages
+
+    def forget(self, src: str):
+        self.entries.pop(os.path.abspath(src), None)
+
+    def stale(self, under: str, current: List[str]) -> List[Tuple[str, str, str]]:
+        """Entries whose source lives under `under` but was not among `current` (deleted/renamed)."""
+        root = os.path.join(os.path.abspath(under), "")
+        alive = {os.path.abspath(p) for p in current}
+        return [(src, e.get("output", ""), e.get("format", "json")) for src, e in sorted(self.entries.items())
+                if src.startswith(root) and src not in alive]
+
+    def outputs(self) -> Set[str]:
+        """Every chart file the manifest says this converter wrote."""
+        return {p for e in self.entries.values() if e.get("output")
+                for p in chart_outputs(e["output"], e.get("format", "json"))}
+
+    def prune(self, stale: List[Tuple[str, str, str]]) -> int:
+        """Delete outputs of stale entries (unless another live entry still owns the file)."""
+        for src, _, _ in stale:
+            self.entries.pop(src, None)
+        owned = self.outputs()
+        removed = 0
+        for _, output, fmt in stale:
+            for p in chart_outputs(output, fmt):
+                if output and p not in owned and os.path.isfile(p):
+                    os.remove(p)
+                    removed += 1
+        return removed
+
+    def save(self):
+        toolutil.write_if_changed(self.path, json.dumps({"version": CONVERTER_VERSION, "entries": self.entries},
+                                                        ensure_ascii=False, indent=2))
+
+def convert_dir_flat(inputs: List[str], outroot: str, jobs: int, cache: "ConvertCache" = None,
+                     stream: bool = False, fmt: str = "json", lane_map: Dict = None,
+                     stats: "toolstats.RunStats" = None, path_tol: float = None, stages: List[str] = None):
+    """
+    Convert every input into outroot (flat). Returns (first_meta, ok, ng, cached, errors).
+    first_meta is taken from the first successful input in sorted order, regardless of jobs.
+    Inputs that the cache reports as unchanged are not parsed; their meta comes from the manifest.
+    Per-file results go to stats (toolstats.RunStats; default prints an [OK] line per file).
+    Failures are returned in errors (not printed here).
+    """
+    if stats is None:
+        stats = toolstats.RunStats("mmw4cc_to_mygame")
+    opts = {"stream": stream, "fmt": fmt, "lane_map": lane_map, "path_tol": path_tol, "stages": stages}
+    jobs_list = [(src, outroot, infer_out_name(Path(src), Path(src).stem + ".json"), opts) for src in inputs]
+    first_meta = None
+    ok = ng = n_cached = 0
+    errors = []
+
+    # 同名出力（同じ難易度キーワードを持つ複数ファイル）は後勝ちなので、逐次と同じ順で書かれるよう
+    # 出力パスが衝突するジョブはまとめて扱う（並列時は同一ワーカーで順に処理）
+    groups: Dict[str, List[Tuple[str, str, str, Dict]]] = {}
+    for job in jobs_list:
+        groups.setdefault(job[2], []).append(job)
+
+    # キャッシュ判定はグループ単位：1つでも変更があればグループ全体を書き直す
+    cached = {}
+    if cache is not None:
+        for group in groups.values():
+            hits = [cache.lookup(src, os.path.join(out_dir, out_name), fmt) for src, out_dir, out_name, _ in group]
+            if all(e is not None and e.get("meta") for e in hits):
+                for (src, _, _, _), e in zip(group, hits):
+                    cached[src] = tuple(e["meta"])
+    todo_groups = [[j for j in g if j[0] not in cached] for g in groups.values()]
+    todo_groups = [g for g in todo_groups if g]
+    # マニフェストに記録する stat / ハッシュはワーカーが読む前に取る
+    stamps = {src: cache.stamp(src) for g in todo_groups for src, _, _, _ in g} if cache is not None else {}
+
+    results = {}
+    for group_res in toolutil.map_jobs(_convert_flat_group, todo_groups, jobs):
+        for src, chart_path, meta, err, info in group_res:
+            results[src] = (chart_path, meta, err)
+            seconds = info.pop("seconds", 0.0)
+            if err is None:
+                outs = info.pop("outputs", None) or [chart_path]
+                stats.file(src, "ok", seconds, line=f"[OK] {src} -> {', '.join(outs)}", **info)
+            else:
+                stats.file(src, "error", seconds, error=err)
+                errors.append((src, err))
+
+    # 集計は入力のソート順で行い、metadata の採用元を逐次実行と一致させる
+    for src, _, _, _ in jobs_list:
+        if src in cached:
+            meta = cached[src]
+            n_cached += 1
+            stats.file(src, "cached")
+        else:
+            chart_path, meta, err = results[src]
+            if err is not None:
+                if cache is not None:
+                    cache.forget(src)
+                ng += 1
+                continue
+            if cache is not None:
+                cache.record(src, chart_path, meta, fmt, stamps[src])
+        if first_meta is None:
+            first_meta = meta
+        ok += 1
+    return first_meta, ok, ng, n_cached, errors
+
+def build_parser() -> argparse.ArgumentParser:
+    """The converter's command line (mmw4cc_server.py もこれで引数を解釈する)."""
+    ap = argparse.ArgumentParser(prog=os.path.basename(__file__),
+                                 description="MMW4CC (USC/JSON) / SUS -> MyGame chart converter")
+    ap.add_argument("input", help="入力ファイル (.usc/.json/.sus) またはディレクトリ")
+    ap.add_argument("outroot", help="出力ルートディレクトリ")
+    ap.add_argument("--jobs", "-j", type=int, default=1,
+                    help="ディレクトリ変換の並列プロセス数（0 で CPU 数, 既定 1）")
+    ap.add_argument("--force", action="store_true",
+                    help="マニフェストのキャッシュを無視して全ファイルを再変換する")
+    ap.add_argument("--prune", action="store_true",
+                    help="入力が消えたファイルの出力を削除する（既定は報告のみ）")
+    ap.add_argument("--format", choices=OUTPUT_FORMATS, default="json",
+                    help="譜面の出力形式（bin は chartbin.py の .bin、both は両方）")
+    ap.add_argument("--stream", action="store_true",
+                    help="全入力をストリーミングで読む（既定は STREAM_MIN_BYTES 以上のファイルのみ）")
+    ap.add_argument("--sus-lane-map", default=None,
+                    help="SusLoader の laneMap を書き出した JSON。指定すると .sus を SusLoader の規則で変換する")
+    ap.add_argument("--slide-paths", type=float, default=None, metavar="TOL",
+                    help="long/guide に経路 path（beat, lane, width, ease の制御点）を付ける。"
+                         "TOL はレーン単位の許容誤差（例 0.25、0 で間引かない）")
+    ap.add_argument("--stages", default=None, metavar="NAMES",
+                    help="書き出す前にメモリ上で当てる chart_pipeline のステージ（カンマ区切り、例 "
+                         "normalize_lanes,fix_metadata）。譜面側は各譜面に、metadata 側は metadata.json に当てる")
+    ap.add_argument("--watch", action="store_true",
+                    help="変換後も入力を監視し、変更された .usc/.json/.sus だけを変換し直す")
+    ap.add_argument("--debounce", type=int, default=300,
+                    help="--watch で変更をまとめる待ち時間（ms, 既定 300）")
+    ap.add_argument("--poll", action="store_true", help="--watch で inotify を使わずポーリングする")
+    ap.add_argument("--poll-interval", type=float, default=fswatch.POLL_INTERVAL,
+                    help="ポーリング間隔（秒）")
+    toolstats.add_arguments(ap)
+    return ap
+
+def main(argv: List[str] = None):
+    """argv を省略すると sys.argv。mmw4cc_server.py のワーカーは受け取った引数でこれを呼ぶ。"""
+    args = build_parser().parse_args(argv)
+
+    target  = args.input
+    outroot = args.outroot
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
     os.makedirs(outroot, exist_ok=True)
+    lane_map, sus_key = None, ""
+    if args.sus_lane_map:
+        try:
+            lane_map = sus_chart.load_lane_map(args.sus_lane_map)
+        except (OSError, ValueError) as e:
+            print(f"[ERR] --sus-lane-map: {e}")
+            sys.exit(1)
+        sus_key = file_sha256(args.sus_lane_map)
+    if args.slide_paths is not None and args.slide_paths < 0:
+        print(f"[ERR] --slide-paths は 0 以上: {args.slide_paths}")
+        sys.exit(1)
+    args.stages = [n.strip() for n in (args.stages or "").split(",") if n.strip()]
+    try:
+        chart_pipeline.named_stages(args.stages)
+    except ValueError as e:
+        print(f"[ERR] --stages: {e}")
+        sys.exit(1)
+    cache = ConvertCache(outroot, force=args.force, sus_key=sus_key, path_tol=args.slide_paths, stages=args.stages)
+    stats = toolstats.from_args("mmw4cc_to_mygame", args)
+
+    if args.watch:
+        watch(target, outroot, jobs, cache, args, lane_map, stats)
+    else:
+        convert_pass(target, outroot, jobs, cache, args, lane_map, stats)
+    stats.finish()
 
+def convert_pass(target: str, outroot: str, jobs: int, cache: ConvertCache, args, lane_map: Dict,
+                 stats: "toolstats.RunStats"):
+    """One conversion of target (directory = flat into outroot, file = song folder). Returns the ok count."""
     p1 = Path(target)
     if p1.is_dir():
-        total = ok = ng = 0
         # 出力は outroot の直下に a.json, b.json ... とし、metadata.json は一個だけ作成
         folder_title = os.path.basename(os.path.normpath(p1))
-        first_meta = None  # (meta_title, bpm, offset, markers)
 
-        # .usc および .json を収集
-        inputs = collect_inputs(p1)
-        for src in inputs:
-            total += 1
-            try:
-                out_name = infer_out_name(Path(src), Path(src).stem + ".json")
-                meta_title, bpm, offset, markers = convert_one_file_flat(src, outroot, out_name)
-                if first_meta is None:
-                    first_meta = (meta_title, bpm, offset, markers)
-                ok += 1
-            except Exception as e:
-                print(f"[NG] {src}: {e}")
-                ng += 1
+        # .usc / .json / .sus を収集
+        with stats.stage("scan"):
+            inputs = collect_inputs(p1, outroot, cache.outputs())
+        total = len(inputs)
+        stats.set_total(stats.done + total)
+        with stats.stage("convert"):
+            first_meta, ok, ng, n_cached, errors = convert_dir_flat(inputs, outroot, jobs, cache, args.stream,
+                                                                    args.format, lane_map, stats, args.slide_paths,
+                                                                    args.stages)
 
-        # metadata.json を一個だけ outroot に書く（title は入力フォルダ名）
+        # metadata.json を一個だけ outroot に書く（title は入力フォルダ名）。テンポ等が変わったときだけ書き換える
         if first_meta is not None:
-            _, bpm0, offset0, markers0 = first_meta
+            _, bpm0, offset0, markers0, tempo0 = first_meta
             meta_out = {
                 "title": folder_title,
                 "bpm": bpm0,
                 "offset": offset0,
-                "speedScaleMarkers": markers0
+                "speedScaleMarkers": markers0,
+                "tempoMap": tempo0
             }
-            with open(os.path.join(outroot, "metadata.json"), "w", encoding="utf-8") as f:
-                json.dump(meta_out, f, ensure_ascii=False, indent=2)
-            print(f"[META] {os.path.join(outroot, 'metadata.json')} written (title={folder_title})")
+            meta_path = os.path.join(outroot, "metadata.json")
+            if write_metadata(meta_path, meta_out, args.stages):
+                stats.log(f"[META] {meta_path} written (title={folder_title})")
         else:
-            print("[WARN] 変換対象が無かったため metadata.json は作成しませんでした。")
+            stats.log("[WARN] 変換対象が無かったため metadata.json は作成しませんでした。")
 
-        print(f"== 完了 total={total}, ok={ok}, ng={ng} ==")
-        return
+        stale = cache.stale(str(p1), inputs)
+        for src, output, _ in stale:
+            stats.log(f"[STALE] {src} (削除済み) -> {output}")
+        if stale and args.prune:
+            stats.log(f"[PRUNE] {cache.prune(stale)} 件の出力を削除しました。")
+        with stats.stage("manifest"):
+            cache.save()
+
+        for src, err in errors:
+            stats.log(f"[NG] {src}: {err}")
+        n_in, n_out = stats.counters["pathNodesIn"], stats.counters["pathNodesOut"]
+        if n_in:
+            stats.log(f"[PATH] slide/guide の制御点 {n_in} -> {n_out} ({n_out / n_in - 1.0:+.1%}, "
+                      f"tol={args.slide_paths} lanes, 変換したファイル分)")
+        stats.log(f"== 完了 total={total}, ok={ok}, ng={ng}, cached={n_cached} ==")
+        return ok
 
     inputs = collect_inputs(target)
     if not inputs:
-        print("[WARN] 対象ファイル(.usc/.json)が見つかりません。")
-        sys.exit(0)
+        print("[WARN] 対象ファイル(.usc/.json/.sus)が見つかりません。")
+        return 0
 
+    stats.set_total(stats.done + len(inputs))
+    ok = 0
     for p in inputs:
+        e = cache.entries.get(os.path.abspath(p))
+        if e and cache.lookup(p, e.get("output", ""), args.format) is not None:
+            print(f"[SKIP] {p} (未変更)")
+            stats.file(p, "cached")
+            continue
+        t0 = time.perf_counter()
         try:
-            convert_one_file(p, outroot)
+            stamp = cache.stamp(p)
+            cache.record(p, convert_one_file(p, outroot, args.stream, args.format, lane_map, args.slide_paths,
+                                             args.stages), None, args.format, stamp)
+            stats.file(p, "ok", time.perf_counter() - t0, bytesIn=os.path.getsize(p))
+            ok += 1
         except Exception as e:
+            cache.forget(p)
             print(f"[ERR] 変換失敗: {p} -> {e}")
+            stats.file(p, "error", time.perf_counter() - t0, error=str(e))
+    cache.save()
+    return ok
+
+def watch(target: str, outroot: str, jobs: int, cache: ConvertCache, args, lane_map: Dict,
+          stats: "toolstats.RunStats"):
+    """
+    --watch: convert once, then reconvert whenever inputs change (Ctrl+C で終了).
+    変更の検出は fswatch（inotify / scandir ポーリング）、まとめた変更ごとに convert_pass を回す。
+    未変更の入力はマニフェストで飛ばされるので、実際に読み直すのは変わったファイルだけ。
+    """
+    convert_pass(target, outroot, jobs, cache, args, lane_map, stats)
+    cache.force = False  # --force は最初の 1 回だけ
+    is_dir = os.path.isdir(target)
+    root = target if is_dir else (os.path.dirname(os.path.abspath(target)) or ".")
+    out_prefix = os.path.join(os.path.abspath(outroot), "")
+    only = None if is_dir else os.path.abspath(target)
+    debounce = max(0.0, args.debounce / 1000.0)
+    with fswatch.open_watcher(root, ALLOWED_EXTS, recursive=is_dir, poll_interval=args.poll_interval,
+                              force_poll=args.poll) as w:
+        print(f"[WATCH] {os.path.abspath(root)} を監視中（{w.kind}, debounce={args.debounce}ms）。Ctrl+C で終了")
+        try:
+            while True:
+                changed = fswatch.debounce(w, debounce)
+                # 自分の出力（outroot が入力の下にある場合）と対象外のファイルは無視
+                changed = {p for p in changed
+                           if p == fswatch.RESCAN or (not p.startswith(out_prefix) and (only is None or p == only))}
+                if not changed:
+                    continue
+                t0 = time.perf_counter()
+                names = sorted(os.path.basename(p) for p in changed if p != fswatch.RESCAN)
+                print(f"[CHANGE] {', '.join(names[:5]) or '(rescan)'}{' ...' if len(names) > 5 else ''}")
+                convert_pass(target, outroot, jobs, cache, args, lane_map, stats)
+                print(f"[WATCH] {(time.perf_counter() - t0) * 1000:.0f}ms")
+        except KeyboardInterrupt:
+            print("\n[WATCH] 終了")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file